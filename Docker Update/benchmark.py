@@ -0,0 +1,391 @@
+"""
+Benchmark the update path against stub docker and docker-compose executables.
+
+Every measurement runs in a fresh Python process, so peak memory and caches
+are not carried over from one run to the next. Results are written as JSON.
+
+    python benchmark.py --stacks 1,10,100,1000 --latency 0.02 --failure-rate 0.01 -o results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Measurements the harness can run, see _measure_*()
+MODES = ("serial", "batch", "http")
+
+# Number of different images the synthetic stacks use, so batches share images
+IMAGE_VARIANTS = 10
+
+# Requests sent to /list-directories per HTTP measurement, and per client when concurrent
+LIST_REQUESTS = 50
+
+# WSGI servers the HTTP measurement can run the app under
+SERVERS = ("waitress", "werkzeug")
+
+_COMPOSE_STUB = """#!/bin/sh
+echo "docker-compose $1" >> "$BENCH_DIR/commands.log"
+if [ "$1" = "config" ]; then
+    cat docker-compose.yml
+    exit 0
+fi
+sleep "$BENCH_LATENCY"
+r=$(od -An -N2 -tu2 /dev/urandom)
+if [ $r -lt "$BENCH_FAIL_THRESHOLD" ]; then
+    echo "stub failure" >&2
+    exit 1
+fi
+echo "docker-compose $* done"
+"""
+
+_DOCKER_STUB = """#!/bin/sh
+echo "docker $1" >> "$BENCH_DIR/commands.log"
+case "$1" in
+    image) echo "sha256:bench"; exit 0;;
+    ps) exit 0;;
+    container) echo "[]"; exit 1;;
+esac
+sleep "$BENCH_LATENCY"
+r=$(od -An -N2 -tu2 /dev/urandom)
+if [ $r -lt "$BENCH_FAIL_THRESHOLD" ]; then
+    echo "stub failure" >&2
+    exit 1
+fi
+echo "docker $1 done"
+"""
+
+
+def create_stubs(bench_dir: str) -> str:
+    """Write the stub executables into bench_dir/bin and return that directory."""
+    bin_dir = os.path.join(bench_dir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, script in (("docker-compose", _COMPOSE_STUB), ("docker", _DOCKER_STUB)):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+def create_stacks(root: str, count: int, run_ratio: float = 0.0) -> list[str]:
+    """
+    Create count synthetic stack directories below root and return their paths.
+
+    Every stack runs one service from one of IMAGE_VARIANTS images; a run_ratio
+    share of them uses docker-run-command.txt instead of docker-compose.yml.
+    """
+    os.makedirs(root, exist_ok=True)
+    run_stacks = round(count * run_ratio)
+    paths = []
+    for i in range(count):
+        path = os.path.join(root, f"stack-{i:04d}")
+        os.makedirs(path, exist_ok=True)
+        image = f"bench/app-{i % IMAGE_VARIANTS}:latest"
+        if i < run_stacks:
+            with open(os.path.join(path, "docker-run-command.txt"), 'w') as f:
+                f.write(f'docker run -d --name bench-{i} -e "STACK=stack {i}" {image}\n')
+        else:
+            with open(os.path.join(path, "docker-compose.yml"), 'w') as f:
+                f.write(f"services:\n  app:\n    image: {image}\n")
+        paths.append(path)
+    return paths
+
+
+def _max_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _percentiles(samples: list[float]) -> dict:
+    """Summarise latencies in seconds as milliseconds."""
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.fmean(ordered) * 1000, 3),
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': round(ordered[-1] * 1000, 3)
+    }
+
+
+def _measure_updates(config: dict, paths: list[str]) -> dict:
+    import docker_manager
+
+    options = {'mode': config['mode'], 'on_output': lambda line: None}
+    started = time.perf_counter()
+    if config['measure'] == "serial":
+        failures = sum(1 for path in paths if not docker_manager.update_docker_stack(path, **options)[0])
+    else:
+        batch = docker_manager.update_docker_containers(paths, max_workers=config['workers'],
+                                                        dedupe_pulls=config['dedupe_pulls'], **options)
+        failures = sum(1 for result in batch['results'] if not result['success'])
+    return {'duration': time.perf_counter() - started, 'failures': failures}
+
+
+def _start_server(app, server_name: str, threads: int) -> tuple[int, Callable[[], None]]:
+    """Serve app on a free local port in the background; returns the port and a shutdown function."""
+    if server_name == "waitress":
+        from waitress import create_server
+
+        httpd = create_server(app, host="127.0.0.1", port=0, threads=threads)
+        threading.Thread(target=httpd.run, daemon=True).start()
+        return httpd.effective_port, httpd.close
+
+    import logging
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    httpd = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd.server_port, httpd.shutdown
+
+
+def _measure_http(config: dict, paths: list[str]) -> dict:
+    import http.client
+
+    imported = time.perf_counter()
+    import server
+    startup = time.perf_counter() - imported
+
+    port, shutdown = _start_server(server.app, config['server'], server.SERVER_THREADS)
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+
+        def request(method: str, url: str, body: dict = None) -> tuple[float, dict]:
+            sent = time.perf_counter()
+            connection.request(method, url, body=json.dumps(body) if body is not None else None,
+                               headers={'Content-Type': 'application/json'})
+            payload = json.loads(connection.getresponse().read())
+            return time.perf_counter() - sent, payload
+
+        return request
+
+    request = client()
+
+    # The web interface as a browser loads it, then as it revalidates on reload
+    ui_connection = http.client.HTTPConnection("127.0.0.1", port)
+    ui_headers = {'Accept-Encoding': 'gzip, deflate, br'}
+    ui_latencies, ui_revalidate_latencies = [], []
+    for latencies in (ui_latencies, ui_revalidate_latencies):
+        for _ in range(LIST_REQUESTS):
+            sent = time.perf_counter()
+            ui_connection.request("GET", "/", headers=ui_headers)
+            response = ui_connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - sent)
+        ui_headers = dict(ui_headers, **{'If-None-Match': response.getheader('ETag')})
+    ui_connection.close()
+
+    root = os.path.dirname(paths[0])
+    list_url = f"/list-directories?details=1&path={root}"
+    first_list, _ = request("GET", list_url)
+    list_latencies = [request("GET", list_url)[0] for _ in range(LIST_REQUESTS)]
+
+    # The same requests from several clients at once, each on its own connection
+    concurrent_latencies = []
+
+    def list_repeatedly() -> None:
+        own_request = client()
+        concurrent_latencies.extend(own_request("GET", list_url)[0] for _ in range(LIST_REQUESTS))
+
+    clients = [threading.Thread(target=list_repeatedly) for _ in range(config['concurrency'])]
+    concurrent_started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    concurrent_duration = time.perf_counter() - concurrent_started
+
+    started = time.perf_counter()
+    submit_latencies, job_ids = [], []
+    for path in paths:
+        latency, payload = request("POST", "/update-docker", {'path': path, 'mode': config['mode']})
+        submit_latencies.append(latency)
+        job_ids.append(payload['job_id'])
+
+    # Follow the jobs through the same API the web interface uses; the oldest
+    # finished jobs may already be forgotten in large runs
+    pending = set(job_ids)
+    while pending:
+        time.sleep(0.05)
+        jobs = {job['id']: job for job in request("GET", "/jobs")[1]}
+        pending = {job_id for job_id in pending if job_id in jobs and jobs[job_id]['state'] in ("queued", "running")}
+    duration = time.perf_counter() - started
+    summary = request("GET", f"/history/summary?root={root}")[1]
+    shutdown()
+
+    return {
+        'duration': duration,
+        'failures': sum(1 for stack in summary if not stack['last_success']),
+        'server': config['server'],
+        'startup_ms': round(startup * 1000, 3),
+        'list_directories_first_ms': round(first_list * 1000, 3),
+        'list_directories_ms': _percentiles(list_latencies),
+        'list_directories_concurrent_ms': _percentiles(concurrent_latencies),
+        'list_directories_concurrent_rps': round(len(concurrent_latencies) / concurrent_duration, 1),
+        'ui_ms': _percentiles(ui_latencies),
+        'ui_revalidate_ms': _percentiles(ui_revalidate_latencies),
+        'update_docker_ms': _percentiles(submit_latencies)
+    }
+
+
+def run_measurement(config: dict) -> dict:
+    """Run one measurement in the current process and return its result."""
+    paths = sorted(os.path.join(config['stacks_dir'], name) for name in os.listdir(config['stacks_dir']))
+    log_path = os.path.join(config['bench_dir'], "commands.log")
+    open(log_path, 'w').close()
+
+    sys.path.insert(0, MODULE_DIR)
+    if config['measure'] == "http":
+        result = _measure_http(config, paths)
+    else:
+        result = _measure_updates(config, paths)
+
+    with open(log_path, 'r') as f:
+        commands = [line.strip() for line in f]
+    # Only the stub commands that sleep count towards the simulated docker time
+    docker_time = sum(1 for command in commands
+                      if command not in ("docker-compose config", "docker image", "docker ps", "docker container"))
+    docker_time *= config['latency']
+
+    duration = result['duration']
+    parallelism = 1 if config['measure'] == "serial" else min(config['workers'], len(paths))
+    result.update(
+        measure=config['measure'],
+        stacks=len(paths),
+        duration=round(duration, 3),
+        stacks_per_minute=round(len(paths) / duration * 60, 1),
+        docker_commands=len(commands),
+        # Wall time per stack not explained by the stubs' simulated latency
+        overhead_per_stack_ms=round(max(0.0, duration * parallelism - docker_time) / len(paths) * 1000, 3),
+        max_rss_kb=_max_rss_kb()
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark docker_manager and server.py with stub docker binaries")
+    parser.add_argument("--stacks", default="1,10,100",
+                        help="Comma-separated numbers of synthetic stacks, 1 to 1000 (default: 1,10,100)")
+    parser.add_argument("--measure", default=",".join(MODES),
+                        help=f"Comma-separated measurements out of {', '.join(MODES)} (default: all)")
+    parser.add_argument("--latency", type=float, default=0.01,
+                        help="Seconds every stubbed docker command takes (default: 0.01)")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="Share of stubbed docker commands that fail, 0 to 1 (default: 0)")
+    parser.add_argument("--mode", default="recreate", help="Update mode passed to every update (default: recreate)")
+    parser.add_argument("-j", "--workers", type=int, default=4,
+                        help="Workers of the batch and HTTP measurements (default: 4)")
+    parser.add_argument("--dedupe-pulls", action="store_true", help="Deduplicate pulls in the batch measurement")
+    parser.add_argument("--run-ratio", type=float, default=0.0,
+                        help="Share of stacks using docker-run-command.txt instead of compose (default: 0)")
+    parser.add_argument("--server", choices=SERVERS, default="waitress",
+                        help="WSGI server of the HTTP measurement (default: waitress, as in production)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Clients sending /list-directories requests at once (default: 8)")
+    parser.add_argument("-o", "--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--run-measurement", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_measurement:
+        print(json.dumps(run_measurement(json.loads(args.run_measurement))))
+        return
+
+    counts = [int(count) for count in args.stacks.split(",")]
+    measures = args.measure.split(",")
+    if any(count < 1 or count > 1000 for count in counts):
+        parser.error("--stacks values must be between 1 and 1000")
+    if any(measure not in MODES for measure in measures):
+        parser.error(f"--measure values must be out of {', '.join(MODES)}")
+    if not 0 <= args.failure_rate <= 1:
+        parser.error("--failure-rate must be between 0 and 1")
+
+    bench_dir = tempfile.mkdtemp(prefix="docker-update-bench-")
+    env = dict(os.environ,
+               PATH=create_stubs(bench_dir) + os.pathsep + os.environ.get("PATH", ""),
+               BENCH_DIR=bench_dir,
+               BENCH_LATENCY=str(args.latency),
+               BENCH_FAIL_THRESHOLD=str(int(args.failure_rate * 65536)),
+               DOCKER_UPDATE_MAX_WORKERS=str(args.workers),
+               DOCKER_UPDATE_HISTORY_DB=os.path.join(bench_dir, "history.db"),
+               DOCKER_UPDATE_ROOTS="",
+               DOCKER_UPDATE_SCHEDULE_INTERVAL="")
+
+    results = []
+    try:
+        for count in counts:
+            stacks_dir = os.path.join(bench_dir, f"stacks-{count}")
+            create_stacks(stacks_dir, count, args.run_ratio)
+            for measure in measures:
+                config = {
+                    'measure': measure,
+                    'bench_dir': bench_dir,
+                    'stacks_dir': stacks_dir,
+                    'latency': args.latency,
+                    'mode': args.mode,
+                    'workers': args.workers,
+                    'dedupe_pulls': args.dedupe_pulls,
+                    'server': args.server,
+                    'concurrency': args.concurrency
+                }
+                process = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-measurement",
+                                          json.dumps(config)], env=env, capture_output=True, text=True)
+                if process.returncode != 0:
+                    sys.exit(f"{measure} with {count} stacks failed:\n{process.stderr}")
+                result = json.loads(process.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(f"{measure:>6} {count:>5} stacks: {result['stacks_per_minute']:>9.1f} stacks/min, "
+                      f"{result['overhead_per_stack_ms']:.1f} ms overhead/stack, {result['max_rss_kb']} KB peak RSS",
+                      file=sys.stderr)
+    finally:
+        shutil.rmtree(bench_dir, ignore_errors=True)
+
+    # Batch speed relative to the serial run with the same number of stacks
+    serial = {result['stacks']: result['duration'] for result in results if result['measure'] == "serial"}
+    for result in results:
+        if result['measure'] != "serial" and result['stacks'] in serial:
+            result['speedup_vs_serial'] = round(serial[result['stacks']] / result['duration'], 2)
+
+    output = json.dumps({
+        'config': {
+            'latency': args.latency,
+            'failure_rate': args.failure_rate,
+            'mode': args.mode,
+            'workers': args.workers,
+            'dedupe_pulls': args.dedupe_pulls,
+            'run_ratio': args.run_ratio,
+            'server': args.server,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time()
+        },
+        'results': results
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
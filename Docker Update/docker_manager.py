@@ -1,24 +1,1143 @@
+import functools
+import hashlib
+import http.client
+import json
 import os
+import queue
+import re
+import shlex
+import shutil
+import signal
+import socket
 import subprocess
-from typing import Optional
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from urllib.parse import quote, urlencode
 
+import yaml
 
-def update_docker_container(path: str) -> tuple[bool, Optional[str]]:
+import registry
+
+# Default number of stacks updated at the same time by a batch update
+DEFAULT_MAX_WORKERS = 4
+
+# Default number of images pulled at the same time by a deduplicated batch update
+DEFAULT_PULL_WORKERS = 4
+
+# `docker run` options that do not take a value, used to find the image argument
+DOCKER_RUN_FLAGS = {
+    "-d", "--detach", "-i", "--interactive", "-t", "--tty", "--rm", "--privileged",
+    "-P", "--publish-all", "--init", "--read-only", "--no-healthcheck",
+    "--oom-kill-disable", "--disable-content-trust", "-q", "--quiet"
+}
+
+# `docker run` options understood by _parse_run_command(): option -> (spec key, kind).
+# 'value' options keep their last value, 'list' options collect every value
+DOCKER_RUN_OPTIONS = {
+    "--name": ("name", "value"),
+    "-e": ("env", "list"), "--env": ("env", "list"),
+    "-p": ("ports", "list"), "--publish": ("ports", "list"),
+    "-v": ("volumes", "list"), "--volume": ("volumes", "list"),
+    "-l": ("labels", "list"), "--label": ("labels", "list"),
+    "--restart": ("restart", "value"),
+    "--network": ("network", "value"), "--net": ("network", "value"),
+    "-w": ("workdir", "value"), "--workdir": ("workdir", "value"),
+    "-u": ("user", "value"), "--user": ("user", "value"),
+    "-h": ("hostname", "value"), "--hostname": ("hostname", "value"),
+    "--entrypoint": ("entrypoint", "value"),
+    "--cap-add": ("cap_add", "list"),
+    "--add-host": ("extra_hosts", "list"),
+    "--dns": ("dns", "list"),
+    "-d": ("detach", "flag"), "--detach": ("detach", "flag"),
+    "--rm": ("auto_remove", "flag"),
+    "-i": ("interactive", "flag"), "--interactive": ("interactive", "flag"),
+    "-t": ("tty", "flag"), "--tty": ("tty", "flag"),
+    "--init": ("init", "flag"),
+    "--privileged": ("privileged", "flag"),
+    "--read-only": ("read_only", "flag")
+}
+
+# Files next to docker-compose.yml that change the services it describes
+COMPOSE_OVERRIDE_FILES = ("docker-compose.override.yml", "docker-compose.override.yaml")
+
+# File in a stack directory listing the stack directories it must be updated after,
+# one per line and relative to the stack directory, see plan_update_waves()
+UPDATE_AFTER_FILE = "update-after.txt"
+
+# Labels put on containers started from docker-run-command.txt: the hash of the parsed
+# command, and the stack directory they belong to
+SPEC_HASH_LABEL = "docker-update.spec-hash"
+STACK_LABEL = "docker-update.stack"
+
+# Supported update modes, see update_docker_stack()
+UPDATE_MODES = ("recreate", "skip-unchanged", "low-downtime")
+
+# Phases an update can go through, in the order they run
+PHASES = ("down", "pull", "up", "run")
+
+# Seconds a timed out or cancelled command gets to exit after SIGTERM before it is killed
+KILL_GRACE_PERIOD = 10
+
+# Supported ways of talking to Docker: the command line clients or the Engine API
+BACKENDS = ("cli", "api")
+
+# Engine API socket used by the api backend unless DOCKER_HOST points at another unix socket
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
+
+# Number of idle keep-alive connections the api backend keeps open
+ENGINE_POOL_SIZE = 8
+
+# Number of recent output lines an update keeps in memory and reports when it fails
+OUTPUT_TAIL_LINES = 50
+
+# Number of those lines appended to the error message of a failed command
+ERROR_TAIL_LINES = 10
+
+# Number of events stream_docker_stack() buffers before the update waits for the reader
+STREAM_BUFFER_EVENTS = 1000
+
+# Directory holding Docker's images, whose free space the disk budget of a batch update watches
+DEFAULT_DOCKER_ROOT = "/var/lib/docker"
+
+# Download size assumed for images whose manifest cannot be read (bytes)
+DEFAULT_IMAGE_SIZE = 256 * 1024 ** 2
+
+# Disk space an image takes once extracted, as a multiple of its compressed download size
+DISK_USAGE_FACTOR = 2.5
+
+# Number of registries asked for image sizes at the same time
+SIZE_ESTIMATE_WORKERS = 8
+
+# Multipliers of the size suffixes accepted by parse_size()
+SIZE_UNITS = {"": 0, "k": 1, "m": 2, "g": 3, "t": 4}
+
+
+class UpdateCancelled(Exception):
+    """Raised when a running update is cancelled."""
+
+
+def _kill_process_tree(process: subprocess.Popen) -> None:
     """
-    Check for Docker configuration files and manage container accordingly.
+    Stop a process started by _run_command() together with all of its children.
+    
+    The process leads its own process group (or job on Windows), so the whole
+    tree is signalled at once. It gets KILL_GRACE_PERIOD seconds to exit after
+    SIGTERM before the group is killed.
+    """
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)], capture_output=True)
+        return
+    
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(KILL_GRACE_PERIOD)
+    except subprocess.TimeoutExpired:
+        pass
+    # Children that ignored SIGTERM or outlived the leader are still in the group
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _popen_args(cwd: Optional[str]) -> dict:
+    """Return Popen arguments that start a text mode command in its own process group (or job on Windows)."""
+    popen_args = {'cwd': cwd, 'text': True, 'errors': "replace"}
+    if os.name == "nt":
+        popen_args['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        popen_args['start_new_session'] = True
+    return popen_args
+
+
+def _run_command(args: list[str], cwd: Optional[str] = None,
+                 on_output: Optional[Callable[[str], None]] = None,
+                 timeout: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None) -> None:
+    """
+    Run a command, forwarding its combined output line by line.
+    
+    Without an on_output callback the lines are printed to the server's stdout.
+    The last ERROR_TAIL_LINES lines are kept, so a failure can say what went
+    wrong without buffering the whole output. The command runs in its own
+    process group; when the timeout expires or cancel_event is set, the whole
+    process tree is killed.
+    
+    Raises:
+        subprocess.CalledProcessError: If the command exits with a non-zero status;
+            its output holds the last lines the command printed
+        subprocess.TimeoutExpired: If the command ran longer than timeout seconds
+        UpdateCancelled: If cancel_event was set before or while the command ran
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise UpdateCancelled(f"Cancelled before running {args[0]}")
+    
+    process = subprocess.Popen(args, **_popen_args(cwd), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    tail = deque(maxlen=ERROR_TAIL_LINES)
+    finished = threading.Event()
+    stop_reason = []
+    
+    def watchdog() -> None:
+        deadline = time.monotonic() + timeout if timeout else None
+        while not finished.wait(0.2):
+            if cancel_event is not None and cancel_event.is_set():
+                stop_reason.append("cancelled")
+            elif deadline is not None and time.monotonic() >= deadline:
+                stop_reason.append("timeout")
+            else:
+                continue
+            _kill_process_tree(process)
+            return
+    
+    if timeout or cancel_event is not None:
+        threading.Thread(target=watchdog, name="command-watchdog", daemon=True).start()
+    
+    try:
+        for line in process.stdout:
+            line = line.rstrip()
+            if line:
+                tail.append(line)
+                if on_output is not None:
+                    on_output(line)
+                else:
+                    print(line, flush=True)
+        process.wait()
+    finally:
+        finished.set()
+        if process.poll() is None:
+            _kill_process_tree(process)
+        process.stdout.close()
+    
+    if "timeout" in stop_reason:
+        raise subprocess.TimeoutExpired(args, timeout)
+    if "cancelled" in stop_reason:
+        raise UpdateCancelled(f"Cancelled while running {args[0]}")
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args, output="\n".join(tail))
+
+
+def _capture_command(args: list[str], cwd: Optional[str] = None, timeout: Optional[float] = None,
+                     cancel_event: Optional[threading.Event] = None,
+                     check: bool = True) -> subprocess.CompletedProcess:
+    """
+    Run a short command and return its captured stdout and stderr.
+    
+    Like _run_command() the command runs in its own process group and the
+    whole process tree is killed when the timeout expires or cancel_event is
+    set, so a hanging lookup cannot hold an update past its phase timeout.
+    
+    Raises:
+        subprocess.CalledProcessError: With check, if the command exits with a
+            non-zero status; its stderr holds what the command reported
+        subprocess.TimeoutExpired: If the command ran longer than timeout seconds
+        UpdateCancelled: If cancel_event was set before or while the command ran
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise UpdateCancelled(f"Cancelled before running {args[0]}")
+    
+    process = subprocess.Popen(args, **_popen_args(cwd), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=0.2)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if cancel_event is not None and cancel_event.is_set():
+                raise UpdateCancelled(f"Cancelled while running {args[0]}")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(args, timeout)
+    finally:
+        if process.poll() is None:
+            _kill_process_tree(process)
+            process.communicate()
+    
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+def _command_error(e: subprocess.CalledProcessError) -> str:
+    """Describe a failed command together with the last lines it printed."""
+    detail = e.output or e.stderr
+    return f"{str(e)}\n{detail.strip()}" if detail else str(e)
+
+
+class _PhaseTimer:
+    """
+    Phase callback that records how long each phase takes.
+    
+    Calling it with a phase name closes the running phase and starts the new
+    one; calling it with None only closes the running phase. Durations in
+    seconds are added to phases, and phase names are passed on to on_phase.
+    The running phase is available as .phase.
+    """
+
+    def __init__(self, phases: dict[str, float], on_phase: Optional[Callable[[str], None]] = None):
+        self.phase = None
+        self._phases = phases
+        self._on_phase = on_phase
+        self._started = 0.0
+
+    def __call__(self, phase: Optional[str]) -> None:
+        now = time.monotonic()
+        if self.phase:
+            self._phases[self.phase] = round(self._phases.get(self.phase, 0.0) + now - self._started, 3)
+        self.phase, self._started = phase, now
+        if phase and self._on_phase:
+            self._on_phase(phase)
+
+
+def _compose_config(path: str, timeout: Optional[float] = None,
+                    cancel_event: Optional[threading.Event] = None) -> dict:
+    """
+    Return the compose configuration of the project at path.
+    
+    The configuration is read through `docker-compose config` so variable
+    interpolation, .env files and overrides are resolved the same way compose
+    resolves them. timeout and cancel_event are handled by _capture_command().
+    """
+    result = _capture_command(["docker-compose", "config"], cwd=path, timeout=timeout,
+                              cancel_event=cancel_event)
+    config = yaml.safe_load(result.stdout)
+    return config if isinstance(config, dict) else {}
+
+
+def _compose_service_images(path: str, timeout: Optional[float] = None,
+                            cancel_event: Optional[threading.Event] = None) -> dict[str, Optional[str]]:
+    """
+    Return the image of every service in the compose project at path.
+    
+    Services that are only built locally map to None.
+    """
+    services = _compose_config(path, timeout=timeout, cancel_event=cancel_event).get("services") or {}
+    return {name: (service or {}).get("image") for name, service in services.items()}
+
+
+def _parse_run_command(run_command: str) -> dict:
+    """
+    Parse a `docker run` command line into a container spec.
+    
+    Options listed in DOCKER_RUN_OPTIONS are mapped to spec keys; any other
+    option is kept in spec['unsupported'] as an (option, value) pair, value
+    None for flags, so callers can tell the spec is incomplete and the spec
+    hash still changes with the value. Values may follow as the next argument,
+    after "=" or, for short options, attached (-p8080:80). The first argument
+    that is not an option is the image and everything after it is the
+    container command.
+    
+    Returns:
+        dict: The spec, with 'image' set to None if no image was found
+    """
+    spec = {'image': None, 'command': [], 'unsupported': []}
+    for key, kind in DOCKER_RUN_OPTIONS.values():
+        spec.setdefault(key, [] if kind == "list" else (False if kind == "flag" else None))
+    
+    args = shlex.split(run_command)
+    if "run" not in args:
+        return spec
+    
+    def is_flag(option: str) -> bool:
+        return DOCKER_RUN_OPTIONS.get(option, (None, None))[1] == "flag" or option in DOCKER_RUN_FLAGS
+    
+    def set_flag(option: str) -> None:
+        if option in DOCKER_RUN_OPTIONS:
+            spec[DOCKER_RUN_OPTIONS[option][0]] = True
+        else:
+            spec['unsupported'].append((option, None))
+    
+    args = args[args.index("run") + 1:]
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--" or not arg.startswith("-"):
+            rest = args[i + 1:] if arg == "--" else args[i:]
+            if rest:
+                spec['image'], spec['command'] = rest[0], rest[1:]
+            break
+        
+        if arg.startswith("--"):
+            option, has_inline_value, value = arg.partition("=")
+        else:
+            # Short flags may be bundled (-dit) and the last short option may carry
+            # its value (-p8080:80, -e=FOO=bar), like the docker client accepts
+            j = 1
+            while j < len(arg) - 1 and is_flag(f"-{arg[j]}"):
+                set_flag(f"-{arg[j]}")
+                j += 1
+            option, attached = f"-{arg[j]}", arg[j + 1:]
+            has_inline_value = bool(attached)
+            value = attached[1:] if attached.startswith("=") else attached
+        
+        key, kind = DOCKER_RUN_OPTIONS.get(option, (None, None))
+        if is_flag(option):
+            set_flag(option)
+            i += 1
+            continue
+        
+        if not has_inline_value:
+            value = args[i + 1] if i + 1 < len(args) else ""
+            i += 1
+        i += 1
+        
+        if key is None:
+            spec['unsupported'].append((option, value))
+        elif kind == "list":
+            spec[key].append(value)
+        else:
+            spec[key] = value
+    return spec
+
+
+@functools.lru_cache(maxsize=256)
+def _run_spec(run_command: str) -> tuple[dict, str]:
+    """
+    Return the spec of a `docker run` command line and a hash of it.
+    
+    Results are cached per command line, so the returned spec is shared and
+    must not be modified. The hash only depends on the parsed spec, so
+    reformatting the command does not change it.
+    """
+    spec = _parse_run_command(run_command)
+    spec_hash = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+    return spec, spec_hash
+
+
+def _run_command_image(run_command: str) -> Optional[str]:
+    """Return the image a `docker run` command line starts, or None if it cannot be found."""
+    return _run_spec(run_command)[0]['image']
+
+
+def _container_state(data: dict) -> dict:
+    """Reduce container inspect data to its 'id', 'name', 'image' ID, 'running' and 'labels'."""
+    return {
+        'id': data['Id'],
+        'name': data['Name'].lstrip("/"),
+        'image': data['Image'],
+        'running': bool(data['State'].get('Running')),
+        'labels': data['Config'].get('Labels') or {}
+    }
+
+
+def _container_config(spec: dict) -> dict:
+    """Turn a spec from _parse_run_command() into an Engine API container create body."""
+    exposed_ports, port_bindings = {}, {}
+    for port in spec['ports']:
+        # [ip:][host:]container[/protocol]
+        port, _, protocol = port.partition("/")
+        parts = port.split(":")
+        key = f"{parts[-1]}/{protocol or 'tcp'}"
+        exposed_ports[key] = {}
+        port_bindings.setdefault(key, []).append({
+            'HostIp': parts[0] if len(parts) == 3 else "",
+            'HostPort': parts[-2] if len(parts) >= 2 else ""
+        })
+    
+    binds = [volume for volume in spec['volumes'] if ":" in volume]
+    volumes = {volume: {} for volume in spec['volumes'] if ":" not in volume}
+    labels = dict(label.partition("=")[::2] for label in spec['labels'])
+    
+    host_config = {
+        'PortBindings': port_bindings,
+        'Binds': binds,
+        'AutoRemove': spec['auto_remove'],
+        'Init': spec['init'],
+        'Privileged': spec['privileged'],
+        'ReadonlyRootfs': spec['read_only'],
+        'CapAdd': spec['cap_add'],
+        'ExtraHosts': spec['extra_hosts'],
+        'Dns': spec['dns']
+    }
+    if spec['restart']:
+        name, _, retries = spec['restart'].partition(":")
+        host_config['RestartPolicy'] = {'Name': name, 'MaximumRetryCount': int(retries or 0)}
+    if spec['network']:
+        host_config['NetworkMode'] = spec['network']
+    
+    config = {
+        'Image': spec['image'],
+        'Env': spec['env'],
+        'Labels': labels,
+        'ExposedPorts': exposed_ports,
+        'Volumes': volumes,
+        'Tty': spec['tty'],
+        'OpenStdin': spec['interactive'],
+        'HostConfig': host_config
+    }
+    if spec['command']:
+        config['Cmd'] = spec['command']
+    if spec['entrypoint'] is not None:
+        config['Entrypoint'] = [spec['entrypoint']] if spec['entrypoint'] else []
+    for key, field in (('workdir', 'WorkingDir'), ('user', 'User'), ('hostname', 'Hostname')):
+        if spec[key]:
+            config[field] = spec[key]
+    return config
+
+
+class DockerEngineError(Exception):
+    """Raised when the Docker Engine API answers with an error."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class DockerCLI:
+    """
+    Docker backend that runs the `docker` command line client.
+    
+    Every command runs through _run_command() or _capture_command(), so it is
+    killed with its process tree on timeout or once cancel_event is set.
+    
+    Args:
+        cancel_event (Optional[threading.Event]): Event that cancels the running command
+    """
+
+    def __init__(self, cancel_event: Optional[threading.Event] = None):
+        self.cancel_event = cancel_event
+
+    def _capture(self, args: list[str], timeout: Optional[float], check: bool = True) -> subprocess.CompletedProcess:
+        return _capture_command(["docker"] + args, timeout=timeout, cancel_event=self.cancel_event, check=check)
+
+    def image_id(self, image: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Return the ID (config digest) of a local image, or None if it is not present."""
+        result = self._capture(["image", "inspect", "--format", "{{.Id}}", image], timeout, check=False)
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+
+    def repo_digests(self, image: str, timeout: Optional[float] = None) -> list[str]:
+        """Return the repository digests of a local image, empty if it is not present."""
+        result = self._capture(["image", "inspect", "--format", "{{json .RepoDigests}}", image], timeout,
+                               check=False)
+        if result.returncode != 0:
+            return []
+        return json.loads(result.stdout or "null") or []
+
+    def pull_image(self, image: str, on_output: Optional[Callable[[str], None]] = None,
+                   timeout: Optional[float] = None) -> None:
+        """Pull an image; raises subprocess.CalledProcessError or TimeoutExpired on failure."""
+        _run_command(["docker", "pull", image], on_output=on_output, timeout=timeout,
+                     cancel_event=self.cancel_event)
+
+    def prune_images(self, timeout: Optional[float] = None) -> Optional[int]:
+        """Remove dangling images; returns the bytes reclaimed, or None if the client did not say."""
+        result = self._capture(["image", "prune", "--force"], timeout)
+        match = re.search(r"Total reclaimed space:\s*(\S+)", result.stdout)
+        # The client prints decimal units, e.g. 1.2GB
+        return parse_size(match.group(1), base=1000) if match else None
+
+    def find_containers(self, label: str, name: Optional[str] = None,
+                        timeout: Optional[float] = None) -> list[dict]:
+        """Return the containers with a label ('key=value') or the given name, see _container_state()."""
+        result = self._capture(["ps", "--all", "--quiet", "--no-trunc", "--filter", f"label={label}"], timeout)
+        ids = result.stdout.split() + ([name] if name else [])
+        if not ids:
+            return []
+        # Exits non-zero when the name is unknown, but still prints every container it found
+        result = self._capture(["container", "inspect"] + ids, timeout, check=False)
+        containers = {data['Id']: _container_state(data) for data in json.loads(result.stdout or "[]")}
+        return list(containers.values())
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix domain socket."""
+
+    def __init__(self, socket_path: str):
+        super().__init__("localhost", timeout=None)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerEngineClient:
+    """
+    Docker backend that talks to the Engine HTTP API over a unix socket.
+    
+    Connections are kept alive and reused from a small pool, so a batch of
+    updates costs a handful of socket connections instead of one process per
+    docker command.
+    
+    Args:
+        socket_path (str): Path of the Engine API socket
+        pool_size (int): Maximum number of idle connections kept open
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_DOCKER_SOCKET, pool_size: int = ENGINE_POOL_SIZE):
+        self.socket_path = socket_path
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+
+    @contextmanager
+    def _connection(self):
+        try:
+            connection, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            connection, reused = _UnixHTTPConnection(self.socket_path), False
+        try:
+            yield connection, reused
+        except Exception:
+            connection.close()
+            raise
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None,
+                 on_line: Optional[Callable[[dict], None]] = None,
+                 timeout: Optional[float] = None) -> tuple[int, Any]:
+        """
+        Send a request and return the status code and decoded JSON body.
+        
+        With on_line the response is read as a stream of JSON objects, one per
+        line, and each object is passed to on_line as it arrives. The timeout
+        limits how long the daemon may stay silent, not the whole request.
+        
+        Raises:
+            DockerEngineError: If the daemon cannot be reached
+            subprocess.TimeoutExpired: If the daemon sent nothing for timeout seconds
+        """
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+        
+        for attempt in range(2):
+            with self._connection() as (connection, reused):
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                try:
+                    connection.request(method, path, body=data, headers=headers)
+                    response = connection.getresponse()
+                except (ConnectionError, http.client.RemoteDisconnected) as e:
+                    # The daemon may have closed an idle keep-alive connection; retry once on a new one
+                    if reused and attempt == 0:
+                        connection.close()
+                        continue
+                    raise DockerEngineError(f"Cannot reach the Docker engine at {self.socket_path}: {str(e)}")
+                except TimeoutError as e:
+                    raise subprocess.TimeoutExpired(f"{method} {path}", timeout) from e
+                except OSError as e:
+                    raise DockerEngineError(f"Cannot reach the Docker engine at {self.socket_path}: {str(e)}")
+                
+                try:
+                    if on_line is not None and response.status < 400:
+                        for line in iter(response.readline, b""):
+                            if line.strip():
+                                on_line(json.loads(line))
+                        # Finishes the response even when it had no body, so the connection can be reused
+                        response.read()
+                        return response.status, None
+                    
+                    payload = response.read()
+                except TimeoutError as e:
+                    raise subprocess.TimeoutExpired(f"{method} {path}", timeout) from e
+                if response.will_close:
+                    connection.close()
+                try:
+                    return response.status, json.loads(payload) if payload else None
+                except ValueError:
+                    return response.status, payload.decode(errors="replace")
+
+    def _check(self, status: int, payload: Any, action: str) -> None:
+        if status >= 400:
+            message = payload.get('message') if isinstance(payload, dict) else payload
+            raise DockerEngineError(f"{action} failed ({status}): {message}", status)
+
+    def image_id(self, image: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Return the ID (config digest) of a local image, or None if it is not present."""
+        status, payload = self._request("GET", f"/images/{quote(image, safe='/:@')}/json", timeout=timeout)
+        if status == 404:
+            return None
+        self._check(status, payload, f"Inspect of image {image}")
+        return payload.get('Id')
+
+    def repo_digests(self, image: str, timeout: Optional[float] = None) -> list[str]:
+        """Return the repository digests of a local image, empty if it is not present."""
+        status, payload = self._request("GET", f"/images/{quote(image, safe='/:@')}/json", timeout=timeout)
+        if status == 404:
+            return []
+        self._check(status, payload, f"Inspect of image {image}")
+        return payload.get('RepoDigests') or []
+
+    def prune_images(self, timeout: Optional[float] = None) -> Optional[int]:
+        """Remove dangling images; returns the bytes reclaimed."""
+        filters = json.dumps({'dangling': ["true"]})
+        status, payload = self._request("POST", f"/images/prune?{urlencode({'filters': filters})}",
+                                        timeout=timeout)
+        self._check(status, payload, "Image prune")
+        return payload.get('SpaceReclaimed')
+
+    def pull_image(self, image: str, on_output: Optional[Callable[[str], None]] = None,
+                   timeout: Optional[float] = None) -> None:
+        """Pull an image; raises DockerEngineError or subprocess.TimeoutExpired on failure."""
+        if "@" in image:
+            query = {'fromImage': image}
+        else:
+            name, _, tag = image.rpartition(":")
+            if not name or "/" in tag:
+                name, tag = image, "latest"
+            query = {'fromImage': name, 'tag': tag}
+        
+        errors = []
+        
+        def on_line(message: dict) -> None:
+            if message.get('error'):
+                errors.append(message['error'])
+            elif on_output and message.get('status') and 'progress' not in message:
+                prefix = f"{message['id']}: " if message.get('id') else ""
+                on_output(f"{prefix}{message['status']}")
+        
+        status, payload = self._request("POST", f"/images/create?{urlencode(query)}", on_line=on_line,
+                                        timeout=timeout)
+        self._check(status, payload, f"Pull of {image}")
+        if errors:
+            raise DockerEngineError(f"Pull of {image} failed: {errors[-1]}")
+
+    def inspect_container(self, name: str, timeout: Optional[float] = None) -> Optional[dict]:
+        """Return the inspect data of a container, or None if it does not exist."""
+        status, payload = self._request("GET", f"/containers/{quote(name)}/json", timeout=timeout)
+        if status == 404:
+            return None
+        self._check(status, payload, f"Inspect of container {name}")
+        return payload
+
+    def stop_container(self, container_id: str, timeout: Optional[float] = None) -> None:
+        """Stop a container; stopping a stopped container is not an error."""
+        status, payload = self._request("POST", f"/containers/{container_id}/stop", timeout=timeout)
+        if status not in (304, 404):
+            self._check(status, payload, f"Stop of container {container_id}")
+
+    def remove_container(self, container_id: str, timeout: Optional[float] = None) -> None:
+        """Remove a container; removing a container that is already gone is not an error."""
+        status, payload = self._request("DELETE", f"/containers/{container_id}", timeout=timeout)
+        if status != 404:
+            self._check(status, payload, f"Removal of container {container_id}")
+
+    def create_container(self, name: Optional[str], config: dict, timeout: Optional[float] = None) -> str:
+        """Create a container and return its ID."""
+        query = f"?{urlencode({'name': name})}" if name else ""
+        status, payload = self._request("POST", f"/containers/create{query}", body=config, timeout=timeout)
+        self._check(status, payload, "Container create")
+        return payload['Id']
+
+    def start_container(self, container_id: str, timeout: Optional[float] = None) -> None:
+        """Start a created container."""
+        status, payload = self._request("POST", f"/containers/{container_id}/start", timeout=timeout)
+        if status != 304:
+            self._check(status, payload, f"Start of container {container_id}")
+
+    def find_containers(self, label: str, name: Optional[str] = None,
+                        timeout: Optional[float] = None) -> list[dict]:
+        """Return the containers with a label ('key=value') or the given name, see _container_state()."""
+        query = urlencode({'all': 'true', 'filters': json.dumps({'label': [label]})})
+        status, payload = self._request("GET", f"/containers/json?{query}", timeout=timeout)
+        self._check(status, payload, "Container list")
+        
+        containers = {}
+        for container_id in [container['Id'] for container in payload] + ([name] if name else []):
+            data = self.inspect_container(container_id, timeout=timeout)
+            if data:
+                containers[data['Id']] = _container_state(data)
+        return list(containers.values())
+
+    def run_container(self, spec: dict, on_output: Optional[Callable[[str], None]] = None,
+                      timeout: Optional[float] = None) -> str:
+        """
+        Create and start the container described by a spec from _parse_run_command().
+        
+        The image is only pulled when it is missing, as `docker run` does. The
+        timeout applies to every request, see _request().
+        
+        Returns:
+            str: ID of the new container
+        """
+        if not spec['image']:
+            raise DockerEngineError("No image found in docker-run-command.txt")
+        if spec['unsupported']:
+            raise DockerEngineError("Options not supported by the api backend: "
+                                    f"{', '.join(option for option, _ in spec['unsupported'])}; use the cli backend")
+        
+        config = _container_config(spec)
+        try:
+            container_id = self.create_container(spec['name'], config, timeout=timeout)
+        except DockerEngineError as e:
+            if e.status != 404:
+                raise
+            self.pull_image(spec['image'], on_output=on_output, timeout=timeout)
+            container_id = self.create_container(spec['name'], config, timeout=timeout)
+        
+        self.start_container(container_id, timeout=timeout)
+        if on_output:
+            on_output(container_id)
+        return container_id
+
+
+_engine_clients = {}
+_engine_clients_lock = threading.Lock()
+
+
+def _docker_backend(backend: str, cancel_event: Optional[threading.Event] = None):
+    """
+    Return the DockerCLI or the shared, pooled DockerEngineClient for a backend name.
+    
+    cancel_event only reaches the DockerCLI; engine requests are checked for
+    cancellation between calls instead.
+    """
+    if backend == "cli":
+        return DockerCLI(cancel_event)
+    
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    socket_path = docker_host[len("unix://"):] if docker_host.startswith("unix://") else DEFAULT_DOCKER_SOCKET
+    with _engine_clients_lock:
+        if socket_path not in _engine_clients:
+            _engine_clients[socket_path] = DockerEngineClient(socket_path)
+        return _engine_clients[socket_path]
+
+
+def _compose_file_is_complete(path: str, services: dict) -> bool:
+    """Tell whether docker-compose.yml alone describes the services of the project at path."""
+    if os.environ.get("COMPOSE_FILE") or any(os.path.isfile(os.path.join(path, name))
+                                             for name in COMPOSE_OVERRIDE_FILES):
+        return False
+    try:
+        with open(os.path.join(path, ".env"), 'r') as f:
+            if re.search(r"^\s*COMPOSE_FILE\s*=", f.read(), re.MULTILINE):
+                return False
+    except OSError:
+        pass
+    return not any("$" in str(service.get("image", "")) or "extends" in service
+                   for service in services.values() if isinstance(service, dict))
+
+
+def stack_images(path: str, timeout: Optional[float] = None,
+                 cancel_event: Optional[threading.Event] = None) -> list[str]:
+    """
+    Return the registry images a stack directory pulls.
+    
+    docker-compose.yml is read directly and only handed to `docker-compose config`
+    when image references use variables, services use extends or override
+    files are present; timeout and cancel_event limit that command, see
+    _capture_command(). Services that are built locally are left out, even
+    with an image name, as is anything that cannot be parsed; updates pull
+    those themselves.
+    """
+    compose_path = os.path.join(path, "docker-compose.yml")
+    run_command_path = os.path.join(path, "docker-run-command.txt")
+    
+    if os.path.isfile(compose_path):
+        with open(compose_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+        services = config.get("services") or {}
+        if not _compose_file_is_complete(path, services):
+            services = _compose_config(path, timeout=timeout, cancel_event=cancel_event).get("services") or {}
+        return sorted({service["image"] for service in services.values()
+                       if service and service.get("image") and "build" not in service})
+    
+    if os.path.isfile(run_command_path):
+        with open(run_command_path, 'r') as f:
+            image = _run_command_image(f.read().strip())
+        return [image] if image else []
+    
+    return []
+
+
+def _unpulled_services(service_images: dict[str, Optional[str]], pulled: Optional[dict]) -> list[str]:
+    """Return the services with an image the caller did not pull; none if it pulled nothing."""
+    if pulled is None:
+        return []
+    return sorted(service for service, image in service_images.items() if image and image not in pulled)
+
+
+def _pull_changed_services(path: str, service_images: dict[str, Optional[str]], report: dict,
+                           on_phase: Callable[[str], None], run: Callable[..., None],
+                           pulled: Optional[dict] = None, docker=None,
+                           timeouts: Optional[dict[str, float]] = None) -> list[str]:
+    """
+    Pull the images of a compose project and return the services whose image changed.
+    
+    service_images maps the services to their images, see
+    _compose_service_images(). Running containers keep serving during the
+    pull, and image lookups are limited by the pull timeout. The report receives the
+    image IDs before and after the pull and the 'restarted' and 'skipped'
+    service lists; services that are only built locally are skipped. When the
+    caller already pulled the images, pulled maps each image to its IDs before
+    and after that pull, and only the services whose image is not in it are
+    pulled here. Image IDs are looked up through the docker backend
+    (DockerCLI by default).
+    """
+    docker = docker or DockerCLI()
+    timeout = (timeouts or {}).get("pull")
+    images = {image for image in service_images.values() if image}
+    unpulled = _unpulled_services(service_images, pulled)
+    ids = dict(pulled or {})
+    
+    if pulled is None or unpulled:
+        own_images = {service_images[service] for service in unpulled} if pulled is not None else images
+        on_phase("pull")
+        before = {image: docker.image_id(image, timeout=timeout) for image in own_images}
+        run(["docker-compose", "pull"] + unpulled, cwd=path)
+        ids.update((image, (before[image], docker.image_id(image, timeout=timeout))) for image in own_images)
+    before = {image: ids.get(image, (None, None))[0] for image in images}
+    after = {image: ids.get(image, (None, None))[1] for image in images}
+    
+    report['images'] = {}
+    restarted, skipped = [], []
+    for service, image in sorted(service_images.items()):
+        if image:
+            report['images'][service] = {'image': image, 'before': before[image], 'after': after[image]}
+        if image and before[image] != after[image]:
+            restarted.append(service)
+        else:
+            skipped.append(service)
+    report['restarted'] = restarted
+    report['skipped'] = skipped
+    report['downtime'] = {service: 0.0 for service in skipped}
+    return restarted
+
+
+def _update_compose_skip_unchanged(path: str, service_images: dict[str, Optional[str]], report: dict,
+                                   on_phase: Callable[[str], None], run: Callable[..., None],
+                                   pulled: Optional[dict] = None, docker=None,
+                                   timeouts: Optional[dict[str, float]] = None) -> None:
+    """Pull first, then recreate all services whose image changed in one `up` call."""
+    restarted = _pull_changed_services(path, service_images, report, on_phase, run, pulled=pulled,
+                                       docker=docker, timeouts=timeouts)
+    if not restarted:
+        return
+    
+    on_phase("up")
+    started = time.monotonic()
+    run(["docker-compose", "up", "-d"] + restarted, cwd=path)
+    elapsed = round(time.monotonic() - started, 3)
+    report['downtime'].update({service: elapsed for service in restarted})
+
+
+def _update_compose_low_downtime(path: str, service_images: dict[str, Optional[str]], report: dict,
+                                 on_phase: Callable[[str], None], run: Callable[..., None],
+                                 pulled: Optional[dict] = None, docker=None,
+                                 timeouts: Optional[dict[str, float]] = None) -> None:
+    """
+    Pull first, then recreate the services whose image changed one at a time.
+    
+    Each service is only unavailable while its own container is replaced; the
+    time that takes is recorded per service in report['downtime'].
+    """
+    restarted = _pull_changed_services(path, service_images, report, on_phase, run, pulled=pulled,
+                                       docker=docker, timeouts=timeouts)
+    if not restarted:
+        return
+    
+    on_phase("up")
+    for service in restarted:
+        started = time.monotonic()
+        run(["docker-compose", "up", "-d", "--no-deps", service], cwd=path)
+        report['downtime'][service] = round(time.monotonic() - started, 3)
+
+
+def _update_compose_recreate(path: str, service_images: dict[str, Optional[str]], report: dict,
+                             on_phase: Callable[[str], None], run: Callable[..., None],
+                             pulled: Optional[dict] = None, docker=None,
+                             timeouts: Optional[dict[str, float]] = None) -> None:
+    """
+    Take the whole stack down, pull and bring it back up.
+    
+    Every service is unavailable from the start of `down` until `up` finishes,
+    which is recorded as the downtime of each service. When the caller
+    already pulled images, only the services whose image it did not pull are
+    pulled.
+    """
+    services = list(service_images)
+    unpulled = _unpulled_services(service_images, pulled)
+    phases = [("down", ["docker-compose", "down"]),
+              ("pull", ["docker-compose", "pull"] + unpulled),
+              ("up", ["docker-compose", "up", "-d"])]
+    if pulled is not None and not unpulled:
+        phases.pop(1)
+    
+    started = time.monotonic()
+    for phase, args in phases:
+        on_phase(phase)
+        run(args, cwd=path)
+    elapsed = round(time.monotonic() - started, 3)
+    report['downtime'] = {service: elapsed for service in sorted(services)}
+
+
+def _update_run_command(path: str, run_command: str, report: dict,
+                        on_phase: Callable[[str], None], run: Callable[..., None],
+                        on_output: Optional[Callable[[str], None]], pulled: Optional[dict],
+                        docker, backend: str, timeouts: dict[str, float],
+                        cancel_event: Optional[threading.Event]) -> None:
+    """
+    Pull the image of a docker-run-command.txt stack and replace its container if needed.
+    
+    Containers are labelled with the hash of the parsed command and their stack
+    directory. In every mode a running container whose hash and image ID
+    match the command and the freshly pulled image is left alone. Otherwise
+    every container of the stack, and any container with the same
+    name, is stopped and removed before the new one is started.
+    """
+    spec, spec_hash = _run_spec(run_command)
+    if backend == "api" and spec['unsupported']:
+        raise DockerEngineError("Options not supported by the api backend: "
+                                f"{', '.join(option for option, _ in spec['unsupported'])}; use the cli backend")
+    
+    def check_cancelled() -> None:
+        # Engine requests cannot be interrupted, so a cancel is honoured between them
+        if backend == "api" and cancel_event is not None and cancel_event.is_set():
+            raise UpdateCancelled()
+    
+    name = spec['name'] or spec['image']
+    stack = os.path.abspath(path)
+    image = spec['image']
+    
+    if pulled is None:
+        on_phase("pull")
+        check_cancelled()
+        if backend == "api":
+            docker.pull_image(image, on_output=on_output, timeout=timeouts.get("pull"))
+        else:
+            run(["docker", "pull", image])
+        image_id = docker.image_id(image, timeout=timeouts.get("pull"))
+    else:
+        # Lookups ahead of the first phase count against the timeout of 'down'
+        image_id = pulled.get(image, (None, None))[1] or docker.image_id(image, timeout=timeouts.get("down"))
+    
+    check_cancelled()
+    existing = docker.find_containers(f"{STACK_LABEL}={stack}", spec['name'],
+                                      timeout=timeouts.get(on_phase.phase or "down"))
+    report['spec_hash'] = spec_hash
+    report['images'] = {name: {'image': image, 'before': existing[0]['image'] if existing else None,
+                               'after': image_id}}
+    
+    if len(existing) == 1 and existing[0]['running'] \
+            and existing[0]['labels'].get(SPEC_HASH_LABEL) == spec_hash and existing[0]['image'] == image_id:
+        report['restarted'], report['skipped'] = [], [name]
+        report['downtime'] = {name: 0.0}
+        return
+    report['restarted'], report['skipped'] = [name], []
+    
+    stopped = time.monotonic()
+    if existing:
+        on_phase("down")
+        for container in existing:
+            check_cancelled()
+            if backend == "api":
+                docker.stop_container(container['id'], timeout=timeouts.get("down"))
+                docker.remove_container(container['id'], timeout=timeouts.get("down"))
+            else:
+                run(["docker", "stop", container['id']])
+                run(["docker", "rm", container['id']])
+    
+    on_phase("run")
+    check_cancelled()
+    labels = [f"{SPEC_HASH_LABEL}={spec_hash}", f"{STACK_LABEL}={stack}"]
+    if backend == "api":
+        docker.run_container(dict(spec, labels=spec['labels'] + labels), on_output=on_output,
+                             timeout=timeouts.get("run"))
+    else:
+        # shlex keeps quoted arguments together, unlike str.split()
+        args = shlex.split(run_command)
+        start = args.index("run") + 1
+        run(args[:start] + [arg for label in labels for arg in ("--label", label)] + args[start:])
+    report['downtime'] = {name: round(time.monotonic() - stopped, 3)}
+
+
+def update_docker_stack(path: str, mode: str = "recreate",
+                        on_phase: Optional[Callable[[str], None]] = None,
+                        on_output: Optional[Callable[[str], None]] = None,
+                        pulled: Optional[dict] = None, backend: str = "cli",
+                        timeouts: Optional[dict[str, float]] = None,
+                        cancel_event: Optional[threading.Event] = None) -> tuple[bool, Optional[str], dict]:
+    """
+    Check for Docker configuration files and manage container accordingly,
+    reporting what was done.
     
     Args:
         path (str): Path to the directory containing Docker configuration files
+        mode (str): One of UPDATE_MODES. 'recreate' runs down, pull and up for
+            the whole stack. 'skip-unchanged' pulls first and only recreates the
+            compose services whose image changed. 'low-downtime' does the same
+            but replaces the changed services one at a time. In every mode,
+            docker-run-command.txt stacks are only replaced when the command or
+            the image changed
+        on_phase (Optional[Callable[[str], None]]): Called with the name of each phase
+            ('down', 'pull', 'up' or 'run') just before it starts
+        on_output (Optional[Callable[[str], None]]): Called with every line the docker
+            commands print; output goes to stdout when omitted. See
+            stream_docker_stack() for a generator instead of a callback
+        pulled (Optional[dict]): Images the caller has already pulled, mapped to
+            their (before, after) image IDs. The stack only pulls the images
+            of services that are not in it, e.g. ones it also builds
+        backend (str): One of BACKENDS. 'api' talks to the Docker Engine API
+            over its unix socket for image lookups and docker-run-command.txt
+            stacks; compose commands always run through docker-compose
+        timeouts (Optional[dict[str, float]]): Seconds each phase (see PHASES)
+            may take. A command that runs longer is killed with its whole
+            process tree; with the api backend the timeout limits how long the
+            daemon may stay silent
+        cancel_event (Optional[threading.Event]): Set it to cancel the update;
+            the running command is killed with its whole process tree
         
     Returns:
-        tuple[bool, Optional[str]]: A tuple containing:
+        tuple[bool, Optional[str], dict]: A tuple containing:
             - bool: True if operation was successful, False otherwise
             - Optional[str]: Error message if operation failed, None if successful
+            - dict: Report of the update. Always holds 'mode' and 'phases', the
+              seconds spent in each phase. Compose stacks also report 'downtime',
+              the seconds each service was unavailable, and in the pull-first
+              modes 'restarted' and 'skipped' service names and 'images' with
+              the image IDs before and after the pull. docker-run-command.txt
+              stacks report the same keys for their container, plus 'spec_hash'
+              of the parsed command. A timed out update reports
+              'timed_out_phase', a cancelled one 'cancelled'. A failed update
+              reports 'output', its last OUTPUT_TAIL_LINES output lines
     """
+    report = {'mode': mode, 'phases': {}}
+    on_phase = _PhaseTimer(report['phases'], on_phase)
+    timeouts = timeouts or {}
+    # Phase whose timeout limits the lookups made before the first phase starts
+    lookup_phase = "down" if mode == "recreate" else "pull"
+    # Only the most recent lines are kept, however much a pull prints
+    tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    
+    def forward(line: str) -> None:
+        tail.append(line)
+        if on_output is not None:
+            on_output(line)
+        else:
+            print(line, flush=True)
+    
+    def run(args: list[str], cwd: Optional[str] = None) -> None:
+        _run_command(args, cwd=cwd, on_output=forward, timeout=timeouts.get(on_phase.phase),
+                     cancel_event=cancel_event)
+    
+    def failed(error: str) -> tuple[bool, str, dict]:
+        if tail:
+            report['output'] = list(tail)
+        return False, error, report
+    
     try:
+        if mode not in UPDATE_MODES:
+            return False, f"Unknown update mode: {mode}", report
+        if backend not in BACKENDS:
+            return False, f"Unknown backend: {backend}", report
+        docker = _docker_backend(backend, cancel_event)
+        
         # Ensure the path exists and is a directory
         if not os.path.isdir(path):
-            return False, f"Invalid path: {path} is not a directory"
+            return False, f"Invalid path: {path} is not a directory", report
         
         # Check for docker-compose.yml
         compose_path = os.path.join(path, "docker-compose.yml")
@@ -27,22 +1146,23 @@ def update_docker_container(path: str) -> tuple[bool, Optional[str]]:
         if os.path.isfile(compose_path):
             # Handle docker-compose case
             try:
-                # Store current directory
-                original_dir = os.getcwd()
-                # Change to the target directory
-                os.chdir(path)
-                
-                # Execute docker-compose commands
-                subprocess.run(["docker-compose", "down"], check=True)
-                subprocess.run(["docker-compose", "pull"], check=True)
-                subprocess.run(["docker-compose", "up", "-d"], check=True)
-                
-                # Return to original directory
-                os.chdir(original_dir)
-                return True, None
+                # Run docker-compose inside the target directory without touching
+                # the process-wide working directory, so updates can run in parallel
+                strategy = {
+                    "recreate": _update_compose_recreate,
+                    "skip-unchanged": _update_compose_skip_unchanged,
+                    "low-downtime": _update_compose_low_downtime
+                }[mode]
+                service_images = _compose_service_images(path, timeout=timeouts.get(lookup_phase),
+                                                         cancel_event=cancel_event)
+                strategy(path, service_images, report, on_phase, run, pulled=pulled, docker=docker,
+                         timeouts=timeouts)
+                return True, None, report
                 
             except subprocess.CalledProcessError as e:
-                return False, f"Docker-compose command failed: {str(e)}"
+                return failed(f"Docker-compose command failed: {_command_error(e)}")
+            except DockerEngineError as e:
+                return failed(f"Docker engine request failed: {str(e)}")
                 
         elif os.path.isfile(run_command_path):
             # Handle docker run command case
@@ -51,34 +1171,763 @@ def update_docker_container(path: str) -> tuple[bool, Optional[str]]:
                     run_command = f.read().strip()
                 
                 if not run_command:
-                    return False, "docker-run-command.txt is empty"
+                    return False, "docker-run-command.txt is empty", report
+                if not _run_spec(run_command)[0]['image']:
+                    return False, "No image found in docker-run-command.txt", report
                 
-                # Execute the docker run command
-                subprocess.run(run_command.split(), check=True)
-                return True, None
+                lookup_phase = "down"
+                _update_run_command(path, run_command, report, on_phase, run, forward, pulled,
+                                    docker, backend, timeouts, cancel_event)
+                return True, None, report
                 
             except subprocess.CalledProcessError as e:
-                return False, f"Docker run command failed: {str(e)}"
+                return failed(f"Docker run command failed: {_command_error(e)}")
+            except DockerEngineError as e:
+                return failed(f"Docker engine request failed: {str(e)}")
+            except (subprocess.TimeoutExpired, UpdateCancelled):
+                raise
             except Exception as e:
-                return False, f"Error reading docker-run-command.txt: {str(e)}"
+                return False, f"Error reading docker-run-command.txt: {str(e)}", report
                 
         else:
-            return False, "No docker-compose.yml or docker-run-command.txt found in the specified path"
+            return False, "No docker-compose.yml or docker-run-command.txt found in the specified path", report
             
+    except subprocess.TimeoutExpired as e:
+        report['timed_out_phase'] = on_phase.phase or lookup_phase
+        return failed(f"Timed out after {e.timeout:g}s in phase '{report['timed_out_phase']}'")
+    except UpdateCancelled:
+        report['cancelled'] = True
+        return failed(f"Update cancelled during phase '{on_phase.phase or lookup_phase}'")
     except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+        return failed(f"Unexpected error: {str(e)}")
+    finally:
+        # Close the timing of the last phase
+        on_phase(None)
+
+
+def stream_docker_stack(path: str, **options):
+    """
+    Update a stack like update_docker_stack(), yielding its progress as it happens.
+    
+    The update runs in a background thread. At most STREAM_BUFFER_EVENTS
+    events are buffered, so a slow reader slows the update down instead of
+    the output piling up in memory. Closing the generator early cancels the
+    update.
+    
+    Args:
+        path (str): Path to the directory containing Docker configuration files
+        **options: Passed on to update_docker_stack() (e.g. mode, backend, timeouts)
+        
+    Yields:
+        dict: Events with a 'type' of 'phase' (with 'phase'), 'output' (with
+        'line') and finally 'result' (with 'success', 'error' and 'report')
+    """
+    events = queue.Queue(maxsize=STREAM_BUFFER_EVENTS)
+    cancel_event = options.pop('cancel_event', None) or threading.Event()
+    # Set when the reader closed the generator; a cancel by the caller still delivers the result
+    reader_gone = threading.Event()
+    
+    def put(event: dict) -> None:
+        # Give up once the reader is gone, the update is being cancelled anyway
+        while not reader_gone.is_set():
+            try:
+                events.put(event, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+    
+    def update() -> None:
+        try:
+            success, error, report = update_docker_stack(
+                path,
+                on_phase=lambda phase: put({'type': 'phase', 'phase': phase}),
+                on_output=lambda line: put({'type': 'output', 'line': line}),
+                cancel_event=cancel_event,
+                **options
+            )
+        except Exception as e:
+            success, error, report = False, f"Unexpected error: {str(e)}", {}
+        put({'type': 'result', 'success': success, 'error': error, 'report': report})
+    
+    # Not a daemon: the interpreter waits for a cancelled update to kill its commands before exiting
+    worker = threading.Thread(target=update, name="update-stream")
+    worker.start()
+    try:
+        while True:
+            event = events.get()
+            yield event
+            if event['type'] == 'result':
+                return
+    finally:
+        if worker.is_alive():
+            reader_gone.set()
+            cancel_event.set()
+
+
+def update_docker_container(path: str, mode: str = "recreate",
+                            on_phase: Optional[Callable[[str], None]] = None,
+                            on_output: Optional[Callable[[str], None]] = None,
+                            backend: str = "cli", timeouts: Optional[dict[str, float]] = None,
+                            cancel_event: Optional[threading.Event] = None) -> tuple[bool, Optional[str]]:
+    """
+    Check for Docker configuration files and manage container accordingly.
+    
+    Args:
+        path (str): Path to the directory containing Docker configuration files
+        mode (str): Update mode, see update_docker_stack()
+        on_phase (Optional[Callable[[str], None]]): Called with the name of each phase
+            just before it starts
+        on_output (Optional[Callable[[str], None]]): Called with every line the docker
+            commands print; output goes to stdout when omitted
+        backend (str): Docker backend, see update_docker_stack()
+        timeouts (Optional[dict[str, float]]): Seconds each phase may take
+        cancel_event (Optional[threading.Event]): Set it to cancel the update
+        
+    Returns:
+        tuple[bool, Optional[str]]: A tuple containing:
+            - bool: True if operation was successful, False otherwise
+            - Optional[str]: Error message if operation failed, None if successful
+    """
+    success, error, _ = update_docker_stack(path, mode=mode, on_phase=on_phase, on_output=on_output,
+                                            backend=backend, timeouts=timeouts, cancel_event=cancel_event)
+    return success, error
+
+
+def parse_size(value: str, base: int = 1024) -> int:
+    """
+    Convert a size such as "512M", "1.5G" or "20MB" to bytes.
+    
+    Suffixes are case-insensitive and may end in "B" or "iB"; base is the
+    step between them.
+    
+    Raises:
+        ValueError: If value is not a size
+    """
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([kmgt]?)(i?b)?\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * base ** SIZE_UNITS[match.group(2).lower()])
+
+
+class _PullBudget:
+    """
+    Bandwidth and disk limits for the pulls of a batch update.
+    
+    Download sizes are estimated from the registry manifests; images whose
+    local copy already has the registry's digest count as 0 bytes. Pulls are
+    paced so the estimated bytes they start never exceed bandwidth per
+    second, and only start while the free space in docker_root, minus what
+    the running pulls will take once extracted, stays above disk_reserve.
+    
+    Args:
+        bandwidth (Optional[float]): Bytes per second the pulls may use on average
+        disk_reserve (Optional[int]): Bytes that must stay free in docker_root
+        docker_root (str): Directory holding Docker's images
+    """
+    
+    def __init__(self, bandwidth: Optional[float], disk_reserve: Optional[int], docker_root: str):
+        if disk_reserve is not None:
+            try:
+                shutil.disk_usage(docker_root)
+            except OSError as e:
+                raise ValueError(f"Cannot measure the free disk space of {docker_root}: {str(e)}")
+        self._bandwidth = bandwidth
+        self._disk_reserve = disk_reserve
+        self._docker_root = docker_root
+        self._next_start = 0.0
+        self.sizes = {}
+        self.unknown = []
+    
+    def estimate(self, images: list[str], docker, timeout: Optional[float] = None) -> None:
+        """Estimate the download size of every image; timeout limits each registry and docker request."""
+        def estimate(image: str) -> tuple[str, Optional[int]]:
+            try:
+                remote = registry.inspect_remote_image(image, timeout=timeout or registry.DEFAULT_TIMEOUT)
+            except registry.RegistryError:
+                return image, None
+            if remote['digest'] and any(digest.endswith(f"@{remote['digest']}")
+                                        for digest in docker.repo_digests(image, timeout=timeout)):
+                return image, 0
+            return image, remote['size']
+        
+        if images:
+            with ThreadPoolExecutor(max_workers=min(SIZE_ESTIMATE_WORKERS, len(images))) as pool:
+                for image, size in pool.map(estimate, images):
+                    if size is None:
+                        self.unknown.append(image)
+                    self.sizes[image] = DEFAULT_IMAGE_SIZE if size is None else size
+    
+    def size(self, image: str) -> int:
+        """Return the estimated download size of an image in bytes."""
+        return self.sizes.get(image, DEFAULT_IMAGE_SIZE)
+    
+    def disk_needed(self, image: str) -> int:
+        """Return the disk space an image is expected to take once pulled."""
+        return int(self.size(image) * DISK_USAGE_FACTOR)
+    
+    def free_disk(self) -> float:
+        """Return the bytes that may still be used before the reserve is reached."""
+        if self._disk_reserve is None:
+            return float("inf")
+        return shutil.disk_usage(self._docker_root).free - self._disk_reserve
+    
+    def pace(self, image: str) -> float:
+        """Return the seconds until the image may start; at 0 its start is booked."""
+        if not self._bandwidth:
+            return 0.0
+        now = time.monotonic()
+        if self._next_start > now:
+            return self._next_start - now
+        self._next_start = now + self.size(image) / self._bandwidth
+        return 0.0
+
+
+def plan_image_pulls(paths: list[str], timeout: Optional[float] = None,
+                     cancel_event: Optional[threading.Event] = None) -> tuple[dict[str, list[str]], dict[str, str]]:
+    """
+    Map every image the given stacks pull to the stacks that use it.
+    
+    Args:
+        paths (list[str]): Paths to the directories containing Docker configuration files
+        timeout (Optional[float]): Seconds `docker-compose config` may take per stack
+        cancel_event (Optional[threading.Event]): Set it to stop reading the configurations
+        
+    Returns:
+        tuple[dict[str, list[str]], dict[str, str]]: A tuple containing:
+            - dict: Image reference -> paths of the stacks that use it
+            - dict: Path -> error message for stacks whose images could not be read
+    """
+    images, errors = {}, {}
+    for path in paths:
+        try:
+            for image in stack_images(path, timeout=timeout, cancel_event=cancel_event):
+                images.setdefault(image, []).append(path)
+        except Exception as e:
+            errors[path] = str(e)
+    return images, errors
+
+
+def _pull_images(images: list[str], pull_workers: int, backend: str = "cli",
+                 timeout: Optional[float] = None, budget: Optional[_PullBudget] = None,
+                 cancel_event: Optional[threading.Event] = None) -> tuple[dict, dict[str, str], list[str]]:
+    """
+    Pull each image once on a bounded worker pool through the given backend.
+    
+    With a budget the largest images start first, as fast as the budget's
+    bandwidth allows and only while their extracted size fits on the disk.
+    Images that do not fit once every other pull has finished are deferred.
+    
+    Returns:
+        tuple[dict, dict[str, str], list[str]]: The (before, after) image IDs
+        of every pulled image, an error message for every image that failed,
+        and the images deferred for lack of disk space
+    """
+    docker = _docker_backend(backend, cancel_event)
+    
+    def pull(image: str) -> tuple[str, Optional[tuple], Optional[str]]:
+        try:
+            before = docker.image_id(image, timeout=timeout)
+            docker.pull_image(image, timeout=timeout)
+            return image, (before, docker.image_id(image, timeout=timeout)), None
+        except subprocess.CalledProcessError as e:
+            return image, None, f"Docker pull failed: {_command_error(e)}"
+        except (subprocess.TimeoutExpired, DockerEngineError, UpdateCancelled) as e:
+            return image, None, f"Docker pull failed: {str(e)}"
+    
+    pulled, failed, deferred = {}, {}, []
+    
+    def record(image: str, ids: Optional[tuple], error: Optional[str]) -> None:
+        if error:
+            failed[image] = error
+        else:
+            pulled[image] = ids
+    
+    if not images:
+        return pulled, failed, deferred
+    if budget is None:
+        with ThreadPoolExecutor(max_workers=min(pull_workers, len(images))) as pool:
+            for result in pool.map(pull, images):
+                record(*result)
+        return pulled, failed, deferred
+    
+    # Largest first, so the longest pulls overlap with the others
+    pending = sorted(images, key=budget.size, reverse=True)
+    reserved = {}
+    changed = threading.Condition()
+    
+    def pull_reserved(image: str) -> None:
+        try:
+            result = pull(image)
+        except Exception as e:
+            result = image, None, f"Docker pull failed: {str(e)}"
+        with changed:
+            del reserved[image]
+            record(*result)
+            changed.notify()
+    
+    with ThreadPoolExecutor(max_workers=min(pull_workers, len(images))) as pool:
+        with changed:
+            while pending:
+                if len(reserved) >= pull_workers:
+                    changed.wait()
+                    continue
+                room = budget.free_disk() - sum(reserved.values())
+                image = next((image for image in pending if budget.disk_needed(image) <= room), None)
+                if image is None:
+                    if not reserved:
+                        # Only removing old images can make room now
+                        deferred.extend(pending)
+                        break
+                    changed.wait()
+                    continue
+                delay = budget.pace(image)
+                if delay:
+                    changed.wait(delay)
+                    continue
+                pending.remove(image)
+                reserved[image] = budget.disk_needed(image)
+                pool.submit(pull_reserved, image)
+    return pulled, failed, deferred
+
+
+def check_stack_images(path: str, backend: str = "cli",
+                       timeout: Optional[float] = None) -> tuple[dict, dict[str, str]]:
+    """
+    Pull the images of a stack without touching its containers.
+
+    The result can be handed to update_docker_stack() as pulled, so a stack
+    is only restarted when one of its images changed.
+
+    Args:
+        path (str): Path to the directory containing Docker configuration files
+        backend (str): Docker backend, see update_docker_stack()
+        timeout (Optional[float]): Seconds each pull, and reading the configuration, may take
+
+    Returns:
+        tuple[dict, dict[str, str]]: The (before, after) image IDs of every
+        pulled image, and an error message for every image that failed
+    """
+    pulled, failed, _ = _pull_images(stack_images(path, timeout=timeout), 1, backend=backend, timeout=timeout)
+    return pulled, failed
+
+
+def _compose_project_name(path: str, config: dict) -> str:
+    """Return the project name compose uses for the stack at path."""
+    return config.get("name") or re.sub(r"[^a-z0-9_-]", "", os.path.basename(os.path.abspath(path)).lower())
+
+
+def stack_resources(path: str, timeout: Optional[float] = None,
+                    cancel_event: Optional[threading.Event] = None) -> tuple[set[str], set[str]]:
+    """
+    Return the Docker networks and volumes a stack creates and those it uses from elsewhere.
+    
+    Compose stacks create their non-external networks and volumes (including
+    the default network) and use the external ones. Stacks started from
+    docker-run-command.txt create nothing and use their --network and named
+    volumes. timeout and cancel_event limit `docker-compose config`, which is
+    only run when the names use variables.
+    
+    Returns:
+        tuple[set[str], set[str]]: Resources created and resources used, as
+        'network:<name>' and 'volume:<name>'
+    """
+    compose_path = os.path.join(path, "docker-compose.yml")
+    run_command_path = os.path.join(path, "docker-run-command.txt")
+    provides, uses = set(), set()
+    
+    if os.path.isfile(compose_path):
+        with open(compose_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+        if "$" in str((config.get("networks"), config.get("volumes"), config.get("name"))):
+            config = _compose_config(path, timeout=timeout, cancel_event=cancel_event)
+        project = _compose_project_name(path, config)
+        if config.get("services") and "default" not in (config.get("networks") or {}):
+            provides.add(f"network:{project}_default")
+        for kind in ("network", "volume"):
+            for key, definition in (config.get(f"{kind}s") or {}).items():
+                definition = definition or {}
+                external = definition.get("external")
+                if external:
+                    # Older compose files name external resources inside the external key
+                    name = definition.get("name") or (isinstance(external, dict) and external.get("name")) or key
+                    uses.add(f"{kind}:{name}")
+                else:
+                    provides.add(f"{kind}:{definition.get('name') or f'{project}_{key}'}")
+    
+    elif os.path.isfile(run_command_path):
+        with open(run_command_path, 'r') as f:
+            spec = _run_spec(f.read().strip())[0]
+        if spec['network'] and spec['network'] not in ("bridge", "host", "none") \
+                and not spec['network'].startswith("container:"):
+            uses.add(f"network:{spec['network']}")
+        for volume in spec['volumes']:
+            source, _, target = volume.partition(":")
+            # Bind mounts start with a path; anything else is a named volume
+            if target and not source.startswith(("/", ".", "~")):
+                uses.add(f"volume:{source}")
+    
+    return provides, uses
+
+
+def _update_after(path: str) -> list[str]:
+    """Return the absolute paths listed in the UPDATE_AFTER_FILE of a stack."""
+    try:
+        with open(os.path.join(path, UPDATE_AFTER_FILE), 'r') as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+    except FileNotFoundError:
+        return []
+    return [os.path.abspath(os.path.join(path, line)) for line in lines if line]
+
+
+def plan_update_waves(paths: list[str], timeout: Optional[float] = None,
+                      cancel_event: Optional[threading.Event] = None
+                      ) -> tuple[list[list[str]], dict[str, list[str]], dict[str, str]]:
+    """
+    Order stacks into waves so every stack is updated after the stacks it depends on.
+    
+    A stack depends on the stacks that create the external networks and volumes
+    it uses (see stack_resources()) and on the stacks listed in its
+    UPDATE_AFTER_FILE. Only dependencies between the given stacks count. The
+    first wave holds every stack without dependencies and each later wave the
+    stacks whose dependencies are all in earlier waves, so the stacks of one
+    wave can be updated in parallel.
+    
+    Args:
+        paths (list[str]): Paths to the directories containing Docker configuration files
+        timeout (Optional[float]): Seconds `docker-compose config` may take per stack
+        cancel_event (Optional[threading.Event]): Set it to stop reading the configurations
+        
+    Returns:
+        tuple[list[list[str]], dict[str, list[str]], dict[str, str]]: A tuple containing:
+            - list: The waves, each a list of paths in the order given
+            - dict: Path -> paths of the stacks it depends on
+            - dict: Path -> error message for stacks in or behind a dependency
+              cycle, which cannot be ordered; they are in no wave
+    """
+    paths = list(dict.fromkeys(paths))
+    by_abspath = {os.path.abspath(path): path for path in paths}
+    resources = {}
+    for path in paths:
+        try:
+            resources[path] = stack_resources(path, timeout=timeout, cancel_event=cancel_event)
+        except Exception:
+            # Unreadable stacks fail on their own when updated; order them without dependencies
+            resources[path] = (set(), set())
+    
+    providers = {}
+    for path, (provides, _) in resources.items():
+        for resource in provides:
+            providers.setdefault(resource, []).append(path)
+    
+    dependencies = {}
+    for path, (_, uses) in resources.items():
+        depends = {provider for resource in uses for provider in providers.get(resource, [])}
+        depends.update(by_abspath[after] for after in _update_after(path) if after in by_abspath)
+        depends.discard(path)
+        dependencies[path] = [dependency for dependency in paths if dependency in depends]
+    
+    waves, done = [], set()
+    remaining = list(paths)
+    while remaining:
+        wave = [path for path in remaining if done.issuperset(dependencies[path])]
+        if not wave:
+            break
+        waves.append(wave)
+        done.update(wave)
+        remaining = [path for path in remaining if path not in done]
+    
+    errors = {path: f"Cannot be ordered, dependency cycle among: {', '.join(remaining)}" for path in remaining}
+    return waves, dependencies, errors
+
+
+def update_docker_containers(paths: list[str], max_workers: int = DEFAULT_MAX_WORKERS,
+                             dedupe_pulls: bool = False, pull_workers: int = DEFAULT_PULL_WORKERS,
+                             ordered: bool = False, update_func: Optional[Callable] = None,
+                             bandwidth: Optional[float] = None, disk_reserve: Optional[int] = None,
+                             docker_root: str = DEFAULT_DOCKER_ROOT, prune: bool = False, **options) -> dict:
+    """
+    Update several Docker configurations at once on a bounded worker pool.
+    
+    With dedupe_pulls the images of each wave's stacks are collected first and
+    every unique image is pulled exactly once, pull_workers at a time. The
+    stacks are then updated without pulling those images again; images the
+    plan does not cover, such as those of services that are also built, are
+    pulled by the stack itself. A stack whose images could not be read falls
+    back to its own pull; a stack using an image that failed
+    to pull is reported as failed and left untouched.
+    
+    bandwidth and disk_reserve limit those pulls, see _PullBudget. Stacks whose
+    images do not fit on the disk wait until the rest of their wave has been
+    updated and pruned, and fail only if there is still no room then.
+    
+    With ordered the stacks are updated in the waves of plan_update_waves():
+    each wave runs in parallel and starts once the previous one is done. A
+    stack whose dependency failed, or that is part of a dependency cycle, is
+    reported as failed and left untouched.
+    
+    Args:
+        paths (list[str]): Paths to the directories containing Docker configuration files
+        max_workers (int): Maximum number of stacks updated at the same time
+        dedupe_pulls (bool): Pull shared images once for the whole batch
+        pull_workers (int): Maximum number of images pulled at the same time
+        ordered (bool): Update stacks after the stacks they depend on
+        update_func (Optional[Callable]): Replacement for update_docker_stack()
+            with the same signature, e.g. one that records metrics
+        bandwidth (Optional[float]): Bytes per second the deduplicated pulls may use
+        disk_reserve (Optional[int]): Bytes that must stay free in docker_root
+            while pulling
+        docker_root (str): Directory holding Docker's images
+        prune (bool): Remove dangling images after every wave, freeing the
+            space of the images the wave replaced
+        **options: Passed on to update_docker_stack() for every path (e.g. mode,
+            backend); the backend is also used for the deduplicated pulls
+        
+    Returns:
+        dict: A dictionary containing:
+            - results: One entry per path, in the order given, with the keys
+              'path', 'success', 'error', 'duration' (seconds) and 'report'
+            - duration: Total wall-clock time of the batch in seconds
+            - pulls: Only with dedupe_pulls; 'unique' images pulled, 'requested'
+              image references across all stacks, 'saved' pulls, 'failed'
+              images with their errors and the 'duration' of the pull stages.
+              With a budget also 'estimated_bytes' to download, the images of
+              'unknown_size' and the 'deferred' images
+            - waves: Only with ordered; the paths of each wave in the order run
+            - prune: Only with prune; the number of 'runs', the bytes
+              'reclaimed' and any 'errors'
+    """
+    if max_workers < 1 or pull_workers < 1:
+        raise ValueError("max_workers and pull_workers must be at least 1")
+    if options.get('backend', 'cli') not in BACKENDS:
+        raise ValueError(f"Unknown backend: {options['backend']}")
+    if (bandwidth or disk_reserve is not None) and not dedupe_pulls:
+        raise ValueError("bandwidth and disk_reserve limit the deduplicated pulls and need dedupe_pulls")
+    
+    started = time.monotonic()
+    batch = {}
+    backend = options.get('backend', 'cli')
+    pull_timeout = (options.get('timeouts') or {}).get('pull')
+    cancel_event = options.get('cancel_event')
+    # Configurations are read before any stack starts, within the timeout of the mode's first phase
+    config_timeout = (options.get('timeouts') or {}).get("down" if options.get('mode', "recreate") == "recreate"
+                                                         else "pull")
+    stack_pulls, pull_errors = {}, {}
+    pulled_images, failed_images = {}, {}
+    images_of = {}
+    budget = None
+    
+    if dedupe_pulls:
+        images, plan_errors = plan_image_pulls(paths, timeout=config_timeout, cancel_event=cancel_event)
+        for image, stacks in images.items():
+            for path in stacks:
+                images_of.setdefault(path, []).append(image)
+        for path in paths:
+            if path not in plan_errors:
+                stack_pulls.setdefault(path, {})
+        
+        requested = sum(len(stacks) for stacks in images.values())
+        batch['pulls'] = {
+            'unique': len(images),
+            'requested': requested,
+            'saved': requested - len(images),
+            'failed': failed_images,
+            'duration': 0.0
+        }
+        if bandwidth or disk_reserve is not None:
+            budget = _PullBudget(bandwidth, disk_reserve, docker_root)
+            budget.estimate(sorted(images), _docker_backend(backend, cancel_event), timeout=pull_timeout)
+            batch['pulls'].update(estimated_bytes=sum(budget.sizes.values()), unknown_size=budget.unknown,
+                                  deferred=[])
+    
+    def pull_for(stacks: list[str]) -> list[str]:
+        """Pull the images stacks still need; returns the stacks that have to wait for disk space."""
+        pull_started = time.monotonic()
+        wanted = sorted({image for path in stacks for image in images_of.get(path, [])}
+                        - pulled_images.keys() - failed_images.keys())
+        pulled, failed, deferred = _pull_images(wanted, pull_workers, backend=backend, timeout=pull_timeout,
+                                                budget=budget, cancel_event=cancel_event)
+        pulled_images.update(pulled)
+        failed_images.update(failed)
+        batch['pulls']['duration'] = round(batch['pulls']['duration'] + time.monotonic() - pull_started, 3)
+        if deferred:
+            batch['pulls']['deferred'].extend(image for image in deferred
+                                              if image not in batch['pulls']['deferred'])
+        
+        waiting = []
+        for path in stacks:
+            if any(image in deferred for image in images_of.get(path, [])):
+                waiting.append(path)
+                continue
+            for image in images_of.get(path, []):
+                if image in failed_images:
+                    pull_errors.setdefault(path, f"{image}: {failed_images[image]}")
+                stack_pulls[path][image] = pulled_images.get(image)
+        return waiting
+    
+    def prune_images() -> None:
+        summary = batch.setdefault('prune', {'runs': 0, 'reclaimed': 0, 'errors': []})
+        try:
+            reclaimed = _docker_backend(backend, cancel_event).prune_images(timeout=pull_timeout)
+            summary['reclaimed'] += reclaimed or 0
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, DockerEngineError, UpdateCancelled) as e:
+            summary['errors'].append(str(e))
+        summary['runs'] += 1
+    
+    if ordered:
+        waves, dependencies, order_errors = plan_update_waves(paths, timeout=config_timeout,
+                                                              cancel_event=cancel_event)
+        batch['waves'] = waves
+    else:
+        waves, dependencies, order_errors = [list(dict.fromkeys(paths))], {}, {}
+    results = {}
+    
+    def run(path: str) -> dict:
+        stack_started = time.monotonic()
+        failed_dependencies = [dependency for dependency in dependencies.get(path, [])
+                               if not results[dependency]['success']]
+        if path in pull_errors:
+            success, error, report = False, f"Image pull failed: {pull_errors[path]}", {}
+        elif failed_dependencies:
+            success, error, report = False, f"Dependency failed: {', '.join(failed_dependencies)}", {}
+        else:
+            success, error, report = (update_func or update_docker_stack)(path, pulled=stack_pulls.get(path), **options)
+        return {
+            'path': path,
+            'success': success,
+            'error': error,
+            'duration': round(time.monotonic() - stack_started, 3),
+            'report': report
+        }
+    
+    for path, error in order_errors.items():
+        results[path] = {'path': path, 'success': False, 'error': error, 'duration': 0.0, 'report': {}}
+    for wave in waves:
+        pruned = False
+        while wave:
+            waiting = pull_for(wave) if dedupe_pulls else []
+            ready = [path for path in wave if path not in waiting]
+            if not ready:
+                if prune and not pruned:
+                    # Images replaced by earlier waves may still hold the space
+                    prune_images()
+                    pruned = True
+                    continue
+                for path in waiting:
+                    missing = [image for image in images_of[path] if image not in pulled_images]
+                    pull_errors[path] = f"Not enough disk space to pull {', '.join(missing)}"
+                    for image in missing:
+                        failed_images.setdefault(image, "Not enough disk space")
+                ready, waiting = waiting, []
+            
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(ready))) as pool:
+                results.update(zip(ready, pool.map(run, ready)))
+            if prune and not all(path in pull_errors for path in ready):
+                prune_images()
+                pruned = True
+            wave = waiting
+    
+    batch['results'] = [results[path] for path in paths]
+    batch['duration'] = round(time.monotonic() - started, 3)
+    return batch
+
+
+def _describe_report(report: dict) -> str:
+    """Summarise an update report for the command line."""
+    details = []
+    if 'restarted' in report:
+        details.append(f"restarted: {', '.join(report['restarted']) or 'none'}")
+        details.append(f"skipped: {', '.join(report['skipped']) or 'none'}")
+    if report.get('downtime'):
+        details.append(f"max downtime: {max(report['downtime'].values()):.1f}s")
+    return f" ({'; '.join(details)})" if details else ""
 
 
 if __name__ == "__main__":
     # Example usage
-    import sys
+    import argparse
     
-    if len(sys.argv) != 2:
-        print("Usage: python docker_manager.py <path>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Update Docker containers from their configuration directories")
+    parser.add_argument("paths", nargs="+", help="Directories containing docker-compose.yml or docker-run-command.txt")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Number of stacks updated at the same time (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--mode", choices=UPDATE_MODES, default="recreate",
+                        help="'skip-unchanged' only recreates services whose image changed, 'low-downtime' "
+                             "also replaces them one at a time (default: recreate)")
+    parser.add_argument("--backend", choices=BACKENDS, default="cli",
+                        help="'api' talks to the Docker Engine API over its unix socket (default: cli)")
+    parser.add_argument("--timeout", action="append", default=[], metavar="PHASE=SECONDS",
+                        help=f"Time limit for a phase ({', '.join(PHASES)}); may be given more than once")
+    parser.add_argument("--dedupe-pulls", action="store_true",
+                        help="Pull images shared by several stacks only once for the whole batch")
+    parser.add_argument("--ordered", action="store_true",
+                        help="Update stacks in waves, after the stacks whose networks and volumes they use")
+    parser.add_argument("--pull-workers", type=int, default=DEFAULT_PULL_WORKERS,
+                        help=f"Number of images pulled at the same time with --dedupe-pulls (default: {DEFAULT_PULL_WORKERS})")
+    parser.add_argument("--bandwidth", type=parse_size, metavar="SIZE",
+                        help="Average download rate per second of the --dedupe-pulls pulls, e.g. 20M")
+    parser.add_argument("--disk-reserve", type=parse_size, metavar="SIZE",
+                        help="Free space to keep in the Docker root while pulling with --dedupe-pulls, e.g. 10G")
+    parser.add_argument("--docker-root", default=DEFAULT_DOCKER_ROOT,
+                        help=f"Directory holding Docker's images (default: {DEFAULT_DOCKER_ROOT})")
+    parser.add_argument("--prune", action="store_true",
+                        help="Remove dangling images after every wave")
+    args = parser.parse_args()
+    if (args.bandwidth or args.disk_reserve is not None) and not args.dedupe_pulls:
+        parser.error("--bandwidth and --disk-reserve need --dedupe-pulls")
     
-    success, error = update_docker_container(sys.argv[1])
-    if success:
-        print("Docker container updated successfully!")
+    timeouts = {}
+    for value in args.timeout:
+        phase, _, seconds = value.partition("=")
+        if phase not in PHASES or not seconds:
+            parser.error(f"Invalid --timeout {value!r}, expected PHASE=SECONDS with PHASE one of {', '.join(PHASES)}")
+        timeouts[phase] = float(seconds)
+    
+    # The commands run in their own session and never see the terminal's Ctrl-C, so it
+    # cancels the update instead; the running commands are killed and the result reported
+    cancel_event = threading.Event()
+    
+    def cancel(signum, frame) -> None:
+        if cancel_event.is_set():
+            raise KeyboardInterrupt
+        print("Cancelling the update...", flush=True)
+        cancel_event.set()
+    
+    signal.signal(signal.SIGINT, cancel)
+    
+    if len(args.paths) == 1:
+        for event in stream_docker_stack(args.paths[0], mode=args.mode, backend=args.backend, timeouts=timeouts,
+                                         cancel_event=cancel_event):
+            if event['type'] == 'phase':
+                print(f"==> {event['phase']}")
+            elif event['type'] == 'output':
+                print(event['line'])
+            else:
+                success, error, report = event['success'], event['error'], event['report']
+        if success:
+            print(f"Docker container updated successfully!{_describe_report(report)}")
+        else:
+            print(f"Error: {error}")
     else:
-        print(f"Error: {error}")
+        batch = update_docker_containers(args.paths, max_workers=args.workers, mode=args.mode,
+                                         backend=args.backend, timeouts=timeouts, dedupe_pulls=args.dedupe_pulls,
+                                         pull_workers=args.pull_workers, ordered=args.ordered,
+                                         bandwidth=args.bandwidth, disk_reserve=args.disk_reserve,
+                                         docker_root=args.docker_root, prune=args.prune,
+                                         cancel_event=cancel_event)
+        for result in batch['results']:
+            status = f"OK{_describe_report(result['report'])}" if result['success'] else f"Error: {result['error']}"
+            print(f"{result['path']} ({result['duration']:.1f}s): {status}")
+        if 'pulls' in batch:
+            pulls = batch['pulls']
+            print(f"Pulled {pulls['unique']} unique images for {pulls['requested']} references "
+                  f"({pulls['saved']} pulls saved, {len(pulls['failed'])} failed)")
+            if 'estimated_bytes' in pulls:
+                print(f"Estimated download: {pulls['estimated_bytes'] / 1024 ** 2:.0f} MiB "
+                      f"({len(pulls['unknown_size'])} sizes unknown, {len(pulls['deferred'])} images deferred)")
+        if 'prune' in batch:
+            print(f"Pruned {batch['prune']['runs']} times, reclaimed "
+                  f"{batch['prune']['reclaimed'] / 1024 ** 2:.0f} MiB")
+        if 'waves' in batch:
+            print(f"Updated in {len(batch['waves'])} waves: "
+                  + " -> ".join(", ".join(os.path.basename(path) for path in wave) for wave in batch['waves']))
+        print(f"Updated {len(batch['results'])} stacks in {batch['duration']:.1f}s")
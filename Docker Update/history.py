@@ -0,0 +1,195 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+# Number of history entries returned per page unless the caller asks for fewer
+DEFAULT_PAGE_SIZE = 50
+# Upper bound of the page size
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS updates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stack TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL,
+    error TEXT,
+    mode TEXT,
+    phases TEXT NOT NULL,
+    images TEXT NOT NULL,
+    report TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS updates_by_stack ON updates (stack, id);
+CREATE INDEX IF NOT EXISTS updates_by_time ON updates (started);
+
+-- One row per stack, kept up to date on every insert so the dashboard never scans updates
+CREATE TABLE IF NOT EXISTS stack_summary (
+    stack TEXT PRIMARY KEY,
+    updates INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    total_duration REAL NOT NULL,
+    last_update REAL NOT NULL,
+    last_success INTEGER NOT NULL,
+    last_error TEXT,
+    last_failure REAL,
+    last_failure_error TEXT
+);
+"""
+
+
+class UpdateHistory:
+    """
+    Persistent history of Docker updates in an SQLite database.
+
+    Every update is stored with its stack, phase durations, the image IDs
+    before and after the pull (reported by the pull-first modes) and its error.
+    Entries are indexed by stack and by time, and a per-stack summary table is
+    maintained alongside them, so the latest state of every stack is one small
+    query away.
+
+    Args:
+        db_path (str): SQLite database file, created if missing
+    """
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    def track(self, update_func: Callable) -> Callable:
+        """
+        Wrap a function with the signature of docker_manager.update_docker_stack
+        so every call it makes is stored.
+        """
+        @functools.wraps(update_func)
+        def tracked(path: str, **kwargs) -> tuple:
+            started = time.time()
+            success, error, report = False, None, {}
+            try:
+                success, error, report = update_func(path, **kwargs)
+                return success, error, report
+            except Exception as e:
+                error = f"Unexpected error: {str(e)}"
+                raise
+            finally:
+                try:
+                    self.record(path, success, error, report or {}, started, time.time() - started)
+                except sqlite3.Error as e:
+                    print(f"Could not store update history: {str(e)}")
+        return tracked
+
+    def record(self, stack: str, success: bool, error: Optional[str], report: dict,
+               started: float, duration: float) -> None:
+        """Store one finished update of a stack; started is a Unix timestamp, duration in seconds."""
+        stack = os.path.abspath(stack)
+        duration = round(duration, 3)
+        failed_at = None if success else started
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO updates (stack, started, duration, success, error, mode, phases, images, report) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (stack, started, duration, int(success), error, report.get('mode'),
+                 json.dumps(report.get('phases', {})), json.dumps(report.get('images', {})), json.dumps(report))
+            )
+            self._db.execute(
+                "INSERT INTO stack_summary (stack, updates, failures, total_duration, last_update, last_success, "
+                "last_error, last_failure, last_failure_error) VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (stack) DO UPDATE SET "
+                "updates = updates + 1, failures = failures + excluded.failures, "
+                "total_duration = total_duration + excluded.total_duration, "
+                "last_update = excluded.last_update, last_success = excluded.last_success, "
+                "last_error = excluded.last_error, "
+                "last_failure = COALESCE(excluded.last_failure, last_failure), "
+                "last_failure_error = COALESCE(excluded.last_failure_error, last_failure_error)",
+                (stack, 0 if success else 1, duration, started, int(success), error, failed_at,
+                 None if success else error)
+            )
+
+    def page(self, stack: Optional[str] = None, before: Optional[int] = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> dict:
+        """
+        Return one page of history entries, newest first.
+
+        Args:
+            stack (Optional[str]): Only return updates of this stack
+            before (Optional[int]): Cursor from a previous page; only entries older than it are returned
+            limit (int): Maximum number of entries, capped at MAX_PAGE_SIZE
+
+        Returns:
+            dict: 'entries', and 'next', the cursor of the following page or
+            None on the last page
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions, params = [], []
+        if stack:
+            conditions.append("stack = ?")
+            params.append(os.path.abspath(stack))
+        if before is not None:
+            conditions.append("id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            rows = self._db.execute(f"SELECT * FROM updates {where}ORDER BY id DESC LIMIT ?",
+                                    params + [limit + 1]).fetchall()
+
+        entries = [self._entry(row) for row in rows[:limit]]
+        return {'entries': entries, 'next': entries[-1]['id'] if len(rows) > limit else None}
+
+    def summary(self, root: Optional[str] = None) -> list[dict]:
+        """
+        Return the last update, last failure and average duration of every stack.
+
+        Args:
+            root (Optional[str]): Only return stacks below this directory
+
+        Returns:
+            list[dict]: One entry per stack, sorted by path
+        """
+        where, params = "", []
+        if root:
+            # A range on the primary key instead of LIKE, so the lookup uses the index
+            prefix = os.path.abspath(root).rstrip(os.sep) + os.sep
+            where, params = "WHERE stack >= ? AND stack < ? ", [prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+        with self._lock:
+            rows = self._db.execute(f"SELECT * FROM stack_summary {where}ORDER BY stack", params).fetchall()
+        return [{
+            'stack': row['stack'],
+            'updates': row['updates'],
+            'failures': row['failures'],
+            'average_duration': round(row['total_duration'] / row['updates'], 3),
+            'last_update': row['last_update'],
+            'last_success': bool(row['last_success']),
+            'last_error': row['last_error'],
+            'last_failure': row['last_failure'],
+            'last_failure_error': row['last_failure_error']
+        } for row in rows]
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> dict:
+        return {
+            'id': row['id'],
+            'stack': row['stack'],
+            'started': row['started'],
+            'duration': row['duration'],
+            'success': bool(row['success']),
+            'error': row['error'],
+            'mode': row['mode'],
+            'phases': json.loads(row['phases']),
+            'images': json.loads(row['images']),
+            'report': json.loads(row['report'])
+        }
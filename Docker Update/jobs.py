@@ -0,0 +1,181 @@
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+# Number of output lines kept per job for the status endpoint
+MAX_JOB_LINES = 200
+# Number of finished jobs kept before the oldest ones are forgotten
+MAX_FINISHED_JOBS = 500
+# Number of events buffered per subscriber before it is considered gone
+MAX_SUBSCRIBER_EVENTS = 1000
+
+
+class JobManager:
+    """
+    Run Docker updates in the background and publish their progress.
+
+    Every update becomes a job with its own ID. Jobs run on a bounded thread
+    pool, so request threads return right away, and every state change, phase
+    change and output line is pushed to the subscribed event queues. Queued
+    and running jobs can be cancelled through the cancel_event passed to the
+    update function.
+
+    Args:
+        update_func (Callable): Function with the signature of
+            docker_manager.update_docker_stack
+        max_workers (int): Maximum number of jobs running at the same time
+    """
+
+    def __init__(self, update_func: Callable, max_workers: int = 4):
+        self._update_func = update_func
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="update-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._lines = {}
+        self._cancel_events = {}
+        self._subscribers = []
+
+    def submit(self, path: str, **options) -> str:
+        """
+        Queue an update of the given path and return the new job ID.
+
+        Any options (e.g. mode) are passed on to the update function.
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'path': path,
+            'options': options,
+            'state': 'queued',
+            'phase': None,
+            'error': None,
+            'report': None,
+            'last_line': None,
+            'created': time.time(),
+            'started': None,
+            'finished': None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._lines[job_id] = deque(maxlen=MAX_JOB_LINES)
+            self._cancel_events[job_id] = threading.Event()
+            self._prune()
+        self._publish(job_id, 'state', state='queued', path=path)
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return a snapshot of a job including its recent output, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return dict(job, output=list(self._lines[job_id]))
+
+    def list(self) -> list[dict]:
+        """Return snapshots of all known jobs, oldest first."""
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job.
+
+        A queued job is never started; a running one has its current command
+        killed and finishes in the 'cancelled' state.
+
+        Returns:
+            bool: False if the job is unknown or already finished
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['finished'] is not None:
+                return False
+            self._cancel_events[job_id].set()
+            queued = job['state'] == 'queued'
+            if queued:
+                job.update(state='cancelled', error="Update cancelled before it started",
+                           finished=time.time())
+        if queued:
+            self._publish(job_id, 'state', state='cancelled', error="Update cancelled before it started",
+                          report=None)
+        return True
+
+    def subscribe(self) -> queue.Queue:
+        """Register a new event queue that receives every job event from now on."""
+        events = queue.Queue(maxsize=MAX_SUBSCRIBER_EVENTS)
+        with self._lock:
+            self._subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events: queue.Queue) -> None:
+        """Stop delivering events to a queue returned by subscribe()."""
+        with self._lock:
+            if events in self._subscribers:
+                self._subscribers.remove(events)
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] != 'queued':
+                # Cancelled (and possibly pruned) while waiting in the pool
+                return
+            job.update(state='running', started=time.time())
+            path, options = job['path'], job['options']
+            cancel_event = self._cancel_events[job_id]
+        self._publish(job_id, 'state', state='running')
+
+        try:
+            success, error, report = self._update_func(
+                path,
+                on_phase=lambda phase: self._on_phase(job_id, phase),
+                on_output=lambda line: self._on_output(job_id, line),
+                cancel_event=cancel_event,
+                **options
+            )
+        except Exception as e:
+            success, error, report = False, f"Unexpected error: {str(e)}", None
+
+        if success:
+            state = 'succeeded'
+        else:
+            state = 'cancelled' if cancel_event.is_set() else 'failed'
+        self._update(job_id, state=state, error=error, report=report, finished=time.time())
+        self._publish(job_id, 'state', state=state, error=error, report=report)
+
+    def _on_phase(self, job_id: str, phase: str) -> None:
+        self._update(job_id, phase=phase)
+        self._publish(job_id, 'phase', phase=phase)
+
+    def _on_output(self, job_id: str, line: str) -> None:
+        with self._lock:
+            self._jobs[job_id]['last_line'] = line
+            self._lines[job_id].append(line)
+        self._publish(job_id, 'output', line=line)
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _publish(self, job_id: str, event_type: str, **fields) -> None:
+        event = dict(fields, job=job_id, type=event_type)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                # The client stopped reading; drop it instead of blocking the job
+                self.unsubscribe(events)
+
+    def _prune(self) -> None:
+        # Caller holds the lock
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished'] is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+            del self._lines[job_id]
+            del self._cancel_events[job_id]
@@ -0,0 +1,124 @@
+import functools
+import math
+import threading
+import time
+from typing import Callable
+
+# Upper bounds (seconds) of the duration histogram buckets
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, math.inf)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == math.inf else str(bound)
+
+
+class _Histogram:
+    """Cumulative histogram with fixed buckets."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class UpdateMetrics:
+    """
+    Collect timings of Docker updates and render them in the Prometheus text format.
+
+    Records a duration histogram per phase and for whole updates, per-stack
+    update and failure counters, each stack's last update duration and the
+    number of updates currently running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}
+        self._updates = {}
+        self._stack_updates = {}
+        self._stack_failures = {}
+        self._stack_last_duration = {}
+        self._in_flight = 0
+
+    def track(self, update_func: Callable) -> Callable:
+        """
+        Wrap a function with the signature of docker_manager.update_docker_stack
+        so every call it makes is recorded.
+        """
+        @functools.wraps(update_func)
+        def tracked(path: str, **kwargs) -> tuple:
+            with self._lock:
+                self._in_flight += 1
+            started = time.monotonic()
+            success, error, report = False, None, {}
+            try:
+                success, error, report = update_func(path, **kwargs)
+                return success, error, report
+            finally:
+                self.record(path, success, time.monotonic() - started, (report or {}).get('phases', {}))
+                with self._lock:
+                    self._in_flight -= 1
+        return tracked
+
+    def record(self, stack: str, success: bool, duration: float, phases: dict[str, float]) -> None:
+        """Record one finished update of a stack with its phase durations in seconds."""
+        result = 'success' if success else 'failure'
+        with self._lock:
+            for phase, seconds in phases.items():
+                self._phases.setdefault(phase, _Histogram()).observe(seconds)
+            self._updates.setdefault(result, _Histogram()).observe(duration)
+            self._stack_updates[stack] = self._stack_updates.get(stack, 0) + 1
+            self._stack_failures[stack] = self._stack_failures.get(stack, 0) + (0 if success else 1)
+            self._stack_last_duration[stack] = duration
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'docker_update_phase_duration_seconds',
+                                    'Duration of each update phase (down, pull, up, run).',
+                                    'phase', self._phases)
+            self._render_histograms(lines, 'docker_update_duration_seconds',
+                                    'Duration of whole stack updates.', 'result', self._updates)
+            self._render_per_stack(lines, 'docker_update_stack_updates_total', 'counter',
+                                   'Updates run per stack.', self._stack_updates)
+            self._render_per_stack(lines, 'docker_update_stack_failures_total', 'counter',
+                                   'Failed updates per stack.', self._stack_failures)
+            self._render_per_stack(lines, 'docker_update_stack_last_duration_seconds', 'gauge',
+                                   'Duration of the last update of each stack.', self._stack_last_duration)
+            lines.append('# HELP docker_update_in_flight Updates currently running.')
+            lines.append('# TYPE docker_update_in_flight gauge')
+            lines.append(f'docker_update_in_flight {self._in_flight}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines: list[str], name: str, help_text: str, label: str,
+                           histograms: dict[str, _Histogram]) -> None:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for value, histogram in sorted(histograms.items()):
+            labels = f'{label}="{_escape(value)}"'
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{{labels},le="{_format_bound(bound)}"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+    @staticmethod
+    def _render_per_stack(lines: list[str], name: str, metric_type: str, help_text: str,
+                          values: dict[str, float]) -> None:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for stack, value in sorted(values.items()):
+            lines.append(f'{name}{{stack="{_escape(stack)}"}} {value}')
@@ -0,0 +1,143 @@
+import json
+import os
+import platform
+import re
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Optional
+
+# Registry used for image references without a registry host
+DEFAULT_REGISTRY = "registry-1.docker.io"
+
+# Seconds a registry request may take
+DEFAULT_TIMEOUT = 10
+
+# Registries reached over plain HTTP, separated by commas, like Docker's insecure-registries;
+# localhost registries always are
+INSECURE_REGISTRIES = {host for host in os.environ.get('DOCKER_UPDATE_INSECURE_REGISTRIES', '').split(',') if host}
+
+# Manifest types asked for, multi-platform indexes first
+MANIFEST_TYPES = (
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.oci.image.manifest.v1+json"
+)
+
+# platform.machine() values mapped to the architecture names used in manifests
+ARCHITECTURES = {"x86_64": "amd64", "amd64": "amd64", "aarch64": "arm64", "arm64": "arm64",
+                 "armv7l": "arm", "armv6l": "arm", "i386": "386", "i686": "386",
+                 "ppc64le": "ppc64le", "s390x": "s390x"}
+
+
+class RegistryError(Exception):
+    """Raised when a registry request fails."""
+
+
+def parse_reference(image: str) -> tuple[str, str, str]:
+    """
+    Split an image reference the way Docker normalises it.
+
+    Returns:
+        tuple[str, str, str]: The registry host, the repository and the tag or digest
+    """
+    name, _, digest = image.partition("@")
+    reference = digest
+    if not digest:
+        repository, _, tag = name.rpartition(":")
+        if repository and "/" not in tag:
+            name, reference = repository, tag
+        else:
+            reference = "latest"
+
+    host, _, rest = name.partition("/")
+    if rest and ("." in host or ":" in host or host == "localhost"):
+        repository = rest
+    else:
+        host, repository = DEFAULT_REGISTRY, name
+        if "/" not in repository:
+            repository = f"library/{repository}"
+    if host == "docker.io":
+        host = DEFAULT_REGISTRY
+    return host, repository, reference
+
+
+def _base_url(host: str) -> str:
+    hostname = host.rsplit(":", 1)[0]
+    insecure = host in INSECURE_REGISTRIES or hostname in ("localhost", "127.0.0.1", "[::1]")
+    return f"{'http' if insecure else 'https'}://{host}"
+
+
+def _token(challenge: str, timeout: float) -> Optional[str]:
+    """Fetch an anonymous bearer token for a WWW-Authenticate challenge."""
+    if not challenge.lower().startswith("bearer "):
+        return None
+    fields = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = fields.pop('realm', None)
+    if not realm:
+        return None
+    with urllib.request.urlopen(f"{realm}?{urllib.parse.urlencode(fields)}", timeout=timeout) as response:
+        payload = json.loads(response.read())
+    return payload.get('token') or payload.get('access_token')
+
+
+def _get(url: str, accept: tuple[str, ...], timeout: float, auth: dict) -> tuple[dict, dict]:
+    """GET a JSON document, authenticating once if the registry asks for a token."""
+    for attempt in range(2):
+        headers = {'Accept': ", ".join(accept)}
+        if auth.get('token'):
+            headers['Authorization'] = f"Bearer {auth['token']}"
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+                return json.loads(response.read()), dict(response.headers)
+        except urllib.error.HTTPError as e:
+            if e.code != 401 or attempt:
+                raise RegistryError(f"{url} answered {e.code}")
+            auth['token'] = _token(e.headers.get('WWW-Authenticate', ''), timeout)
+            if not auth['token']:
+                raise RegistryError(f"{url} needs credentials")
+    raise RegistryError(f"{url} needs credentials")
+
+
+def inspect_remote_image(image: str, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    Read the manifest of an image from its registry without pulling it.
+
+    Multi-platform images are resolved to the manifest of the host's
+    platform. Only anonymous access is supported, so private images raise
+    RegistryError.
+
+    Args:
+        image (str): Image reference, e.g. "nginx:1.25" or "localhost:5000/app@sha256:..."
+        timeout (float): Seconds each registry request may take
+
+    Returns:
+        dict: 'digest', the digest Docker records in RepoDigests after a pull,
+        and 'size', the compressed bytes of the config and all layers
+
+    Raises:
+        RegistryError: If the registry cannot be reached or refuses the request
+    """
+    host, repository, reference = parse_reference(image)
+    base = f"{_base_url(host)}/v2/{repository}/manifests/"
+    auth = {}
+    try:
+        manifest, headers = _get(base + reference, MANIFEST_TYPES, timeout, auth)
+        digest = headers.get('Docker-Content-Digest') or (reference if reference.startswith("sha256:") else None)
+
+        if 'manifests' in manifest:
+            architecture = ARCHITECTURES.get(platform.machine().lower(), "amd64")
+            candidates = [entry for entry in manifest['manifests']
+                          if entry.get('platform', {}).get('os', 'linux') == "linux"]
+            chosen = next((entry for entry in candidates
+                           if entry.get('platform', {}).get('architecture') == architecture), None)
+            if chosen is None:
+                raise RegistryError(f"{image} has no manifest for linux/{architecture}")
+            manifest, _ = _get(base + chosen['digest'], MANIFEST_TYPES[2:], timeout, auth)
+    except (OSError, ValueError) as e:
+        raise RegistryError(f"Could not read the manifest of {image}: {str(e)}")
+
+    layers = manifest.get('layers') or []
+    size = sum(layer.get('size', 0) for layer in layers) + manifest.get('config', {}).get('size', 0)
+    return {'digest': digest, 'size': size}
@@ -0,0 +1,242 @@
+import collections
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+# Seconds between two checks of all registered stacks
+DEFAULT_INTERVAL = 6 * 60 * 60
+
+# Number of stacks checked and updated together in one wave
+DEFAULT_WAVE_SIZE = 4
+
+# Upper bound (seconds) of the random delay before each stack of a wave starts
+DEFAULT_JITTER = 30
+
+# Maximum number of stacks restarted within any 60 second window
+DEFAULT_RESTARTS_PER_MINUTE = 2
+
+# Maximum number of stacks pulling images at the same time
+DEFAULT_MAX_CONCURRENT_PULLS = 2
+
+
+class _RateLimiter:
+    """Allow at most `limit` events within any sliding window of `period` seconds."""
+
+    def __init__(self, limit: int, period: float = 60):
+        self._limit = limit
+        self._period = period
+        self._events = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, stopped: threading.Event) -> bool:
+        """Wait for a free slot and take it; returns False if stopped was set first."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._events and now - self._events[0] >= self._period:
+                    self._events.popleft()
+                if len(self._events) < self._limit:
+                    self._events.append(now)
+                    return True
+                wait = self._period - (now - self._events[0])
+            if stopped.wait(wait):
+                return False
+
+
+class UpdateScheduler:
+    """
+    Periodically check registered stacks for new images and roll out updates.
+
+    Every interval the registered stacks are split into waves. The stacks of a
+    wave start after a random delay of up to jitter seconds and pull their
+    images, at most max_concurrent_pulls stacks at a time. Stacks whose images
+    did not change are left alone; the others are updated with the images that
+    were just pulled, at most restarts_per_minute of them per minute. The next
+    wave starts once the current one has finished.
+
+    Args:
+        update_func (Callable): Function with the signature of
+            docker_manager.update_docker_stack
+        check_func (Callable[[str], tuple[dict, dict]]): Pulls the images of a
+            stack and returns their (before, after) IDs and the failed pulls,
+            e.g. docker_manager.check_stack_images
+        interval (float): Seconds between two rollouts
+        wave_size (int): Number of stacks handled together
+        jitter (float): Upper bound of the random delay before each stack starts
+        restarts_per_minute (int): Maximum number of stacks updated per minute
+        max_concurrent_pulls (int): Maximum number of stacks pulling at once
+        **options: Passed on to update_func (e.g. backend, timeouts)
+    """
+
+    def __init__(self, update_func: Callable, check_func: Callable[[str], tuple[dict, dict]],
+                 interval: float = DEFAULT_INTERVAL, wave_size: int = DEFAULT_WAVE_SIZE,
+                 jitter: float = DEFAULT_JITTER, restarts_per_minute: int = DEFAULT_RESTARTS_PER_MINUTE,
+                 max_concurrent_pulls: int = DEFAULT_MAX_CONCURRENT_PULLS, **options):
+        if wave_size < 1 or restarts_per_minute < 1 or max_concurrent_pulls < 1:
+            raise ValueError("wave_size, restarts_per_minute and max_concurrent_pulls must be at least 1")
+        self._update_func = update_func
+        self._check_func = check_func
+        self._interval = interval
+        self._wave_size = wave_size
+        self._jitter = jitter
+        self._restarts = _RateLimiter(restarts_per_minute)
+        self._pulls = threading.Semaphore(max_concurrent_pulls)
+        # Only images that changed are restarted, so the update must not pull again
+        self._options = dict(options, mode='skip-unchanged')
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stacks = set()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._next_run = None
+        self._current = None
+        self._last_rollout = None
+
+    def register(self, path: str) -> None:
+        """Include a stack in future rollouts."""
+        with self._lock:
+            self._stacks.add(path)
+
+    def unregister(self, path: str) -> bool:
+        """Exclude a stack from future rollouts; returns False if it was not registered."""
+        with self._lock:
+            if path not in self._stacks:
+                return False
+            self._stacks.discard(path)
+            return True
+
+    def stacks(self) -> list[str]:
+        """Return the registered stacks, sorted by path."""
+        with self._lock:
+            return sorted(self._stacks)
+
+    def start(self) -> None:
+        """Run a rollout every interval in a background thread."""
+        if self._thread is None:
+            self._next_run = time.time() + self._interval
+            self._thread = threading.Thread(target=self._loop, name="update-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread; a running rollout ends after its current stacks."""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def trigger(self) -> None:
+        """Start the next rollout right away instead of waiting for the interval."""
+        self._wakeup.set()
+
+    def run_now(self) -> bool:
+        """
+        Start a rollout right away without waiting for it.
+
+        The background thread runs it if it is started, otherwise a thread
+        of its own. Returns False, starting nothing, while a rollout is
+        already in progress.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return False
+        if self.status()['running']:
+            self._run_lock.release()
+            self.trigger()
+            return True
+
+        def run() -> None:
+            try:
+                self._rollout()
+            except Exception as e:
+                print(f"Scheduled update failed: {str(e)}")
+            finally:
+                self._run_lock.release()
+        threading.Thread(target=run, name="update-scheduler", daemon=True).start()
+        return True
+
+    def status(self) -> dict:
+        """Return the registered stacks, the next rollout time and the current and last rollout."""
+        with self._lock:
+            return {
+                'stacks': sorted(self._stacks),
+                'running': self._thread is not None and not self._stopped.is_set(),
+                'next_run': self._next_run,
+                'current': self._current and dict(self._current, results=list(self._current['results'])),
+                'last': self._last_rollout
+            }
+
+    def run_once(self) -> dict:
+        """
+        Check every registered stack once and update those with new images.
+
+        Returns:
+            dict: A dictionary containing:
+                - started, finished: Unix timestamps of the rollout
+                - results: One entry per stack in the order handled, with the
+                  keys 'path', 'state' ('unchanged', 'updated' or 'failed'),
+                  'changed' images, 'error' and 'duration' (seconds)
+        """
+        with self._run_lock:
+            return self._rollout()
+
+    def _rollout(self) -> dict:
+        # Called with _run_lock held
+        stacks = self.stacks()
+        random.shuffle(stacks)
+        rollout = {'started': time.time(), 'finished': None, 'results': []}
+        with self._lock:
+            self._current = rollout
+
+        for start in range(0, len(stacks), self._wave_size):
+            if self._stopped.is_set():
+                break
+            wave = stacks[start:start + self._wave_size]
+            with ThreadPoolExecutor(max_workers=len(wave), thread_name_prefix="update-wave") as pool:
+                for result in pool.map(self._roll_out, wave):
+                    if result:
+                        with self._lock:
+                            rollout['results'].append(result)
+
+        rollout['finished'] = time.time()
+        with self._lock:
+            self._current = None
+            self._last_rollout = rollout
+        return rollout
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(max(0.0, self._next_run - time.time()))
+            if self._stopped.is_set():
+                break
+            self._wakeup.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Scheduled update failed: {str(e)}")
+            self._next_run = time.time() + self._interval
+
+    def _roll_out(self, path: str) -> Optional[dict]:
+        # Stagger the stacks of a wave so they do not all hit the registry at once
+        if self._stopped.wait(random.uniform(0, self._jitter)):
+            return None
+        started = time.monotonic()
+        result = {'path': path, 'state': 'unchanged', 'changed': [], 'error': None}
+
+        try:
+            with self._pulls:
+                pulled, failed = self._check_func(path)
+            result['changed'] = sorted(image for image, (before, after) in pulled.items() if before != after)
+
+            if failed:
+                result.update(state='failed', error="Image pull failed: " + "; ".join(
+                    f"{image}: {error}" for image, error in sorted(failed.items())))
+            elif result['changed']:
+                if not self._restarts.acquire(self._stopped):
+                    return None
+                success, error, _ = self._update_func(path, pulled=pulled, **self._options)
+                result.update(state='updated' if success else 'failed', error=error)
+        except Exception as e:
+            result.update(state='failed', error=f"Unexpected error: {str(e)}")
+
+        result['duration'] = round(time.monotonic() - started, 3)
+        return result
@@ -1,24 +1,131 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+import json
 import os
-import sys
+import queue
 
-# Add parent directory to Python path to import docker_manager
+import docker_manager
+import history
+from jobs import JobManager
+from metrics import UpdateMetrics
+import scheduler
+from stack_index import StackIndex
+from static_assets import StaticAsset
+
+# Files are resolved relative to this module, never the working directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-docker_manager_path = os.path.join('docker_manager.py')
 
-# Import the update_docker_container function
-import importlib.util
-spec = importlib.util.spec_from_file_location("docker_manager", docker_manager_path)
-docker_manager = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(docker_manager)
-update_docker_container = docker_manager.update_docker_container
+update_docker_stack = docker_manager.update_docker_stack
+update_docker_containers = docker_manager.update_docker_containers
+
+# Number of stacks a batch update runs at the same time unless the request says otherwise
+MAX_WORKERS = int(os.environ.get('DOCKER_UPDATE_MAX_WORKERS', docker_manager.DEFAULT_MAX_WORKERS))
+
+# Docker backend used unless the request says otherwise ('cli' or 'api')
+BACKEND = os.environ.get('DOCKER_UPDATE_BACKEND', 'cli')
+
+# Default time limits per phase in seconds, e.g. "pull=1800,up=600"
+TIMEOUTS = {phase: float(seconds) for phase, _, seconds in
+            (item.partition('=') for item in os.environ.get('DOCKER_UPDATE_TIMEOUTS', '').split(',') if item)}
+
+# Default limits of deduplicated batch pulls: average bytes per second (e.g. "20M"), free
+# space to keep in the Docker root (e.g. "10G") and the directory holding Docker's images
+PULL_BANDWIDTH = os.environ.get('DOCKER_UPDATE_PULL_BANDWIDTH')
+DISK_RESERVE = os.environ.get('DOCKER_UPDATE_DISK_RESERVE')
+DOCKER_ROOT = os.environ.get('DOCKER_UPDATE_DOCKER_ROOT', docker_manager.DEFAULT_DOCKER_ROOT)
+
+# Request threads of the production server. Event streams and batch updates hold a
+# thread for as long as they run, so this is sized well above MAX_WORKERS
+SERVER_THREADS = int(os.environ.get('DOCKER_UPDATE_SERVER_THREADS', max(32, 4 * MAX_WORKERS)))
+
+# Seconds between keep-alive comments on idle event streams
+STREAM_HEARTBEAT = 15
+
+# Directories searched for stacks in the background, separated like PATH
+STACK_ROOTS = [root for root in os.environ.get('DOCKER_UPDATE_ROOTS', '').split(os.pathsep) if root]
+
+# Seconds the stack index waits for `docker-compose config` of one stack, so a hung
+# command cannot stall the refresh that holds the index lock
+INDEX_CONFIG_TIMEOUT = float(os.environ.get('DOCKER_UPDATE_INDEX_TIMEOUT', 30))
+
+stack_index = StackIndex(STACK_ROOTS,
+                         images_func=lambda path: docker_manager.stack_images(path, timeout=INDEX_CONFIG_TIMEOUT))
+
+# SQLite database holding the history of every update
+HISTORY_DB = os.environ.get('DOCKER_UPDATE_HISTORY_DB', os.path.join(current_dir, 'update-history.db'))
+
+metrics = UpdateMetrics()
+update_history = history.UpdateHistory(HISTORY_DB)
+tracked_update = update_history.track(metrics.track(update_docker_stack))
+jobs = JobManager(tracked_update, max_workers=MAX_WORKERS)
+
+# Seconds between scheduled rollouts; the scheduler only runs in the background when this is set
+SCHEDULE_INTERVAL = os.environ.get('DOCKER_UPDATE_SCHEDULE_INTERVAL')
+
+update_scheduler = scheduler.UpdateScheduler(
+    tracked_update,
+    lambda path: docker_manager.check_stack_images(path, backend=BACKEND, timeout=TIMEOUTS.get('pull')),
+    interval=float(SCHEDULE_INTERVAL or scheduler.DEFAULT_INTERVAL),
+    wave_size=int(os.environ.get('DOCKER_UPDATE_SCHEDULE_WAVE_SIZE', scheduler.DEFAULT_WAVE_SIZE)),
+    jitter=float(os.environ.get('DOCKER_UPDATE_SCHEDULE_JITTER', scheduler.DEFAULT_JITTER)),
+    restarts_per_minute=int(os.environ.get('DOCKER_UPDATE_SCHEDULE_RESTARTS_PER_MINUTE',
+                                           scheduler.DEFAULT_RESTARTS_PER_MINUTE)),
+    max_concurrent_pulls=int(os.environ.get('DOCKER_UPDATE_SCHEDULE_MAX_PULLS',
+                                            scheduler.DEFAULT_MAX_CONCURRENT_PULLS)),
+    backend=BACKEND,
+    timeouts=TIMEOUTS
+)
+# Stacks registered for scheduled updates at startup, separated like PATH
+for stack in os.environ.get('DOCKER_UPDATE_SCHEDULE_STACKS', '').split(os.pathsep):
+    if stack:
+        update_scheduler.register(os.path.abspath(stack))
+
+def start_background_tasks():
+    """Start the stack index and, when an interval is set, the scheduler in this process."""
+    stack_index.start()
+    if SCHEDULE_INTERVAL:
+        update_scheduler.start()
+
+# The web interface, held in memory with precompressed variants
+ui = StaticAsset(os.path.join(current_dir, 'index.html'))
 
 app = Flask(__name__)
 
+def create_app():
+    """Start the background tasks and return the app; WSGI servers use this, since importing the module starts nothing."""
+    start_background_tasks()
+    return app
+
+def update_options():
+    """Read and validate the update options shared by the update endpoints."""
+    options = {
+        'mode': request.json.get('mode', 'recreate'),
+        'backend': request.json.get('backend', BACKEND)
+    }
+    if options['mode'] not in docker_manager.UPDATE_MODES:
+        return None, f"Unknown update mode: {options['mode']}"
+    if options['backend'] not in docker_manager.BACKENDS:
+        return None, f"Unknown backend: {options['backend']}"
+    
+    timeouts = dict(TIMEOUTS, **(request.json.get('timeouts') or {}))
+    for phase, seconds in timeouts.items():
+        if phase not in docker_manager.PHASES:
+            return None, f"Unknown phase in timeouts: {phase}"
+        if not isinstance(seconds, (int, float)) or seconds <= 0:
+            return None, f"Timeout for phase '{phase}' must be a positive number of seconds"
+    if timeouts:
+        options['timeouts'] = timeouts
+    return options, None
+
 @app.route('/')
 def home():
-    return app.send_static_file('index.html')
+    variant = ui.variant(request.accept_encodings.quality)
+    # Browsers revalidate on every load and get a bodiless 304 while the file is unchanged
+    headers = {'ETag': f'"{variant["etag"]}"', 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if variant['encoding']:
+        headers['Content-Encoding'] = variant['encoding']
+    if request.if_none_match.contains_weak(variant['etag']):
+        return Response(status=304, headers=headers)
+    return Response(variant['body'], mimetype=ui.mimetype, headers=headers)
 
 @app.route('/list-directories')
 def list_directories():
@@ -27,9 +134,19 @@ def list_directories():
         if not path:
             return jsonify({'error': 'No path provided'})
         
-        # Get all directories in the specified path
-        directories = [d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d))]
-        return jsonify(directories)
+        # Served from the stack index, which only touches the disk for paths it has not seen yet
+        directories = stack_index.list_directories(path, refresh=bool(request.args.get('refresh')))
+        if request.args.get('details'):
+            return jsonify(directories)
+        return jsonify([d['name'] for d in directories])
+    
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/stacks')
+def list_stacks():
+    try:
+        return jsonify(stack_index.stacks(request.args.get('root') or None))
     
     except Exception as e:
         return jsonify({'error': str(e)})
@@ -41,20 +158,172 @@ def update_docker():
         if not path:
             return jsonify({'error': 'No path provided'})
         
-        success, error = update_docker_container(path)
-        return jsonify({
-            'success': success,
-            'error': error if error else None
-        })
+        options, error = update_options()
+        if error:
+            return jsonify({'error': error})
+        
+        job_id = jobs.submit(path, **options)
+        return jsonify({'job_id': job_id}), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify(jobs.list())
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if jobs.get(job_id) is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    if not jobs.cancel(job_id):
+        return jsonify({'error': f'Job already finished: {job_id}'}), 409
+    return jsonify({'job_id': job_id, 'cancelled': True})
+
+@app.route('/jobs/stream')
+def stream_jobs():
+    # Optionally restrict the stream to a single job
+    job_id = request.args.get('job')
+    events = jobs.subscribe()
+    
+    def generate():
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if job_id and event['job'] != job_id:
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            jobs.unsubscribe(events)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/update-docker-batch', methods=['POST'])
+def update_docker_batch():
+    try:
+        paths = request.json.get('paths')
+        if not paths or not isinstance(paths, list):
+            return jsonify({'error': 'No paths provided'})
+        
+        max_workers = int(request.json.get('max_workers') or MAX_WORKERS)
+        if max_workers < 1:
+            return jsonify({'error': 'max_workers must be at least 1'})
+        
+        options, error = update_options()
+        if error:
+            return jsonify({'error': error})
+        
+        dedupe_pulls = bool(request.json.get('dedupe_pulls', False))
+        ordered = bool(request.json.get('ordered', False))
+        pull_workers = int(request.json.get('pull_workers') or docker_manager.DEFAULT_PULL_WORKERS)
+        if pull_workers < 1:
+            return jsonify({'error': 'pull_workers must be at least 1'})
+        
+        # Sizes are bytes or strings like "20M"; the server-wide limits only apply to deduplicated pulls
+        bandwidth = request.json.get('bandwidth', PULL_BANDWIDTH if dedupe_pulls else None)
+        disk_reserve = request.json.get('disk_reserve', DISK_RESERVE if dedupe_pulls else None)
+        try:
+            bandwidth = docker_manager.parse_size(bandwidth) if bandwidth else None
+            disk_reserve = docker_manager.parse_size(disk_reserve) if disk_reserve is not None else None
+        except ValueError as e:
+            return jsonify({'error': str(e)})
+        
+        return jsonify(update_docker_containers(paths, max_workers=max_workers, dedupe_pulls=dedupe_pulls,
+                                                pull_workers=pull_workers, ordered=ordered,
+                                                update_func=tracked_update,
+                                                bandwidth=bandwidth, disk_reserve=disk_reserve,
+                                                docker_root=DOCKER_ROOT,
+                                                prune=bool(request.json.get('prune', False)),
+                                                **options))
     
     except Exception as e:
         return jsonify({'error': str(e)})
 
+@app.route('/history')
+def get_history():
+    try:
+        before = request.args.get('before')
+        return jsonify(update_history.page(
+            stack=request.args.get('stack') or None,
+            before=int(before) if before else None,
+            limit=int(request.args.get('limit') or history.DEFAULT_PAGE_SIZE)
+        ))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/history/summary')
+def get_history_summary():
+    try:
+        return jsonify(update_history.summary(request.args.get('root') or None))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/schedule')
+def get_schedule():
+    return jsonify(update_scheduler.status())
+
+@app.route('/schedule/stacks', methods=['POST', 'DELETE'])
+def schedule_stack():
+    path = request.json.get('path')
+    if not path:
+        return jsonify({'error': 'No path provided'})
+    path = os.path.abspath(path)
+    
+    if request.method == 'DELETE':
+        if not update_scheduler.unregister(path):
+            return jsonify({'error': f'Stack not scheduled: {path}'}), 404
+    elif not os.path.isdir(path):
+        return jsonify({'error': f'Invalid path: {path} is not a directory'})
+    else:
+        update_scheduler.register(path)
+    return jsonify({'stacks': update_scheduler.stacks()})
+
+@app.route('/schedule/run', methods=['POST'])
+def run_schedule():
+    if not update_scheduler.run_now():
+        return jsonify({'error': 'A rollout is already in progress'}), 409
+    return jsonify({'triggered': True}), 202
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    # Ensure the static folder exists
-    os.makedirs('static', exist_ok=True)
-    # Copy index.html to static folder
-    import shutil
-    shutil.copy('index.html', 'static/index.html')
-    # Run the server
-    app.run(debug=True)
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Serve the Docker Update Manager web interface and API")
+    parser.add_argument("--host", default=os.environ.get('DOCKER_UPDATE_HOST', '127.0.0.1'),
+                        help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('DOCKER_UPDATE_PORT', 5000)),
+                        help="Port to listen on (default: 5000)")
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS,
+                        help=f"Request threads of the production server (default: {SERVER_THREADS})")
+    parser.add_argument("--dev", action="store_true",
+                        help="Run Flask's development server with the debugger and reloader instead")
+    args = parser.parse_args()
+    
+    if args.dev:
+        # The reloader runs this script again in a child process that serves the requests,
+        # so only that child starts the background tasks
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_background_tasks()
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        # Jobs, event streams and the stack index live in this process, so it is
+        # one process with a pool of request threads rather than several processes
+        from waitress import serve
+        serve(create_app(), host=args.host, port=args.port, threads=args.threads, ident="docker-update")
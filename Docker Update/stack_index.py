@@ -0,0 +1,197 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Configuration files that make a directory a stack, in the order docker_manager checks them
+CONFIG_FILES = (("docker-compose.yml", "compose"), ("docker-run-command.txt", "run"))
+
+# How many directory levels below a root are searched for stacks
+DEFAULT_MAX_DEPTH = 3
+
+# Seconds between background refreshes of the index
+DEFAULT_REFRESH_INTERVAL = 30
+
+# Directories outside the roots whose listings are kept in the index, least recently listed dropped first
+MAX_BROWSED_PATHS = 64
+
+
+class StackIndex:
+    """
+    In-memory index of the stack directories below a set of roots.
+
+    Directories are discovered recursively and each one records whether it
+    holds a docker-compose.yml or docker-run-command.txt, the modification time
+    of that file and the images it uses. Lookups are answered from memory; a
+    background thread refreshes the index incrementally, only rescanning
+    directories whose mtime changed and only re-reading configuration files
+    whose mtime changed. Stack directories are not searched any deeper, so
+    container data below them is never walked. Directories listed outside the
+    roots are not refreshed in the background; only the last MAX_BROWSED_PATHS
+    of them are kept.
+
+    Args:
+        roots (list[str]): Directories indexed up front
+        images_func (Optional[Callable[[str], list[str]]]): Returns the images of a
+            stack directory, e.g. docker_manager.stack_images
+        max_depth (int): How many levels below a root are searched
+        refresh_interval (float): Seconds between background refreshes
+    """
+
+    def __init__(self, roots: list[str] = (), images_func: Optional[Callable[[str], list[str]]] = None,
+                 max_depth: int = DEFAULT_MAX_DEPTH, refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
+        self._images_func = images_func
+        self._max_depth = max_depth
+        self._refresh_interval = refresh_interval
+        self._roots = frozenset(os.path.abspath(root) for root in roots)
+        self._nodes = {}
+        # Listed directories outside the roots, least recently listed first; guarded by the refresh lock
+        self._browsed = OrderedDict()
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Index the roots and keep refreshing them in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="stack-index", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh."""
+        self._stopped.set()
+
+    def refresh(self, path: Optional[str] = None) -> None:
+        """Bring the index up to date for one root (or every root) right away."""
+        roots = [os.path.abspath(path)] if path else sorted(self._roots)
+        with self._refresh_lock:
+            for root in roots:
+                self._scan(root, self._max_depth)
+
+    def list_directories(self, path: str, refresh: bool = False) -> list[dict]:
+        """
+        Return the directories directly inside path with their stack details.
+
+        A path inside the roots is answered from the index, which the
+        background refresh keeps up to date. A path outside them is rescanned
+        one level deep on every listing, which only re-reads what changed.
+
+        Returns:
+            list[dict]: One entry per directory, sorted by name, see _entry()
+        """
+        path = os.path.abspath(path)
+        node = self._nodes.get(path)
+        if not self._in_roots(path):
+            with self._refresh_lock:
+                node = self._scan(path, 1, list_children=True)
+                if node is not None:
+                    self._browse(path)
+        elif node is None or refresh or any(child not in self._nodes for child in node['children']):
+            with self._refresh_lock:
+                node = self._scan(path, max(1, self._max_depth), list_children=True)
+        if node is None:
+            raise FileNotFoundError(f"No such directory: {path}")
+        return [self._entry(child) for child in node['children'] if child in self._nodes]
+
+    def stacks(self, root: Optional[str] = None) -> list[dict]:
+        """Return every indexed stack, optionally only those below root, sorted by path."""
+        prefix = os.path.abspath(root) + os.sep if root else ""
+        nodes = dict(self._nodes)
+        return [self._entry(path) for path, node in sorted(nodes.items())
+                if node['type'] and path.startswith(prefix)]
+
+    def _entry(self, path: str) -> dict:
+        node = self._nodes[path]
+        return {
+            'name': os.path.basename(path),
+            'path': path,
+            'type': node['type'],
+            'mtime': node['config_mtime'],
+            'images': node['images']
+        }
+
+    def _refresh_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Stack index refresh failed: {str(e)}")
+            self._stopped.wait(self._refresh_interval)
+
+    def _scan(self, path: str, depth: int, list_children: bool = False) -> Optional[dict]:
+        """
+        Update the node of path, and its children down to depth; caller holds the refresh lock.
+
+        The children of a stack directory are only scanned with list_children,
+        when someone lists that directory.
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget(path)
+            return None
+
+        node = self._nodes.get(path)
+        if node is None or node['mtime'] != mtime:
+            children, config_names = [], set()
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            children.append(entry.path)
+                        else:
+                            config_names.add(entry.name)
+                    except OSError:
+                        continue
+            config_type = next((kind for name, kind in CONFIG_FILES if name in config_names), None)
+            node = dict(node or {'config_mtime': None, 'images': []},
+                        mtime=mtime, children=sorted(children), type=config_type)
+            for child in set((self._nodes.get(path) or {}).get('children', [])) - set(children):
+                self._forget(child)
+
+        if node['type']:
+            config_name = next(name for name, kind in CONFIG_FILES if kind == node['type'])
+            try:
+                config_mtime = os.stat(os.path.join(path, config_name)).st_mtime
+            except OSError:
+                config_mtime = None
+            if config_mtime != node['config_mtime']:
+                node = dict(node, config_mtime=config_mtime, images=self._read_images(path))
+        else:
+            node = dict(node, config_mtime=None, images=[])
+
+        # Nodes are replaced, never mutated, so readers never see a half-updated entry
+        self._nodes[path] = node
+
+        if depth > 0 and (list_children or not node['type']):
+            for child in node['children']:
+                # Hidden directories are listed but not searched
+                self._scan(child, 0 if os.path.basename(child).startswith('.') else depth - 1)
+        return node
+
+    def _in_roots(self, path: str) -> bool:
+        return any(path == root or path.startswith(root + os.sep) for root in self._roots)
+
+    def _browse(self, path: str) -> None:
+        """Remember a listed path outside the roots, dropping the least recently listed; caller holds the refresh lock."""
+        self._browsed[path] = True
+        self._browsed.move_to_end(path)
+        while len(self._browsed) > MAX_BROWSED_PATHS:
+            dropped, _ = self._browsed.popitem(last=False)
+            # Only the nodes its listing added; the roots and other listed paths keep theirs
+            for stale in [dropped] + self._nodes.get(dropped, {}).get('children', []):
+                if not self._in_roots(stale) and stale not in self._browsed:
+                    self._nodes.pop(stale, None)
+
+    def _read_images(self, path: str) -> list[str]:
+        if self._images_func is None:
+            return []
+        try:
+            return self._images_func(path)
+        except Exception:
+            return []
+
+    def _forget(self, path: str) -> None:
+        node = self._nodes.pop(path, None)
+        for child in (node or {}).get('children', []):
+            self._forget(child)
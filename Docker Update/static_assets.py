@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Callable, Optional
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it only the gzip variant is built
+    brotli = None
+
+# Compression levels of the prebuilt variants; they are built once, so the slowest, smallest settings are used
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Encodings tried in order of preference when a client accepts several
+ENCODINGS = ("br", "gzip")
+
+
+class StaticAsset:
+    """
+    A file served from memory with precompressed variants.
+
+    The file is read once and compressed with gzip and, when the brotli
+    module is installed, brotli. Every variant gets a strong ETag derived
+    from the SHA-256 of the file content, so a client that already has the
+    current version only needs a 304 response. The file is rebuilt only when
+    its modification time changes.
+
+    Args:
+        path (str): File to serve
+        mimetype (Optional[str]): Content type; guessed from the file name when omitted
+    """
+
+    def __init__(self, path: str, mimetype: Optional[str] = None):
+        self._path = path
+        self.mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._build()
+
+    def _build(self) -> None:
+        mtime = os.stat(self._path).st_mtime_ns
+        with open(self._path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        variants = {None: content, "gzip": gzip.compress(content, GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(content, quality=BROTLI_QUALITY)
+        # Keep only variants that are actually smaller
+        self._variants = {
+            encoding: {
+                'body': body,
+                'encoding': encoding,
+                'etag': digest if encoding is None else f"{digest}-{encoding}"
+            }
+            for encoding, body in variants.items() if encoding is None or len(body) < len(content)
+        }
+        self.content_hash = digest
+        self._mtime = mtime
+
+    def variant(self, quality: Callable[[str], float]) -> dict:
+        """
+        Pick the variant to send.
+
+        Args:
+            quality (Callable[[str], float]): Returns the client's preference for
+                an encoding from its Accept-Encoding header, 0 if not accepted
+
+        Returns:
+            dict: 'body' (bytes), 'encoding' (None for the plain file) and 'etag'
+            (without quotes)
+        """
+        try:
+            if os.stat(self._path).st_mtime_ns != self._mtime:
+                with self._lock:
+                    self._build()
+        except OSError:
+            # Keep serving the last version built
+            pass
+
+        variants = self._variants
+        accepted = [encoding for encoding in ENCODINGS if encoding in variants and quality(encoding) > 0]
+        if not accepted:
+            return variants[None]
+        return variants[max(accepted, key=lambda encoding: quality(encoding))]
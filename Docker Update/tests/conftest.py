@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+import docker_manager  # noqa: E402
+from fake_engine import FakeEngine  # noqa: E402
+
+
+class FakeDocker:
+    """Controls the stand-in docker and docker-compose clients of fake_docker.py."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.set_images({}, {})
+
+    def set_images(self, local: dict[str, str], registry: dict[str, str]) -> None:
+        """Set the image IDs present locally and those a pull fetches."""
+        with open(os.path.join(self.directory, "state.json"), 'w') as f:
+            json.dump({'local': local, 'registry': registry}, f)
+
+    def local_images(self) -> dict[str, str]:
+        with open(os.path.join(self.directory, "state.json"), 'r') as f:
+            return json.load(f)['local']
+
+    def commands(self) -> list[dict]:
+        """Every call so far, as {'cwd': ..., 'argv': [...]}."""
+        path = os.path.join(self.directory, "commands.log")
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f]
+
+    def argv(self, cwd: str = None) -> list[list[str]]:
+        """The argv of every call, only those run in cwd if given."""
+        return [command['argv'] for command in self.commands() if cwd is None or command['cwd'] == cwd]
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    """Put the stand-in docker and docker-compose first on PATH."""
+    directory = tmp_path / "fake-docker"
+    bin_dir = directory / "bin"
+    bin_dir.mkdir(parents=True)
+    with open(os.path.join(TESTS_DIR, "fake_docker.py"), 'r') as f:
+        script = f"#!{sys.executable}\n" + f.read()
+    for name in ("docker", "docker-compose"):
+        (bin_dir / name).write_text(script)
+        (bin_dir / name).chmod(0o755)
+    monkeypatch.setenv("FAKE_DOCKER_DIR", str(directory))
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return FakeDocker(str(directory))
+
+
+@pytest.fixture
+def make_stack(tmp_path):
+    """Create a stack directory whose docker-compose.yml runs the given services and images."""
+    def make(name: str, services: dict[str, dict], override: dict = None) -> str:
+        path = tmp_path / "stacks" / name
+        path.mkdir(parents=True)
+        (path / "docker-compose.yml").write_text(json.dumps({'services': services}))
+        if override is not None:
+            (path / "docker-compose.override.yml").write_text(json.dumps({'services': override}))
+        return str(path)
+    return make
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The server module, importing it with its update history in a temporary database."""
+    os.environ['DOCKER_UPDATE_HISTORY_DB'] = str(tmp_path_factory.mktemp("history") / "update-history.db")
+    import server
+    yield server
+    del os.environ['DOCKER_UPDATE_HISTORY_DB']
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    """Serve a stand-in Engine API and point DOCKER_HOST at it."""
+    # The socket path must stay short, so it does not live in tmp_path
+    directory = tempfile.mkdtemp(prefix="engine-")
+    engine = FakeEngine(os.path.join(directory, "docker.sock"))
+    monkeypatch.setenv("DOCKER_HOST", f"unix://{engine.socket_path}")
+    monkeypatch.setattr(docker_manager, "_engine_clients", {})
+    yield engine
+    engine.close()
+    shutil.rmtree(directory)
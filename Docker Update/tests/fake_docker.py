@@ -0,0 +1,119 @@
+"""
+Stand-in for the docker and docker-compose command line clients.
+
+conftest.py installs this file under both names. The state lives in
+$FAKE_DOCKER_DIR/state.json: 'local' maps image references to the ID of the
+image present locally, 'registry' to the ID a pull fetches. Every call is
+appended to $FAKE_DOCKER_DIR/commands.log as a JSON line with its cwd and
+argv. $FAKE_DOCKER_DELAY seconds are slept in the commands that change
+something, so concurrent calls overlap, and the commands named in
+$FAKE_DOCKER_HANG hang.
+"""
+import fcntl
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import yaml
+
+STATE_DIR = os.environ["FAKE_DOCKER_DIR"]
+
+
+@contextmanager
+def state():
+    """Load the state under a lock and write it back afterwards."""
+    with open(os.path.join(STATE_DIR, "state.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        path = os.path.join(STATE_DIR, "state.json")
+        with open(path, 'r') as f:
+            data = json.load(f)
+        yield data
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+
+def log(program: str, args: list[str]) -> None:
+    with open(os.path.join(STATE_DIR, "commands.log"), 'a') as f:
+        f.write(json.dumps({'cwd': os.getcwd(), 'argv': [program] + args}) + "\n")
+
+
+def pause() -> None:
+    time.sleep(float(os.environ.get("FAKE_DOCKER_DELAY", "0")))
+
+
+def hang(args: list[str]) -> None:
+    """Sleep far past any test timeout in the commands named in $FAKE_DOCKER_HANG, e.g. 'config,ps'."""
+    if args[0] in os.environ.get("FAKE_DOCKER_HANG", "").split(","):
+        time.sleep(60)
+
+
+def pull(image: str) -> bool:
+    with state() as data:
+        if image not in data['registry']:
+            return False
+        data['local'][image] = data['registry'][image]
+    return True
+
+
+def compose_services() -> dict:
+    """The services of docker-compose.yml in the working directory, with the override file merged in."""
+    services = {}
+    for name in ("docker-compose.yml", "docker-compose.override.yml"):
+        if os.path.isfile(name):
+            with open(name, 'r') as f:
+                for service, config in ((yaml.safe_load(f) or {}).get("services") or {}).items():
+                    services.setdefault(service, {}).update(config or {})
+    return services
+
+
+def docker_compose(args: list[str]) -> int:
+    services = compose_services()
+    hang(args)
+    if args[0] == "config":
+        print(json.dumps({'name': os.path.basename(os.getcwd()), 'services': services}))
+        return 0
+    pause()
+    if args[0] == "pull":
+        for service in args[1:] or list(services):
+            image = services[service].get("image")
+            if image and not pull(image):
+                print(f"{image}: not found", file=sys.stderr)
+                return 1
+    print(f"docker-compose {' '.join(args)} done")
+    return 0
+
+
+def docker(args: list[str]) -> int:
+    hang(args)
+    if args[:2] == ["image", "inspect"]:
+        with state() as data:
+            image_id = data['local'].get(args[-1])
+        if image_id is None:
+            print(f"Error: No such image: {args[-1]}", file=sys.stderr)
+            return 1
+        print(json.dumps([f"{args[-1]}@{image_id}"]) if "RepoDigests" in args[3] else image_id)
+        return 0
+    if args[:2] == ["image", "prune"]:
+        print("Total reclaimed space: 0B")
+        return 0
+    if args[0] == "ps":
+        return 0
+    if args[:2] == ["container", "inspect"]:
+        print("[]")
+        print(f"Error: No such container: {args[-1]}", file=sys.stderr)
+        return 1
+    pause()
+    if args[0] == "pull":
+        if not pull(args[1]):
+            print(f"Error: {args[1]} not found", file=sys.stderr)
+            return 1
+    print(f"docker {' '.join(args)} done")
+    return 0
+
+
+if __name__ == "__main__":
+    program = os.path.basename(sys.argv[0])
+    log(program, sys.argv[1:])
+    sys.exit((docker_compose if program == "docker-compose" else docker)(sys.argv[1:]))
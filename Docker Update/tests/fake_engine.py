@@ -0,0 +1,123 @@
+"""
+Stand-in for the Docker Engine API, served over a unix socket.
+
+It answers the requests DockerEngineClient sends, keeps connections alive
+like the daemon does and records every request and connection.
+"""
+import json
+import re
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class FakeEngine:
+    """
+    Engine API on socket_path.
+
+    local maps image references to the ID present locally, registry to the
+    ID a pull fetches; containers maps container IDs to their inspect data.
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.local, self.registry, self.containers = {}, {}, {}
+        self.requests, self.connections = [], 0
+        self._lock = threading.Lock()
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with engine._lock:
+                    engine.connections += 1
+
+            def address_string(self):
+                return "fake-engine"
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle_request(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                parts = urlsplit(self.path)
+                with engine._lock:
+                    engine.requests.append((self.command, parts.path))
+                    status, payload = engine.answer(self.command, unquote(parts.path), parse_qs(parts.query), body)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_DELETE = handle_request
+
+        self._server = _Server(socket_path, Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_container(self, container_id: str, name: str, image_id: str, labels: dict) -> None:
+        self.containers[container_id] = {'Id': container_id, 'Name': f"/{name}", 'Image': image_id,
+                                         'State': {'Running': True}, 'Config': {'Labels': labels}}
+
+    def _container(self, key: str):
+        return self.containers.get(key) or next(
+            (data for data in self.containers.values() if data['Name'] == f"/{key}"), None)
+
+    def answer(self, method: str, path: str, query: dict, body):
+        """Return the status and JSON payload (or raw bytes) of a request."""
+        if match := re.fullmatch(r"/images/(.+)/json", path):
+            image_id = self.local.get(match.group(1))
+            if image_id is None:
+                return 404, {'message': f"No such image: {match.group(1)}"}
+            return 200, {'Id': image_id, 'RepoDigests': [f"{match.group(1)}@{image_id}"]}
+        if path == "/images/create":
+            image = f"{query['fromImage'][0]}:{query['tag'][0]}" if 'tag' in query else query['fromImage'][0]
+            if image not in self.registry:
+                return 200, json.dumps({'error': f"manifest for {image} not found"}).encode() + b"\n"
+            self.local[image] = self.registry[image]
+            lines = [{'status': f"Pulling from {image}", 'id': "latest"}, {'status': "Downloading", 'progress': "[=>]"},
+                     {'status': f"Digest: {self.registry[image]}"}]
+            return 200, b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+        if path == "/images/prune":
+            return 200, {'SpaceReclaimed': 0}
+        if path == "/containers/json":
+            label = json.loads(query['filters'][0])['label'][0]
+            key, _, value = label.partition("=")
+            return 200, [{'Id': container_id} for container_id, data in self.containers.items()
+                         if data['Config']['Labels'].get(key) == value]
+        if path == "/containers/create":
+            image_id = self.local.get(body['Image'])
+            if image_id is None:
+                return 404, {'message': f"No such image: {body['Image']}"}
+            container_id = f"c{len(self.containers) + 1}"
+            self.containers[container_id] = {'Id': container_id, 'Name': f"/{query['name'][0]}", 'Image': image_id,
+                                             'State': {'Running': False}, 'Config': {'Labels': body['Labels']},
+                                             'Body': body}
+            return 201, {'Id': container_id}
+        match = re.fullmatch(r"/containers/([^/]+)(?:/(json|start|stop))?", path)
+        container = self._container(match.group(1)) if match else None
+        if container is None:
+            return 404, {'message': "No such container"}
+        if match.group(2) == "json":
+            return 200, container
+        if match.group(2) == "start":
+            container['State']['Running'] = True
+            return 204, b""
+        if match.group(2) == "stop":
+            container['State']['Running'] = False
+            return 204, b""
+        del self.containers[container['Id']]
+        return 204, b""
@@ -0,0 +1,233 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import docker_manager
+
+
+def test_batch_update_runs_every_stack_in_its_own_directory(fake_docker, make_stack, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_DELAY", "0.5")
+    fake_docker.set_images({}, {"app:1": "sha256:a"})
+    paths = [make_stack(f"stack-{i}", {'app': {'image': "app:1"}}) for i in range(4)]
+    cwd = os.getcwd()
+
+    batch = docker_manager.update_docker_containers(paths, max_workers=4, on_output=lambda line: None)
+
+    assert [result['success'] for result in batch['results']] == [True] * 4
+    assert os.getcwd() == cwd
+    for path in paths:
+        assert fake_docker.argv(path) == [["docker-compose", "config"], ["docker-compose", "down"],
+                                          ["docker-compose", "pull"], ["docker-compose", "up", "-d"]]
+    # Run one after the other, the first stack would be up before the last one goes down
+    started = [command['argv'][1] for command in fake_docker.commands() if command['argv'][1] in ("down", "up")]
+    assert started[:4] == ["down"] * 4
+
+
+def test_concurrent_updates_keep_their_directories(fake_docker, make_stack, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_DELAY", "0.05")
+    fake_docker.set_images({}, {f"app-{i}:1": f"sha256:{i}" for i in range(24)})
+    paths = [make_stack(f"stack-{i}", {f'app-{i}': {'image': f"app-{i}:1"}}) for i in range(24)]
+    cwd = os.getcwd()
+
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        results = list(pool.map(lambda path: docker_manager.update_docker_stack(
+            path, mode="skip-unchanged", on_output=lambda line: None), paths))
+
+    assert [success for success, _, _ in results] == [True] * len(paths)
+    assert os.getcwd() == cwd
+    for i, (path, (_, _, report)) in enumerate(zip(paths, results)):
+        # Only this stack's own commands ran in its directory, and they found its own service
+        assert [argv for argv in fake_docker.argv(path) if argv[0] == "docker-compose"] == [
+            ["docker-compose", "config"], ["docker-compose", "pull"],
+            ["docker-compose", "up", "-d", f"app-{i}"]]
+        assert report['restarted'] == [f"app-{i}"]
+    compose_cwds = {command['cwd'] for command in fake_docker.commands() if command['argv'][0] == "docker-compose"}
+    assert compose_cwds == set(paths)
+
+
+def test_deduplicated_pulls_follow_overrides_and_leave_built_services_to_the_stack(fake_docker, make_stack):
+    fake_docker.set_images({"web:1": "sha256:old", "worker:1": "sha256:old"},
+                           {"web:1": "sha256:old", "web:2": "sha256:web", "worker:1": "sha256:worker"})
+    plain = make_stack("plain", {'web': {'image': "web:2"}})
+    overridden = make_stack("overridden", {'web': {'image': "web:1"}, 'worker': {'image': "worker:1", 'build': "."}},
+                            override={'web': {'image': "web:2"}})
+
+    assert docker_manager.stack_images(overridden) == ["web:2"]
+    batch = docker_manager.update_docker_containers([plain, overridden], dedupe_pulls=True, mode="skip-unchanged",
+                                                    on_output=lambda line: None)
+
+    assert [result['success'] for result in batch['results']] == [True, True]
+    assert batch['pulls']['unique'] == 1 and batch['pulls']['saved'] == 1
+    assert ["docker", "pull", "web:2"] in fake_docker.argv()
+    assert ["docker-compose", "pull", "worker"] in fake_docker.argv(overridden)
+    assert ["docker-compose", "pull"] not in fake_docker.argv(plain)
+    report = batch['results'][1]['report']
+    assert report['restarted'] == ["web", "worker"]
+    assert report['images']['worker'] == {'image': "worker:1", 'before': "sha256:old", 'after': "sha256:worker"}
+
+
+def test_skip_unchanged_only_recreates_services_whose_image_changed(fake_docker, make_stack):
+    fake_docker.set_images({"web:1": "sha256:web", "db:1": "sha256:db"},
+                           {"web:1": "sha256:web-new", "db:1": "sha256:db"})
+    path = make_stack("app", {'web': {'image': "web:1"}, 'db': {'image': "db:1"}, 'tool': {'build': "."}})
+
+    success, error, report = docker_manager.update_docker_stack(path, mode="skip-unchanged",
+                                                                on_output=lambda line: None)
+
+    assert (success, error) == (True, None)
+    assert ["docker-compose", "down"] not in fake_docker.argv(path)
+    assert fake_docker.argv(path)[-1] == ["docker-compose", "up", "-d", "web"]
+    assert report['restarted'] == ["web"]
+    assert report['skipped'] == ["db", "tool"]
+    assert report['images']['web'] == {'image': "web:1", 'before': "sha256:web", 'after': "sha256:web-new"}
+    assert report['downtime']['db'] == 0.0
+
+
+def test_skip_unchanged_leaves_an_unchanged_stack_running(fake_docker, make_stack):
+    fake_docker.set_images({"web:1": "sha256:web"}, {"web:1": "sha256:web"})
+    path = make_stack("app", {'web': {'image': "web:1"}})
+
+    success, _, report = docker_manager.update_docker_stack(path, mode="skip-unchanged", on_output=lambda line: None)
+
+    assert success
+    assert fake_docker.argv(path) == [["docker-compose", "config"], ["docker-compose", "pull"]]
+    assert report['restarted'] == [] and 'up' not in report['phases']
+
+
+def write_run_command(tmp_path, command: str) -> str:
+    path = tmp_path / "run-stack"
+    path.mkdir()
+    (path / "docker-run-command.txt").write_text(command)
+    return str(path)
+
+
+def test_api_backend_replaces_a_container_whose_image_changed(fake_engine, tmp_path):
+    path = write_run_command(tmp_path, "docker run -d --name web -p 8080:80 -e MODE=prod web:1")
+    spec_hash = docker_manager._run_spec("docker run -d --name web -p 8080:80 -e MODE=prod web:1")[1]
+    fake_engine.local = {"web:1": "sha256:old"}
+    fake_engine.registry = {"web:1": "sha256:new"}
+    fake_engine.add_container("c0", "web", "sha256:old", {docker_manager.STACK_LABEL: path,
+                                                         docker_manager.SPEC_HASH_LABEL: spec_hash})
+    output = []
+
+    success, error, report = docker_manager.update_docker_stack(path, mode="skip-unchanged", backend="api",
+                                                                on_output=output.append)
+
+    assert (success, error) == (True, None)
+    assert report['images'] == {'web': {'image': "web:1", 'before': "sha256:old", 'after': "sha256:new"}}
+    assert report['restarted'] == ["web"]
+    assert list(fake_engine.containers) == ["c1"]
+    container = fake_engine.containers["c1"]
+    assert container['State']['Running'] and container['Image'] == "sha256:new"
+    assert container['Body']['Env'] == ["MODE=prod"]
+    assert container['Body']['HostConfig']['PortBindings'] == {'80/tcp': [{'HostIp': "", 'HostPort': "8080"}]}
+    assert container['Config']['Labels'][docker_manager.SPEC_HASH_LABEL] == spec_hash
+    assert "latest: Pulling from web:1" in output and not any("Downloading" in line for line in output)
+    # Every request went over one kept-alive connection
+    assert fake_engine.connections == 1
+    assert ("POST", "/containers/c0/stop") in fake_engine.requests
+
+
+@pytest.mark.parametrize("mode", docker_manager.UPDATE_MODES)
+def test_api_backend_skips_an_unchanged_container(fake_engine, tmp_path, mode):
+    command = "docker run -d --name web web:1"
+    path = write_run_command(tmp_path, command)
+    fake_engine.local = fake_engine.registry = {"web:1": "sha256:same"}
+    fake_engine.add_container("c0", "web", "sha256:same", {docker_manager.STACK_LABEL: path,
+                                                          docker_manager.SPEC_HASH_LABEL:
+                                                              docker_manager._run_spec(command)[1]})
+
+    success, _, report = docker_manager.update_docker_stack(path, mode=mode, backend="api",
+                                                            on_output=lambda line: None)
+
+    assert success
+    assert report['skipped'] == ["web"] and list(fake_engine.containers) == ["c0"]
+    assert all(method == "GET" for method, request in fake_engine.requests if request.startswith("/containers/"))
+
+
+def test_api_backend_reports_a_failed_pull(fake_engine, tmp_path):
+    path = write_run_command(tmp_path, "docker run -d --name web web:2")
+
+    success, error, report = docker_manager.update_docker_stack(path, backend="api", on_output=lambda line: None)
+
+    assert not success
+    assert error == "Docker engine request failed: Pull of web:2 failed: manifest for web:2 not found"
+    assert docker_manager._docker_backend("api").image_id("web:2") is None
+
+
+def test_a_hanging_compose_config_is_killed_at_the_timeout(fake_docker, make_stack, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_HANG", "config")
+    path = make_stack("app", {'web': {'image': "web:1"}})
+    started = time.monotonic()
+
+    success, error, report = docker_manager.update_docker_stack(path, mode="skip-unchanged", timeouts={'pull': 1},
+                                                                on_output=lambda line: None)
+
+    assert not success
+    assert error == "Timed out after 1s in phase 'pull'"
+    assert report['timed_out_phase'] == "pull"
+    assert time.monotonic() - started < 5
+
+
+def test_a_hanging_container_lookup_is_cancelled(fake_docker, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_HANG", "ps")
+    fake_docker.set_images({}, {"web:1": "sha256:web"})
+    path = write_run_command(tmp_path, "docker run -d --name web web:1")
+    cancel_event = threading.Event()
+    threading.Timer(1, cancel_event.set).start()
+    started = time.monotonic()
+
+    success, error, report = docker_manager.update_docker_stack(path, cancel_event=cancel_event,
+                                                                on_output=lambda line: None)
+
+    assert not success
+    assert error == "Update cancelled during phase 'pull'"
+    assert report['cancelled']
+    assert time.monotonic() - started < 5
+
+
+def test_batch_planning_gives_up_on_a_hanging_compose_config(fake_docker, make_stack, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_HANG", "config")
+    fake_docker.set_images({}, {"web:1": "sha256:web"})
+    overridden = make_stack("overridden", {'web': {'image': "web:1"}}, override={'web': {'image': "web:2"}})
+    named = make_stack("named", {'web': {'image': "web:1"}})
+    with open(os.path.join(named, "docker-compose.yml"), 'w') as f:
+        f.write("services:\n  web:\n    image: web:1\nnetworks:\n  backend:\n    name: ${NETWORK}\n")
+    started = time.monotonic()
+
+    batch = docker_manager.update_docker_containers([overridden, named], dedupe_pulls=True, ordered=True,
+                                                    timeouts={'down': 1}, on_output=lambda line: None)
+
+    assert time.monotonic() - started < 10
+    assert batch['waves'] == [[overridden, named]]
+    assert [result['error'] for result in batch['results']] == ["Timed out after 1s in phase 'down'"] * 2
+
+
+@pytest.mark.parametrize("command", [
+    "docker run -d -p8080:80 -eMODE=prod -v/srv/web:/data --name web web:1 serve --port 80",
+    "docker run -d -p 8080:80 -e MODE=prod -v /srv/web:/data --name web web:1 serve --port 80",
+    "docker run --detach --publish=8080:80 --env=MODE=prod --volume=/srv/web:/data --name=web web:1 serve --port 80",
+    "docker run -dp 8080:80 -e=MODE=prod -v '/srv/web:/data' --name 'web' web:1 serve --port 80",
+])
+def test_run_command_option_forms_give_the_same_spec(command):
+    spec, spec_hash = docker_manager._run_spec(command)
+
+    assert spec['image'] == "web:1" and spec['command'] == ["serve", "--port", "80"]
+    assert (spec['ports'], spec['env'], spec['volumes'], spec['name']) == (
+        ["8080:80"], ["MODE=prod"], ["/srv/web:/data"], "web")
+    assert spec['detach'] and not spec['unsupported']
+    assert spec_hash == docker_manager._run_spec("docker run -d -p 8080:80 -e MODE=prod -v /srv/web:/data "
+                                                 "--name web web:1 serve --port 80")[1]
+
+
+def test_run_command_quoted_values_stay_whole():
+    spec = docker_manager._parse_run_command(
+        """docker run -e "GREETING=hello world" --label 'owner=ops team' -m512m web:1 sh -c "echo hi" """)
+
+    assert spec['env'] == ["GREETING=hello world"]
+    assert spec['labels'] == ["owner=ops team"]
+    assert spec['unsupported'] == [("-m", "512m")]
+    assert spec['image'] == "web:1" and spec['command'] == ["sh", "-c", "echo hi"]
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import scheduler
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_only_create_app_starts_the_background_threads(tmp_path):
+    env = dict(os.environ, DOCKER_UPDATE_HISTORY_DB=str(tmp_path / "history.db"),
+               DOCKER_UPDATE_ROOTS=str(tmp_path), DOCKER_UPDATE_SCHEDULE_INTERVAL="3600")
+    threads = "print(sorted(thread.name for thread in threading.enumerate()))"
+    script = f"import threading, server; {threads}; assert server.create_app() is server.app; {threads}"
+
+    result = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(TESTS_DIR), env=env,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines() == ["['MainThread']", "['MainThread', 'stack-index', 'update-scheduler']"]
+
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_a_rollout_is_not_started_while_one_is_in_progress(server, monkeypatch, background):
+    checking = threading.Event()
+    release = threading.Event()
+
+    def check_stack(path):
+        checking.set()
+        release.wait(10)
+        return {}, {}
+    update_scheduler = scheduler.UpdateScheduler(lambda *args, **kwargs: None, check_stack, interval=3600, jitter=0)
+    update_scheduler.register("/srv/stacks/app")
+    monkeypatch.setattr(server, "update_scheduler", update_scheduler)
+    if background:
+        update_scheduler.start()
+    client = server.app.test_client()
+
+    try:
+        assert client.post("/schedule/run").status_code == 202
+        assert checking.wait(10)
+        assert [client.post("/schedule/run").status_code for _ in range(3)] == [409] * 3
+    finally:
+        release.set()
+        update_scheduler.stop()
+
+    deadline = time.monotonic() + 10
+    while update_scheduler.status()['last'] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [result['state'] for result in update_scheduler.status()['last']['results']] == ["unchanged"]
@@ -0,0 +1,40 @@
+import stack_index
+from stack_index import StackIndex
+
+
+def make_stacks(directory, *names):
+    for name in names:
+        (directory / name).mkdir(parents=True)
+        (directory / name / "docker-compose.yml").write_text(f"services:\n  app:\n    image: {name}:1\n")
+
+
+def test_directories_outside_the_roots_are_listed_fresh_but_not_refreshed(tmp_path):
+    make_stacks(tmp_path / "roots", "a")
+    make_stacks(tmp_path / "elsewhere", "b")
+    reads = []
+    index = StackIndex([str(tmp_path / "roots")], images_func=lambda path: reads.append(path) or [])
+    index.refresh()
+
+    assert [entry['name'] for entry in index.list_directories(str(tmp_path / "elsewhere"))] == ["b"]
+    make_stacks(tmp_path / "elsewhere", "c")
+    assert [entry['name'] for entry in index.list_directories(str(tmp_path / "elsewhere"))] == ["b", "c"]
+
+    reads.clear()
+    (tmp_path / "elsewhere" / "b" / "docker-compose.yml").write_text("services: {}\n")
+    (tmp_path / "roots" / "a" / "docker-compose.yml").write_text("services: {}\n")
+    index.refresh()
+    assert reads == [str(tmp_path / "roots" / "a")]
+
+
+def test_only_the_most_recently_listed_directories_outside_the_roots_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(stack_index, "MAX_BROWSED_PATHS", 2)
+    for name in ("one", "two", "three"):
+        make_stacks(tmp_path / name, f"{name}-stack")
+    make_stacks(tmp_path / "root", "kept")
+    index = StackIndex([str(tmp_path / "root")])
+    index.refresh()
+
+    for name in ("one", "two", "three"):
+        index.list_directories(str(tmp_path / name))
+
+    assert [entry['name'] for entry in index.stacks()] == ["kept", "three-stack", "two-stack"]
@@ -0,0 +1,86 @@
+import gzip
+import os
+
+import pytest
+
+import static_assets
+from static_assets import StaticAsset
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTENT = b"<!DOCTYPE html><html><body>" + b"<p>Docker Update</p>" * 200 + b"</body></html>"
+
+
+def decode(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.decompress(body)
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    return body
+
+
+@pytest.fixture(params=["brotli", "no brotli"])
+def client(request, server, monkeypatch, tmp_path):
+    """A test client of the server whose web interface is built with or without the brotli module."""
+    if request.param == "brotli":
+        if brotli is None:
+            pytest.skip("brotli is not installed")
+        monkeypatch.setattr(static_assets, "brotli", brotli)
+    else:
+        monkeypatch.setattr(static_assets, "brotli", None)
+    (tmp_path / "index.html").write_bytes(CONTENT)
+    monkeypatch.setattr(server, "ui", StaticAsset(str(tmp_path / "index.html")))
+    client = server.app.test_client()
+    client.brotli = request.param == "brotli"
+    return client
+
+
+@pytest.mark.parametrize("accept_encoding, preferred", [
+    ("br, gzip", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("gzip", "gzip"),
+    ("identity", None),
+    ("br;q=0, gzip;q=0", None),
+])
+def test_every_variant_is_revalidated_by_its_own_etag(client, accept_encoding, preferred):
+    encoding = "gzip" if preferred == "br" and not client.brotli else preferred
+    headers = {'Accept-Encoding': accept_encoding}
+
+    response = client.get("/", headers=headers)
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == encoding
+    assert response.headers['Vary'] == "Accept-Encoding"
+    assert decode(encoding, response.data) == CONTENT
+    etag = response.headers['ETag']
+    assert etag.endswith(f'-{encoding}"') if encoding else "-" not in etag
+
+    revalidated = client.get("/", headers=dict(headers, **{'If-None-Match': etag}))
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert revalidated.headers['ETag'] == etag
+
+
+def test_an_etag_of_another_variant_gets_the_full_response(client):
+    plain_etag = client.get("/", headers={'Accept-Encoding': "identity"}).headers['ETag']
+
+    response = client.get("/", headers={'Accept-Encoding': "br, gzip", 'If-None-Match': plain_etag})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == ("br" if client.brotli else "gzip")
+
+
+def test_the_variants_are_rebuilt_when_the_file_changes(client, server, tmp_path):
+    before = client.get("/", headers={'Accept-Encoding': "br, gzip"}).headers['ETag']
+    path = tmp_path / "index.html"
+    path.write_bytes(CONTENT.replace(b"Docker Update", b"Docker Updates"))
+    stat = path.stat()
+    # Make the change visible even where the clock is coarser than the write
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    response = client.get("/", headers={'Accept-Encoding': "br, gzip", 'If-None-Match': before})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != before
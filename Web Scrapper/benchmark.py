@@ -0,0 +1,321 @@
+"""
+Benchmark page extraction: WebDriver round-trips and time per page.
+
+Compares the old extraction, one find_elements call per field plus one text
+read per element, with collect_page_data(), which evaluates every XPath in a
+single in-browser script. By default a stub driver stands in for the browser
+and charges a fixed latency per WebDriver call; --driver chrome runs the same
+comparison in headless Chrome against a generated page.
+
+--crawl measures pages per second instead: a local HTTP server serves
+--pages generated pages linked by a next link, and they are crawled over
+plain HTTP the way scrape_pages() does with --http, and, with --driver
+chrome, in the browser.
+
+    python benchmark.py --items 50 --fields 5 --latency 0.002 -o results.json
+    python benchmark.py --crawl --pages 200 --driver chrome
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from selenium.webdriver.common.by import By
+
+import http_scraper
+import web_scraper_with_pagination as scraper
+from page_writer import PageWriter
+
+# Drivers the benchmark can run against
+DRIVERS = ("stub", "chrome")
+
+# XPath of the next link on the generated pages
+NEXT_XPATH = "//a[@class='next']"
+
+def collect_page_data_per_element(driver, selected_elements):
+    """The extraction collect_page_data() used before, one WebDriver call per element read"""
+    data = []
+    all_elements = {}
+    max_items = 0
+
+    for label, xpath in selected_elements:
+        try:
+            elements = driver.find_elements(By.XPATH, xpath)
+            all_elements[label] = [e.text.strip() for e in elements if e.text.strip()]
+            max_items = max(max_items, len(all_elements[label]))
+        except Exception as e:
+            print(f"Error finding elements for {label}: {str(e)}")
+            all_elements[label] = []
+
+    for i in range(max_items):
+        item_data = {label: texts[i] if i < len(texts) else "" for label, texts in all_elements.items()}
+        if any(item_data.values()):
+            data.append(item_data)
+
+    return data
+
+def page_fields(fields):
+    """Return the (label, xpath) pairs of the generated page"""
+    return [(f"field_{field}", f"//div[@class='item']/span[@class='f{field}']") for field in range(fields)]
+
+def page_texts(items, fields):
+    """Return the texts of the generated page per XPath"""
+    return {xpath: [f"item {item} field {field}" for item in range(items)]
+            for field, (_, xpath) in enumerate(page_fields(fields))}
+
+def page_html(items, fields, next_href=None):
+    """Return the generated page, with a next link if next_href is given"""
+    rows = "".join(
+        "<div class='item'>" + "".join(f"<span class='f{field}'>item {item} field {field}</span> "
+                                       for field in range(fields)) + "</div>\n"
+        for item in range(items)
+    )
+    link = f"<a class='next' href='{next_href}'>Next</a>\n" if next_href else ""
+    return f"<!DOCTYPE html><html><body>\n{rows}{link}</body></html>"
+
+def write_page(path, items, fields):
+    """Write the generated page as an HTML file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page_html(items, fields))
+
+def serve_pages(pages, items, fields):
+    """Serve /page/1 to /page/<pages> from a local HTTP server; returns the server and the first page's URL"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; without this each page waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            try:
+                page = int(self.path.rsplit("/", 1)[-1])
+            except ValueError:
+                page = 0
+            if not self.path.startswith("/page/") or not 1 <= page <= pages:
+                self.send_error(404)
+                return
+            body = page_html(items, fields, f"/page/{page + 1}" if page < pages else None).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/page/1"
+
+class StubElement:
+    """WebElement stand-in whose text costs a round-trip, like the real one"""
+
+    def __init__(self, driver, text):
+        self._driver = driver
+        self._text = text
+
+    @property
+    def text(self):
+        self._driver.round_trip()
+        return self._text
+
+class StubDriver:
+    """WebDriver stand-in that charges latency seconds per call and counts the calls"""
+
+    def __init__(self, texts, latency):
+        self._texts = texts
+        self._latency = latency
+        self.round_trips = 0
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self._latency:
+            time.sleep(self._latency)
+
+    def find_elements(self, by, xpath):
+        self.round_trip()
+        return [StubElement(self, text) for text in self._texts.get(xpath, [])]
+
+    def execute_script(self, script, *args):
+        self.round_trip()
+        if script != scraper.EXTRACT_SCRIPT:
+            return None
+        return {'columns': {label: [text.strip() for text in self._texts.get(xpath, []) if text.strip()]
+                            for label, xpath in args[0]},
+                'errors': {}}
+
+def count_round_trips(driver):
+    """Make a Selenium driver count every command it sends to the browser"""
+    driver.round_trips = 0
+    execute = driver.execute
+
+    def counting_execute(*args, **kwargs):
+        driver.round_trips += 1
+        return execute(*args, **kwargs)
+
+    # WebElements send their commands through the driver, so they are counted too
+    driver.execute = counting_execute
+    return driver
+
+def measure(driver, extract, fields, repeat):
+    """Extract the page repeat times; returns the round-trips per page and the timings"""
+    timings = []
+    rows = None
+    driver.round_trips = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = extract(driver, fields)
+        timings.append(time.perf_counter() - started)
+    return {
+        'rows': len(rows),
+        'round_trips_per_page': driver.round_trips // repeat,
+        'ms_per_page': {
+            'mean': round(statistics.fmean(timings) * 1000, 3),
+            'p50': round(statistics.median(timings) * 1000, 3),
+            'max': round(max(timings) * 1000, 3)
+        }
+    }
+
+def crawl_http(start_url, fields, pages):
+    """Crawl the served pages without a browser, like scrape_pages() does once --http is verified"""
+    fetcher = http_scraper.PageFetcher()
+    rows = []
+    crawled = 0
+    url = start_url
+    while url and crawled < pages:
+        document = fetcher.fetch(url)
+        rows.extend(scraper.combine_columns(http_scraper.extract_columns(document, fields)[0]))
+        crawled += 1
+        url = http_scraper.next_page_url(document, NEXT_XPATH)
+    return rows, crawled
+
+def crawl_browser(driver, start_url, fields, pages):
+    """Crawl the served pages in the browser with scrape_pages()"""
+    driver.get(start_url)
+    csv_filename = os.path.join(tempfile.mkdtemp(prefix="scraper-bench-"), "crawl.csv")
+    writer = PageWriter(csv_filename, [label for label, _ in fields])
+    with contextlib.redirect_stdout(io.StringIO()):
+        crawled, _ = scraper.scrape_pages(driver, fields, NEXT_XPATH, pages, writer)
+    # Every page is flushed as it is written
+    with open(csv_filename, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    writer.close()
+    return rows, crawled
+
+def measure_crawl(crawl, *args):
+    """Run a crawl; returns its row count and pages per second, and the rows"""
+    started = time.perf_counter()
+    rows, crawled = crawl(*args)
+    elapsed = time.perf_counter() - started
+    return {
+        'pages': crawled,
+        'rows': len(rows),
+        'seconds': round(elapsed, 3),
+        'pages_per_second': round(crawled / max(elapsed, 0.001), 1)
+    }, rows
+
+def main_crawl(args):
+    """Measure pages per second over plain HTTP and, with --driver chrome, in the browser"""
+    fields = page_fields(args.fields)
+    server, start_url = serve_pages(args.pages, args.items, args.fields)
+    driver = None
+    try:
+        http, http_rows = measure_crawl(crawl_http, start_url, fields, args.pages)
+        browser = None
+        if args.driver == "chrome":
+            driver = scraper.create_driver(headless=True)
+            browser, browser_rows = measure_crawl(crawl_browser, driver, start_url, fields, args.pages)
+            if browser_rows != http_rows:
+                print("warning: the HTTP crawl found different rows than the browser", file=sys.stderr)
+    finally:
+        if driver is not None:
+            driver.quit()
+        server.shutdown()
+        server.server_close()
+
+    results = {
+        'mode': "crawl",
+        'driver': args.driver,
+        'items': args.items,
+        'fields': args.fields,
+        'http': http,
+        'browser': browser,
+        'speedup': round(http['pages_per_second'] / max(browser['pages_per_second'], 0.001), 1) if browser else None
+    }
+    print(f"http:    {http['pages_per_second']} pages per second", file=sys.stderr)
+    if browser:
+        print(f"browser: {browser['pages_per_second']} pages per second", file=sys.stderr)
+    else:
+        print("browser: skipped, run with --driver chrome to compare", file=sys.stderr)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the page extraction of the web scraper")
+    parser.add_argument("--items", type=int, default=50, help="Items on the page (default: 50)")
+    parser.add_argument("--fields", type=int, default=5, help="Selected fields per item (default: 5)")
+    parser.add_argument("--driver", choices=DRIVERS, default="stub",
+                        help="'chrome' runs headless Chrome against a generated page (default: stub)")
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="Seconds the stub driver charges per WebDriver call (default: 0.002)")
+    parser.add_argument("--repeat", type=int, default=5, help="Extractions timed per method (default: 5)")
+    parser.add_argument("--crawl", action="store_true",
+                        help="Measure pages per second crawling a local HTTP server instead")
+    parser.add_argument("--pages", type=int, default=100, help="Pages served for --crawl (default: 100)")
+    parser.add_argument("-o", "--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.crawl:
+        write_results(main_crawl(args), args.output)
+        return
+
+    fields = page_fields(args.fields)
+    if args.driver == "stub":
+        driver = StubDriver(page_texts(args.items, args.fields), args.latency)
+    else:
+        page = os.path.join(tempfile.mkdtemp(prefix="scraper-bench-"), "page.html")
+        write_page(page, args.items, args.fields)
+        driver = count_round_trips(scraper.create_driver(headless=True))
+        driver.get(f"file://{page}")
+
+    try:
+        before = measure(driver, collect_page_data_per_element, fields, args.repeat)
+        after = measure(driver, scraper.collect_page_data, fields, args.repeat)
+    finally:
+        if args.driver == "chrome":
+            driver.quit()
+
+    results = {
+        'driver': args.driver,
+        'items': args.items,
+        'fields': args.fields,
+        'latency': args.latency if args.driver == "stub" else None,
+        'before': before,
+        'after': after,
+        'speedup': round(before['ms_per_page']['mean'] / max(after['ms_per_page']['mean'], 0.001), 1)
+    }
+    print(f"before: {before['round_trips_per_page']} round-trips, {before['ms_per_page']['mean']} ms per page",
+          file=sys.stderr)
+    print(f"after:  {after['round_trips_per_page']} round-trips, {after['ms_per_page']['mean']} ms per page",
+          file=sys.stderr)
+    write_results(results, args.output)
+
+def write_results(results, path=None):
+    """Print the JSON results, or write them to path"""
+    output = json.dumps(results, indent=2)
+    if path:
+        with open(path, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Browserless scraping of server-rendered pages.
+
+Pages are fetched with a pooled keep-alive HTTP client and the recorded
+XPaths are evaluated with lxml, so no browser round-trips are involved.
+"""
+from urllib.parse import urljoin
+
+import urllib3
+
+try:
+    from lxml import html
+except ImportError:
+    # Optional; without it the scraper always uses the browser
+    html = None
+
+# Seconds to connect to a server and to wait for its response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# Keep-alive connections kept open per host
+POOL_SIZE = 8
+
+# Retries of a failed request, with a short backoff
+RETRIES = 2
+
+def available():
+    """Return True if the HTML parser needed for the fast path is installed"""
+    return html is not None
+
+def normalize_text(text):
+    """Collapse whitespace the way rendered text does, so browser and HTTP values compare equal"""
+    return " ".join(text.split())
+
+class PageFetcher:
+    """
+    Fetch pages over keep-alive connections, looking like the browser that recorded them.
+
+    The fetcher is thread-safe and can be shared by several crawlers.
+
+    Args:
+        user_agent (str): User-Agent header to send, e.g. the browser's
+        cookies (list): Cookies of the browser session, as returned by driver.get_cookies()
+        pool_size (int): Keep-alive connections kept open per host
+    """
+
+    def __init__(self, user_agent=None, cookies=(), pool_size=POOL_SIZE):
+        headers = {'Accept': 'text/html,application/xhtml+xml'}
+        if user_agent:
+            headers['User-Agent'] = user_agent
+        if cookies:
+            headers['Cookie'] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+        self._pool = urllib3.PoolManager(
+            maxsize=pool_size,
+            block=True,
+            headers=headers,
+            timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT),
+            retries=urllib3.Retry(total=RETRIES, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+        )
+
+    def fetch(self, url):
+        """Fetch and parse a page; raises an exception for any response other than 200 OK"""
+        response = self._pool.request('GET', url)
+        if response.status != 200:
+            raise urllib3.exceptions.HTTPError(f"{url} answered {response.status}")
+        # response.url may be only the path of the final URL after redirects;
+        # the parser finds the encoding from the document itself
+        return html.fromstring(response.data, base_url=urljoin(url, response.url or url))
+
+def extract_columns(document, selected_elements):
+    """
+    Evaluate the selected XPaths on a parsed page.
+
+    Returns the non-empty, whitespace-normalized texts per label and the
+    errors of XPaths that could not be evaluated.
+    """
+    columns = {}
+    errors = {}
+    for label, xpath in selected_elements:
+        try:
+            matches = document.xpath(xpath)
+        except Exception as e:
+            errors[label] = str(e)
+            columns[label] = []
+            continue
+        if not isinstance(matches, list):
+            matches = [matches]
+        texts = (normalize_text(match.text_content() if hasattr(match, 'text_content') else str(match))
+                 for match in matches)
+        columns[label] = [text for text in texts if text]
+    return columns, errors
+
+def next_page_url(document, next_page_xpath):
+    """Return the absolute URL the next page button links to, or None if it is not a plain link"""
+    try:
+        matches = document.xpath(next_page_xpath)
+    except Exception:
+        return None
+    for match in matches if isinstance(matches, list) else []:
+        # The recorded element may be an icon or label inside the link
+        for element in [match, *match.iterancestors()] if hasattr(match, 'iterancestors') else []:
+            href = element.get('href') if element.tag == 'a' else None
+            if href and not href.startswith(('#', 'javascript:')):
+                return urljoin(document.base_url, href)
+    return None
@@ -0,0 +1,119 @@
+"""
+Streaming CSV output with a checkpoint.
+
+The rows of every page are appended to the CSV file as soon as the page is
+scraped, and a small checkpoint file records the last page written, its URL
+and the size of the CSV file at that point. A job that is interrupted can
+pick up after that page instead of starting over.
+"""
+import csv
+import json
+import os
+from datetime import datetime
+
+# Version of the checkpoint format
+CHECKPOINT_FORMAT_VERSION = 1
+
+class PageWriter:
+    """
+    Append scraped pages to a CSV file whose header is the selected labels.
+
+    Pages must be written in order; a page at or before the last one written
+    is ignored, so a resumed job can scrape its last page again safely.
+
+    Args:
+        csv_filename (str): CSV file to create
+        labels (list): Labels of the selected fields, in column order
+        checkpoint_path (str): Checkpoint file to update after every page, or None for none
+        checkpoint (dict): Checkpoint to continue from instead of creating the file; see resume()
+    """
+
+    def __init__(self, csv_filename, labels, checkpoint_path=None, checkpoint=None):
+        self.csv_filename = csv_filename
+        self.labels = list(dict.fromkeys(labels))
+        self.checkpoint_path = checkpoint_path
+        self.page = 0
+        self.url = None
+        self.items = 0
+
+        if checkpoint:
+            # Drop anything written after the checkpoint, such as half of an interrupted page
+            with open(csv_filename, 'r+b') as f:
+                f.truncate(checkpoint['size'])
+            self.page, self.url, self.items = checkpoint['page'], checkpoint['url'], checkpoint['items']
+            self._file = open(csv_filename, 'a', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=self.labels, restval="")
+        else:
+            self._file = open(csv_filename, 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=self.labels, restval="")
+            self._writer.writeheader()
+            self._file.flush()
+            # A checkpoint at page 0 lets a job interrupted before its first page reuse the file
+            self._save_checkpoint()
+
+    @classmethod
+    def resume(cls, checkpoint_path, labels):
+        """
+        Reopen the CSV file of an interrupted job from its checkpoint.
+
+        Returns None if there is no checkpoint; raises ValueError if it does
+        not match the labels or its CSV file is gone or shorter than recorded.
+        """
+        if not os.path.exists(checkpoint_path):
+            return None
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+
+        if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError(f"{checkpoint_path} is not a version {CHECKPOINT_FORMAT_VERSION} checkpoint")
+        if checkpoint.get('labels') != list(dict.fromkeys(labels)):
+            raise ValueError(f"{checkpoint_path} was written for other fields")
+        csv_filename = checkpoint.get('csv')
+        if not csv_filename or not os.path.exists(csv_filename) or os.path.getsize(csv_filename) < checkpoint['size']:
+            raise ValueError(f"{checkpoint_path}: the CSV file {csv_filename} is missing or incomplete")
+        return cls(csv_filename, labels, checkpoint_path, checkpoint=checkpoint)
+
+    def write_page(self, page, rows, url=None):
+        """Append the rows of page number page, loaded from url, and update the checkpoint"""
+        if page <= self.page:
+            return
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.page = page
+        self.url = url
+        self.items += len(rows)
+        self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        if self.checkpoint_path:
+            checkpoint = {
+                'version': CHECKPOINT_FORMAT_VERSION,
+                'csv': self.csv_filename,
+                'labels': self.labels,
+                'page': self.page,
+                'url': self.url,
+                'items': self.items,
+                'size': os.fstat(self._file.fileno()).st_size,
+                'updated': datetime.now().isoformat(timespec='seconds')
+            }
+            # Replace the checkpoint in one step so a crash never leaves half of it
+            temporary = f"{self.checkpoint_path}.tmp"
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f, indent=2)
+            os.replace(temporary, self.checkpoint_path)
+
+    def close(self, finished=True):
+        """
+        Close the CSV file.
+
+        A finished job removes its checkpoint, and its CSV file too if no
+        rows were written. An unfinished one keeps both so it can be resumed.
+        """
+        self._file.close()
+        if not finished:
+            return
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        if not self.items:
+            os.remove(self.csv_filename)
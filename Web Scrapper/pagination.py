@@ -0,0 +1,150 @@
+"""
+Pagination by URL.
+
+When the next page link carries the page number in its URL (?page=2,
+/page/2, ?start=20, ...) the URL of every page can be built up front, so
+pages can be scraped in parallel instead of clicking through them one at a
+time.
+"""
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+# A query parameter (?page=) or path segment (/page/) right before the page number
+_QUERY_KEY = re.compile(r"([?&])[^?&=#/]+=$")
+_PATH_SEGMENT = re.compile(r"/[^/?#]+/$")
+
+class PagePattern:
+    """
+    URLs of numbered pages: the value in the URL of page n is first + (n - 1) * step.
+
+    Args:
+        prefix (str): URL before the page number
+        suffix (str): URL after the page number
+        first (int): Value in the URL of the first page
+        step (int): Difference of the value from one page to the next
+    """
+
+    def __init__(self, prefix, suffix, first, step):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.first = first
+        self.step = step
+
+    def url(self, page):
+        """Return the URL of page number page, counting the first page as 1"""
+        return f"{self.prefix}{self.first + (page - 1) * self.step}{self.suffix}"
+
+    def __repr__(self):
+        return f"{self.prefix}{{{self.first} + {self.step}n}}{self.suffix}"
+
+def _strip(url):
+    """Drop the fragment and a trailing slash or question mark, which do not change the page"""
+    return url.split("#", 1)[0].rstrip("?/")
+
+def _without_number(prefix, suffix):
+    """URLs of the page without the page number, as a first page without ?page=1 or /page/1 has"""
+    candidates = []
+    query = _QUERY_KEY.search(prefix)
+    if query:
+        base = prefix[:query.start()]
+        if suffix.startswith("&"):
+            candidates.append(base + query.group(1) + suffix[1:])
+        else:
+            candidates.append(base + suffix)
+    elif prefix.endswith("/") and suffix[:1] in ("", "/", "?", "#"):
+        candidates.append(prefix[:-1] + suffix)
+        segment = _PATH_SEGMENT.search(prefix)
+        if segment:
+            candidates.append(prefix[:segment.start()] + suffix)
+    return candidates
+
+def detect_page_pattern(first_url, next_url):
+    """
+    Find the page number that changes between the URL of a page and its next page link.
+
+    Returns a PagePattern whose page 1 is first_url and page 2 is next_url,
+    or None if the link does not number the pages.
+    """
+    if not first_url or not next_url:
+        return None
+    first = _strip(first_url)
+    parts = urlsplit(next_url)
+    # Numbers in the host or port are not page numbers
+    start = len(f"{parts.scheme}://{parts.netloc}") if parts.netloc else 0
+
+    for match in re.finditer(r"\d+", next_url[start:]):
+        prefix = next_url[:start + match.start()]
+        suffix = next_url[start + match.end():]
+        value = int(match.group())
+
+        # The first page has a smaller number in the same place
+        same_place = re.fullmatch(re.escape(prefix) + r"(\d+)" + re.escape(_strip(suffix)), first)
+        if same_place and int(same_place.group(1)) < value:
+            current = int(same_place.group(1))
+            return PagePattern(prefix, suffix, current, value - current)
+
+        # The first page leaves the number out and the link adds ?page=2 or /page/2
+        if value == 2 and any(_strip(url) == first for url in _without_number(prefix, suffix)):
+            return PagePattern(prefix, suffix, 1, 1)
+    return None
+
+def crawl_pages(fetch_page, on_page, first_page, last_page, workers):
+    """
+    Fetch pages first_page to last_page with workers threads, handing them on in page order.
+
+    fetch_page(page) returns the rows of the page and whether it has a next
+    page link; on_page(page, rows) is called with each page as soon as every
+    page before it has been handed on, so only pages that finished early are
+    held in memory. The crawl ends before the first page that has no rows,
+    cannot be fetched or repeats the rows of the page before it, as sites
+    that serve their last page for every number past it do, and after the
+    first page without a next page link; pages fetched beyond the end are
+    discarded. At most workers pages are fetched at a time, so little is
+    fetched past the end.
+
+    Returns the number of pages handed on and the error of the page that
+    ended the crawl, if any.
+    """
+    rows = {}
+    previous_rows = None
+    errors = {}
+    last_pages = set()
+    end = last_page + 1
+    next_page = first_page
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {}
+        page = first_page
+        while pending or page < end:
+            while page < end and len(pending) < workers:
+                pending[pool.submit(fetch_page, page)] = page
+                page += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number = pending.pop(future)
+                try:
+                    page_rows, has_next = future.result()
+                except Exception as e:
+                    errors[number] = e
+                    end = min(end, number)
+                    continue
+                if not page_rows:
+                    end = min(end, number)
+                    continue
+                rows[number] = page_rows
+                if not has_next:
+                    last_pages.add(number)
+                    end = min(end, number + 1)
+            while next_page < end and next_page in rows:
+                page_rows = rows.pop(next_page)
+                if page_rows == previous_rows:
+                    end = next_page
+                    break
+                on_page(next_page, page_rows)
+                previous_rows = page_rows
+                next_page += 1
+
+    # A page past the last one failing is expected, not an error
+    error = None if end - 1 in last_pages else errors.get(end)
+    return next_page - first_page, error
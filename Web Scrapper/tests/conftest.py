@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+import numbered_site  # noqa: E402
+
+@pytest.fixture
+def site():
+    """Serve six numbered pages of three items with two fields; yields the URL of the first page"""
+    server, url = numbered_site.serve_pages(6, 3, 2)
+    yield url
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,50 @@
+"""A local HTTP server with numbered pages of items linked by a next link, for the tests"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# XPath of the next link
+NEXT_XPATH = "//a[@class='next']"
+
+def page_fields(fields):
+    """Return the (label, xpath) pairs of the served pages"""
+    return [(f"field_{field}", f"//div[@class='item']/span[@class='f{field}']") for field in range(fields)]
+
+def page_html(items, fields, next_href=None):
+    """Return a page of items, with a next link if next_href is given"""
+    rows = "".join(
+        "<div class='item'>" + "".join(f"<span class='f{field}'>item {item} field {field}</span> "
+                                       for field in range(fields)) + "</div>\n"
+        for item in range(items)
+    )
+    link = f"<a class='next' href='{next_href}'>Next</a>\n" if next_href else ""
+    return f"<!DOCTYPE html><html><body>\n{rows}{link}</body></html>"
+
+def serve_pages(pages, items, fields):
+    """Serve /page/1 to /page/<pages>; returns the server and the first page's URL"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; without this each page waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            try:
+                page = int(self.path.rsplit("/", 1)[-1])
+            except ValueError:
+                page = 0
+            if not self.path.startswith("/page/") or not 1 <= page <= pages:
+                self.send_error(404)
+                return
+            body = page_html(items, fields, f"/page/{page + 1}" if page < pages else None).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/page/1"
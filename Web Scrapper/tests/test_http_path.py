@@ -0,0 +1,127 @@
+import csv
+import urllib.request
+
+from lxml import html
+from selenium.common.exceptions import NoSuchElementException
+
+import http_scraper
+import web_scraper_with_pagination as scraper
+from numbered_site import NEXT_XPATH, page_fields
+from page_writer import PageWriter
+
+FIELDS = page_fields(2)
+
+class FakeBrowser:
+    """WebDriver stand-in that loads pages over HTTP and answers the scraper's scripts with lxml"""
+
+    def __init__(self, alter_text=False):
+        self.alter_text = alter_text
+        self.loaded = []
+        self.current_url = None
+        self.document = None
+        self._opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def get(self, url):
+        self.loaded.append(url)
+        self.current_url = url
+        self.document = html.fromstring(self._opener.open(url).read(), base_url=url)
+
+    def get_cookies(self):
+        return [{'name': 'session', 'value': 'abc'}]
+
+    def find_element(self, by, xpath):
+        url = http_scraper.next_page_url(self.document, xpath)
+        if url is None:
+            raise NoSuchElementException(xpath)
+        browser = self
+
+        class Link:
+            def is_displayed(self):
+                return True
+
+            def is_enabled(self):
+                return True
+
+            def click(self):
+                browser.get(url)
+        return Link()
+
+    def execute_script(self, script, *args):
+        if "navigator.userAgent" in script:
+            return "FakeBrowser/1.0"
+        if script == scraper.EXTRACT_SCRIPT:
+            columns, errors = http_scraper.extract_columns(self.document, args[0])
+            if self.alter_text:
+                # Text the page's scripts would change after loading
+                columns = {label: [f"{text} (rendered)" for text in texts] for label, texts in columns.items()}
+            return {'columns': columns, 'errors': errors}
+        if script == scraper.MARK_PAGE_SCRIPT:
+            return self.current_url
+        if script == scraper.PAGE_STATE_SCRIPT:
+            return {'url': self.current_url, 'new_document': True, 'stale': False, 'changed': False,
+                    'loaded': True, 'fields': True, 'quiet': scraper.QUIET_PERIOD}
+        if script == scraper.NEXT_LINK_SCRIPT:
+            return http_scraper.next_page_url(self.document, args[0])
+        return None
+
+def scrape(browser, tmp_path, max_pages=10):
+    """Run scrape_pages() over HTTP from the loaded page; returns the pages scraped and the CSV rows"""
+    writer = PageWriter(str(tmp_path / "rows.csv"), [label for label, _ in FIELDS])
+    pages, _ = scraper.scrape_pages(browser, FIELDS, NEXT_XPATH, max_pages, writer, use_http=True)
+    writer.close()
+    with open(tmp_path / "rows.csv", newline='', encoding='utf-8') as f:
+        return pages, list(csv.DictReader(f))
+
+def test_start_http_path_accepts_a_page_with_the_same_rows(site):
+    browser = FakeBrowser()
+    browser.get(site)
+
+    fetcher, document = scraper.start_http_path(browser, FIELDS, NEXT_XPATH,
+                                                scraper.collect_page_data(browser, FIELDS))
+
+    assert fetcher is not None
+    assert http_scraper.next_page_url(document, NEXT_XPATH).endswith("/page/2")
+
+def test_start_http_path_rejects_rows_that_differ_from_the_browser(site):
+    browser = FakeBrowser(alter_text=True)
+    browser.get(site)
+
+    assert scraper.start_http_path(browser, FIELDS, NEXT_XPATH,
+                                   scraper.collect_page_data(browser, FIELDS)) == (None, None)
+
+def test_pages_after_the_first_are_fetched_without_the_browser(site, tmp_path):
+    browser = FakeBrowser()
+    browser.get(site)
+
+    pages, rows = scrape(browser, tmp_path)
+
+    assert pages == 6
+    assert browser.loaded == [site]
+    assert len(rows) == 18
+    assert rows[-1] == {'field_0': "item 2 field 0", 'field_1': "item 2 field 1"}
+
+def test_differing_rows_keep_the_crawl_in_the_browser(site, tmp_path):
+    browser = FakeBrowser(alter_text=True)
+    browser.get(site)
+
+    pages, rows = scrape(browser, tmp_path)
+
+    assert pages == 6
+    assert browser.loaded == [site.replace("/page/1", f"/page/{page}") for page in range(1, 7)]
+    assert rows[0]['field_0'] == "item 0 field 0 (rendered)"
+
+def test_a_page_that_cannot_be_fetched_is_loaded_in_the_browser(site, tmp_path, monkeypatch):
+    fetch = http_scraper.PageFetcher.fetch
+
+    def fetch_failing_page_4(self, url):
+        if url.endswith("/page/4"):
+            raise OSError("connection reset")
+        return fetch(self, url)
+    monkeypatch.setattr(http_scraper.PageFetcher, "fetch", fetch_failing_page_4)
+    browser = FakeBrowser()
+    browser.get(site)
+
+    pages, rows = scrape(browser, tmp_path)
+
+    assert pages == 6 and len(rows) == 18
+    assert browser.loaded == [site] + [site.replace("/page/1", f"/page/{page}") for page in (4, 5, 6)]
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import web_scraper_with_pagination as scraper
+
+FIELDS = [("title", "//h2[@class='title']"), ("price", "//span[@class='price']")]
+
+def write_job(path, **job):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    return str(path)
+
+def test_a_saved_job_loads_as_it_was_saved(tmp_path):
+    path = str(tmp_path / "books.json")
+    scraper.save_job(path, "https://shop.example/books", 12, FIELDS, "//a[@rel='next']")
+
+    assert scraper.load_job(path) == {
+        'name': "books",
+        'url': "https://shop.example/books",
+        'max_pages': 12,
+        'selected_elements': FIELDS,
+        'next_page_xpath': "//a[@rel='next']"
+    }
+
+def test_a_job_without_a_next_page_button_scrapes_one_page(tmp_path):
+    path = str(tmp_path / "single.json")
+    scraper.save_job(path, "https://shop.example/books", None, FIELDS, None)
+
+    job = scraper.load_job(path)
+
+    assert (job['max_pages'], job['next_page_xpath']) == (1, None)
+
+@pytest.mark.parametrize("job, message", [
+    ({'url': "https://shop.example", 'fields': [{'label': "a", 'xpath': "//a"}]}, "version"),
+    ({'version': 99, 'url': "https://shop.example", 'fields': [{'label': "a", 'xpath': "//a"}]}, "version"),
+    ({'version': 1, 'fields': [{'label': "a", 'xpath': "//a"}]}, "no url"),
+    ({'version': 1, 'url': "https://shop.example"}, "at least one field"),
+    ({'version': 1, 'url': "https://shop.example", 'fields': []}, "at least one field"),
+    ({'version': 1, 'url': "https://shop.example", 'fields': [{'label': "a"}]}, "at least one field"),
+    ({'version': 1, 'url': "https://shop.example", 'fields': ["//a"]}, "at least one field"),
+    ({'version': 1, 'url': "https://shop.example", 'fields': {'label': "a", 'xpath': "//a"}}, "at least one field"),
+])
+def test_an_incomplete_job_file_is_refused(tmp_path, job, message):
+    path = write_job(tmp_path / "job.json", **job)
+
+    with pytest.raises(ValueError, match=message):
+        scraper.load_job(path)
+
+@pytest.mark.parametrize("content", ['{"version": 1, "url": ', '[]', ''])
+def test_a_job_file_that_is_not_a_job_object_is_refused(tmp_path, content):
+    (tmp_path / "job.json").write_text(content, encoding='utf-8')
+
+    with pytest.raises(ValueError):
+        scraper.load_job(str(tmp_path / "job.json"))
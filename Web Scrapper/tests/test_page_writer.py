@@ -0,0 +1,88 @@
+import csv
+import json
+
+import pytest
+
+from page_writer import PageWriter
+
+LABELS = ["name", "price"]
+
+def page_rows(page, count=3):
+    return [{'name': f"item {page}.{item}", 'price': str(page * 10 + item)} for item in range(count)]
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+def start_job(tmp_path, pages):
+    """Write pages 1 to pages, then crash halfway through the next page, after its checkpoint"""
+    writer = PageWriter(str(tmp_path / "rows.csv"), LABELS, str(tmp_path / "job.checkpoint"))
+    for page in range(1, pages + 1):
+        writer.write_page(page, page_rows(page), url=f"https://shop.example/list?page={page}")
+    # Half of the next page reaches the file; the process dies before its checkpoint is saved
+    writer._writer.writerows(page_rows(pages + 1)[:2])
+    writer._file.write('"item, cut off')
+    writer._file.flush()
+    writer._file.close()
+
+def test_a_resumed_job_neither_duplicates_nor_loses_rows(tmp_path):
+    start_job(tmp_path, 4)
+
+    writer = PageWriter.resume(str(tmp_path / "job.checkpoint"), LABELS)
+    assert (writer.page, writer.url, writer.items) == (4, "https://shop.example/list?page=4", 12)
+    # The last page written is scraped again when the job resumes
+    for page in range(writer.page, 8):
+        writer.write_page(page, page_rows(page))
+    writer.close()
+
+    expected = [[row['name'], row['price']] for page in range(1, 8) for row in page_rows(page)]
+    assert read_csv(tmp_path / "rows.csv") == [LABELS] + expected
+    assert not (tmp_path / "job.checkpoint").exists()
+
+def test_a_job_can_be_resumed_more_than_once(tmp_path):
+    start_job(tmp_path, 2)
+    writer = PageWriter.resume(str(tmp_path / "job.checkpoint"), LABELS)
+    writer.write_page(3, page_rows(3))
+    writer.close(finished=False)
+
+    writer = PageWriter.resume(str(tmp_path / "job.checkpoint"), LABELS)
+    writer.write_page(4, page_rows(4))
+    writer.close()
+
+    rows = read_csv(tmp_path / "rows.csv")
+    assert rows.count(LABELS) == 1
+    assert [name for name, _ in rows[1:]] == [row['name'] for page in range(1, 5) for row in page_rows(page)]
+
+def test_a_job_that_crashed_before_its_first_page_starts_the_file_over(tmp_path):
+    start_job(tmp_path, 0)
+
+    writer = PageWriter.resume(str(tmp_path / "job.checkpoint"), LABELS)
+    writer.write_page(1, page_rows(1))
+    writer.close()
+
+    assert read_csv(tmp_path / "rows.csv") == [LABELS] + [[row['name'], row['price']] for row in page_rows(1)]
+
+def test_there_is_nothing_to_resume_without_a_checkpoint(tmp_path):
+    assert PageWriter.resume(str(tmp_path / "job.checkpoint"), LABELS) is None
+
+def test_a_checkpoint_for_other_fields_is_refused(tmp_path):
+    start_job(tmp_path, 2)
+
+    with pytest.raises(ValueError, match="other fields"):
+        PageWriter.resume(str(tmp_path / "job.checkpoint"), ["name"])
+
+def test_a_checkpoint_past_the_end_of_its_csv_file_is_refused(tmp_path):
+    start_job(tmp_path, 2)
+    with open(tmp_path / "job.checkpoint", encoding='utf-8') as f:
+        size = json.load(f)['size']
+    with open(tmp_path / "rows.csv", 'r+b') as f:
+        f.truncate(size - 1)
+
+    with pytest.raises(ValueError, match="missing or incomplete"):
+        PageWriter.resume(str(tmp_path / "job.checkpoint"), LABELS)
+
+def test_a_finished_job_without_rows_leaves_no_files(tmp_path):
+    writer = PageWriter(str(tmp_path / "rows.csv"), LABELS, str(tmp_path / "job.checkpoint"))
+    writer.close()
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from pagination import PagePattern, crawl_pages, detect_page_pattern
+
+@pytest.mark.parametrize("first_url, next_url, page_5", [
+    ("https://shop.example/list?page=1", "https://shop.example/list?page=2", "https://shop.example/list?page=5"),
+    ("https://shop.example/list?q=tea&page=1&sort=new", "https://shop.example/list?q=tea&page=2&sort=new",
+     "https://shop.example/list?q=tea&page=5&sort=new"),
+    ("https://shop.example/list", "https://shop.example/list?page=2", "https://shop.example/list?page=5"),
+    ("https://shop.example/list?q=tea", "https://shop.example/list?q=tea&page=2",
+     "https://shop.example/list?q=tea&page=5"),
+    ("https://shop.example/list?start=0", "https://shop.example/list?start=20", "https://shop.example/list?start=80"),
+    ("https://blog.example/posts/page/1/", "https://blog.example/posts/page/2/", "https://blog.example/posts/page/5/"),
+    ("https://blog.example/posts/", "https://blog.example/posts/page/2/", "https://blog.example/posts/page/5/"),
+    ("https://blog.example/posts/3", "https://blog.example/posts/4", "https://blog.example/posts/7"),
+])
+def test_numbered_pages_are_detected(first_url, next_url, page_5):
+    pattern = detect_page_pattern(first_url, next_url)
+
+    assert pattern is not None
+    assert pattern.url(2) == next_url
+    assert pattern.url(5) == page_5
+
+@pytest.mark.parametrize("first_url, next_url", [
+    ("https://shop.example/list", "https://shop.example/list?cursor=abc"),
+    ("https://shop.example/list?page=2", "https://shop.example/list?page=2"),
+    ("https://shop.example/list?page=3", "https://shop.example/list?page=1"),
+    ("https://shop.example/list", "https://shop.example/other?page=2"),
+    ("https://shop.example/list", "https://shop.example/list?page=7"),
+    ("https://shop.example:8080/list", "https://shop.example:8081/list"),
+    ("https://shop.example/list", None),
+    (None, "https://shop.example/list?page=2"),
+])
+def test_links_that_do_not_number_pages_are_not_patterns(first_url, next_url):
+    assert detect_page_pattern(first_url, next_url) is None
+
+def test_the_number_that_changes_is_the_page_number():
+    pattern = detect_page_pattern("https://shop.example/v2/cat/12?page=1&size=20",
+                                  "https://shop.example/v2/cat/12?page=2&size=20")
+
+    assert pattern.url(3) == "https://shop.example/v2/cat/12?page=3&size=20"
+
+def crawl(pages, first_page=2, last_page=20, workers=3):
+    """Crawl a site whose pages map to (rows, has_next), or raise; returns the result and the pages handed on"""
+    handed_on = []
+    lock = threading.Lock()
+
+    def fetch_page(page):
+        result = pages.get(page, ([], False))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def on_page(page, rows):
+        with lock:
+            handed_on.append((page, rows))
+
+    return crawl_pages(fetch_page, on_page, first_page, last_page, workers), handed_on
+
+def test_pages_are_handed_on_in_order_until_the_last_page():
+    pages = {page: ([f"row {page}"], page < 6) for page in range(2, 7)}
+
+    (count, error), handed_on = crawl(pages)
+
+    assert (count, error) == (5, None)
+    assert handed_on == [(page, [f"row {page}"]) for page in range(2, 7)]
+
+def test_the_crawl_stops_before_an_empty_page():
+    pages = {2: (["a"], True), 3: (["b"], True), 4: ([], True), 5: (["d"], True)}
+
+    (count, error), handed_on = crawl(pages)
+
+    assert (count, error) == (2, None)
+    assert [page for page, _ in handed_on] == [2, 3]
+
+def test_the_crawl_stops_before_a_page_that_fails():
+    failure = OSError("connection reset")
+    pages = {2: (["a"], True), 3: failure, 4: (["c"], True)}
+
+    (count, error), handed_on = crawl(pages)
+
+    assert (count, error) == (1, failure)
+    assert handed_on == [(2, ["a"])]
+
+def test_a_failure_past_the_last_page_is_not_an_error():
+    pages = {2: (["a"], False), 3: OSError("404")}
+
+    assert crawl(pages)[0] == (1, None)
+
+def test_the_crawl_stops_before_a_page_that_repeats_the_one_before():
+    # Sites that serve their last page, next link included, for every number past it
+    pages = {2: (["a"], True), 3: (["b"], True)}
+    pages.update({page: (["c"], True) for page in range(4, 50)})
+
+    (count, error), handed_on = crawl(pages)
+
+    assert (count, error) == (3, None)
+    assert handed_on == [(2, ["a"]), (3, ["b"]), (4, ["c"])]
+
+def test_the_crawl_stops_at_the_last_page_number():
+    pages = {page: ([f"row {page}"], True) for page in range(2, 50)}
+
+    (count, error), handed_on = crawl(pages, last_page=5)
+
+    assert (count, error) == (4, None)
+    assert [page for page, _ in handed_on] == [2, 3, 4, 5]
+
+def test_page_pattern_repr_shows_the_numbering():
+    assert repr(PagePattern("https://x.example/?p=", "", 0, 10)) == "https://x.example/?p={0 + 10n}"
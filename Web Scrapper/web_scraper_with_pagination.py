@@ -3,10 +3,116 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import argparse
+import json
+import os
+import sys
 import time
-import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import http_scraper
+import pagination
+from page_writer import PageWriter
+
+# Version of the job file format written by save_job()
+JOB_FORMAT_VERSION = 1
+
+# Evaluates every selected XPath in the browser and returns the text of the matches per label,
+# so a page costs one WebDriver round-trip however many fields and items it has
+EXTRACT_SCRIPT = """
+const columns = {};
+const errors = {};
+for (const [label, xpath] of arguments[0]) {
+    try {
+        const result = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const values = [];
+        for (let i = 0; i < result.snapshotLength; i++) {
+            const node = result.snapshotItem(i);
+            let text = node.textContent;
+            if (node.nodeType === Node.ELEMENT_NODE) {
+                // Like WebElement.text: rendered text only, nothing for hidden elements
+                text = node.getClientRects().length ? (node.innerText ?? node.textContent) : '';
+            }
+            text = (text || '').trim();
+            if (text) {
+                values.push(text);
+            }
+        }
+        columns[label] = values;
+    } catch (e) {
+        errors[label] = String(e.message || e);
+    }
+}
+return {columns: columns, errors: errors};
+"""
+
+# Longest wait for a page to become ready before scraping it anyway (seconds)
+PAGE_TIMEOUT = 30
+
+# How long the page must go without DOM changes to count as settled (seconds)
+QUIET_PERIOD = 0.5
+
+# Seconds between two readiness checks
+POLL_INTERVAL = 0.1
+
+# Shared by the page scripts: remembers when the DOM last changed
+_OBSERVE_MUTATIONS = """
+if (!window.__scraperObserver) {
+    window.__scraperLastMutation = performance.now();
+    window.__scraperObserver = new MutationObserver(function() {
+        window.__scraperLastMutation = performance.now();
+    });
+    window.__scraperObserver.observe(document, {childList: true, subtree: true, characterData: true, attributes: true});
+}
+"""
+
+# Run before leaving a page: remembers the first result node and tags the document,
+# so the next check can tell whether the page was replaced or changed in place
+MARK_PAGE_SCRIPT = _OBSERVE_MUTATIONS + """
+const xpath = arguments[0];
+window.__scraperMarker = xpath ? document.evaluate(xpath, document, null,
+    XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue : null;
+window.__scraperMarkerText = window.__scraperMarker ? window.__scraperMarker.textContent : null;
+window.__scraperToken = arguments[1];
+return location.href;
+"""
+
+# Reports the readiness signals of the current page in one round-trip
+PAGE_STATE_SCRIPT = _OBSERVE_MUTATIONS + """
+const sameDocument = window.__scraperToken === arguments[1];
+const marker = sameDocument ? window.__scraperMarker : null;
+const fields = arguments[0].some(function(xpath) {
+    try {
+        return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null;
+    } catch (e) {
+        return false;
+    }
+});
+return {
+    url: location.href,
+    new_document: !sameDocument,
+    stale: Boolean(marker && !marker.isConnected),
+    changed: Boolean(marker && marker.textContent !== window.__scraperMarkerText),
+    loaded: document.readyState === 'complete',
+    fields: arguments[0].length === 0 || fields,
+    quiet: (performance.now() - window.__scraperLastMutation) / 1000
+};
+"""
+
+# Returns the absolute URL of the link the next page button is or sits in, or null
+NEXT_LINK_SCRIPT = """
+try {
+    const node = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    const element = node && node.nodeType !== Node.ELEMENT_NODE ? node.parentElement : node;
+    const link = element ? element.closest('a[href]') : null;
+    return link ? link.href : null;
+} catch (e) {
+    return null;
+}
+"""
+
 def highlight_element(driver, element):
     """Highlight an element temporarily"""
     original_style = element.get_attribute('style')
@@ -101,21 +207,27 @@ def get_next_page_xpath(driver):
         print(f"Error getting next button XPath: {str(e)}")
         return None
 
+def extract_columns(driver, selected_elements):
+    """Evaluate all selected XPaths in one browser call; returns the non-empty texts found per label"""
+    try:
+        payload = driver.execute_script(EXTRACT_SCRIPT, [[label, xpath] for label, xpath in selected_elements])
+    except Exception as e:
+        print(f"Error finding elements: {str(e)}")
+        return {label: [] for label, _ in selected_elements}
+    
+    for label, error in payload['errors'].items():
+        print(f"Error finding elements for {label}: {error}")
+    return {label: payload['columns'].get(label, []) for label, _ in selected_elements}
+
 def collect_page_data(driver, selected_elements):
     """Collect data from current page"""
+    # Get the texts of all elements for each selected type at once
+    return combine_columns(extract_columns(driver, selected_elements))
+
+def combine_columns(all_elements):
+    """Turn the texts found per label into rows, one per item"""
     data = []
-    all_elements = {}
-    max_items = 0
-    
-    # Get all elements for each selected type
-    for label, xpath in selected_elements:
-        try:
-            elements = driver.find_elements(By.XPATH, xpath)
-            all_elements[label] = [e.text.strip() for e in elements if e.text.strip()]
-            max_items = max(max_items, len(all_elements[label]))
-        except Exception as e:
-            print(f"Error finding elements for {label}: {str(e)}")
-            all_elements[label] = []
+    max_items = max((len(texts) for texts in all_elements.values()), default=0)
     
     # Combine data from all elements
     for i in range(max_items):
@@ -130,16 +242,449 @@ def collect_page_data(driver, selected_elements):
     
     return data
 
-def main():
+def mark_page(driver, selected_elements):
+    """Remember the current page before navigating away; returns the marker wait_for_page() needs"""
+    token = f"{time.monotonic()}-{id(driver)}"
+    first_xpath = selected_elements[0][1] if selected_elements else None
+    url = driver.execute_script(MARK_PAGE_SCRIPT, first_xpath, token)
+    return {'url': url, 'token': token}
+
+def wait_for_page(driver, selected_elements, previous=None, timeout=PAGE_TIMEOUT, quiet_period=QUIET_PERIOD):
+    """
+    Wait until a page is ready to scrape instead of sleeping a fixed time.
+    
+    The page is ready once it has finished loading, at least one selected
+    field is present and the DOM has not changed for quiet_period seconds.
+    After a click (previous from mark_page()) the page must also have
+    navigated: a new URL or history entry, a new document, or the old first
+    result removed from the DOM or changed in place.
+    
+    Returns the seconds waited and whether the page became ready before the timeout.
+    """
+    xpaths = [xpath for _, xpath in selected_elements]
+    started = time.monotonic()
+    while True:
+        try:
+            state = driver.execute_script(PAGE_STATE_SCRIPT, xpaths, previous['token'] if previous else None)
+        except Exception:
+            # The browser may refuse scripts while it swaps documents
+            state = None
+        
+        if state:
+            navigated = previous is None or (state['url'] != previous['url'] or state['new_document']
+                                             or state['stale'] or state['changed'])
+            if navigated and state['loaded'] and state['fields'] and state['quiet'] >= quiet_period:
+                return time.monotonic() - started, True
+        
+        waited = time.monotonic() - started
+        if waited >= timeout:
+            return waited, False
+        time.sleep(POLL_INTERVAL)
+
+def create_driver(headless=False):
+    """Start Chrome with the scraper's options"""
+    options = webdriver.ChromeOptions()
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    if headless:
+        options.add_argument('--headless=new')
+        options.add_argument('--window-size=1920,1080')
+    driver = webdriver.Chrome(options=options)
+    if not headless:
+        driver.maximize_window()
+    return driver
+
+def select_elements(driver):
+    """Let the user click and label the elements to scrape; returns (label, xpath) pairs"""
+    selected_elements = []
+    
+    print("\nFirst, select the elements you want to scrape from each product:")
+    while True:
+        print("\nSelect an element on the page by clicking it.")
+        print("Instructions:")
+        print("1. Move your mouse over elements to see them highlighted")
+        print("2. Click on the element you want to select")
+        print("3. Enter a label for the selected element (e.g., 'product_name', 'price')")
+        print("4. Type 'done' when you've selected all elements\n")
+        
+        # Add event listeners for mouseover and click
+        driver.execute_script("""
+            window.selectedElement = null;
+            document.addEventListener('mouseover', function(e) {
+                if (e.target.style) {
+                    e.target.oldStyle = e.target.style.cssText;
+                    e.target.style.border = '2px solid red';
+                    e.target.style.backgroundColor = 'yellow';
+                }
+            });
+            document.addEventListener('mouseout', function(e) {
+                if (e.target.oldStyle !== undefined) {
+                    e.target.style.cssText = e.target.oldStyle;
+                }
+            });
+            document.addEventListener('click', function(e) {
+                e.preventDefault();
+                window.selectedElement = e.target;
+            }, true);
+        """)
+        
+        # Wait for user to click an element
+        input("Press Enter after clicking the desired element...")
+        
+        # Get the selected element
+        selected = driver.execute_script("return window.selectedElement;")
+        
+        if not selected:
+            print("No element was selected. Please try again.")
+            continue
+        
+        # Get label from user
+        label = input("Enter a label for this element (or 'done' to finish selection): ")
+        
+        if label.lower() == 'done':
+            break
+        
+        # Get XPath of selected element
+        try:
+            xpath = get_element_xpath(driver, selected)
+            selected_elements.append((label, xpath))
+            print(f"Element '{label}' has been selected!")
+        except Exception as e:
+            print(f"Error selecting element: {str(e)}")
+            continue
+    
+    return selected_elements
+
+def save_job(path, url, max_pages, selected_elements, next_page_xpath):
+    """Save the selections of an interactive session as a job file that can be run without prompts"""
+    job = {
+        'version': JOB_FORMAT_VERSION,
+        'url': url,
+        'max_pages': max_pages,
+        'fields': [{'label': label, 'xpath': xpath} for label, xpath in selected_elements],
+        'next_page_xpath': next_page_xpath
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, indent=2)
+
+def load_job(path):
+    """Read a job file written by save_job(); raises ValueError if it is not a valid job"""
+    with open(path, 'r', encoding='utf-8') as f:
+        job = json.load(f)
+    
+    if not isinstance(job, dict) or job.get('version') != JOB_FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {JOB_FORMAT_VERSION} job file")
+    if not job.get('url'):
+        raise ValueError(f"{path} has no url")
+    fields = job.get('fields')
+    if not fields or not isinstance(fields, list) or not all(
+            isinstance(field, dict) and field.get('label') and field.get('xpath') for field in fields):
+        raise ValueError(f"{path} needs at least one field with a label and an xpath")
+    
+    return {
+        'name': os.path.splitext(os.path.basename(path))[0],
+        'url': job['url'],
+        'max_pages': int(job.get('max_pages') or 1),
+        'selected_elements': [(field['label'], field['xpath']) for field in fields],
+        'next_page_xpath': job.get('next_page_xpath')
+    }
+
+def start_http_path(driver, selected_elements, next_page_xpath, browser_rows):
+    """
+    Check whether the current page can be scraped without the browser.
+    
+    The page is fetched over plain HTTP with the browser's user agent and
+    cookies and parsed with lxml. Returns the fetcher and the parsed page if
+    that gives the same rows as the browser and the next page button is a
+    plain link, otherwise (None, None).
+    """
+    if not http_scraper.available():
+        print("lxml is not installed, staying in the browser.")
+        return None, None
+    
+    fetcher = http_scraper.PageFetcher(user_agent=driver.execute_script("return navigator.userAgent;"),
+                                       cookies=driver.get_cookies())
+    try:
+        document = fetcher.fetch(driver.current_url)
+    except Exception as e:
+        print(f"Could not fetch the page over HTTP, staying in the browser: {str(e)}")
+        return None, None
+    
+    def normalized(rows):
+        return [{label: http_scraper.normalize_text(value) for label, value in row.items()} for row in rows]
+    
+    http_rows = combine_columns(http_scraper.extract_columns(document, selected_elements)[0])
+    if not browser_rows or normalized(http_rows) != normalized(browser_rows):
+        print(f"The rows over HTTP ({len(http_rows)}) differ from the browser's ({len(browser_rows)}), "
+              f"staying in the browser.")
+        return None, None
+    if next_page_xpath and http_scraper.next_page_url(document, next_page_xpath) is None:
+        print("The next page button is not a plain link, staying in the browser.")
+        return None, None
+    
+    print("The page gives the same rows over HTTP, fetching the next pages without the browser.")
+    return fetcher, document
+
+def find_page_pattern(driver, next_page_xpath, document=None):
+    """Return the pagination.PagePattern of the next page link of the current page, or None"""
+    if document is not None:
+        return pagination.detect_page_pattern(document.base_url, http_scraper.next_page_url(document, next_page_xpath))
+    try:
+        next_url = driver.execute_script(NEXT_LINK_SCRIPT, next_page_xpath)
+        return pagination.detect_page_pattern(driver.current_url, next_url)
+    except Exception:
+        return None
+
+def scrape_pages_parallel(driver, selected_elements, next_page_xpath, writer, current_page, max_pages, pattern,
+                          workers, fetcher=None):
+    """
+    Scrape the pages after current_page up to max_pages by their URLs, workers pages at a time.
+    
+    pattern numbers the pages from the current one. With a fetcher (the HTTP
+    fast path passed its check) the pages are fetched over HTTP, otherwise
+    every worker opens a headless browser with the cookies of driver. The
+    pages are written in page order. Returns the number of pages scraped and
+    the seconds waited for each browser page.
+    """
+    cookies = driver.get_cookies()
+    waits = []
+    browsers = []
+    lock = threading.Lock()
+    local = threading.local()
+    
+    def fetch_http(page):
+        document = fetcher.fetch(pattern.url(page))
+        columns, _ = http_scraper.extract_columns(document, selected_elements)
+        return combine_columns(columns), http_scraper.next_page_url(document, next_page_xpath) is not None
+    
+    def fetch_browser(page):
+        browser = getattr(local, 'browser', None)
+        if browser is None:
+            browser = local.browser = create_driver(headless=True)
+            with lock:
+                browsers.append(browser)
+            # Cookies can only be set on a page of their site
+            browser.get(pattern.url(page))
+            for cookie in cookies:
+                try:
+                    browser.add_cookie(cookie)
+                except Exception:
+                    pass
+        browser.get(pattern.url(page))
+        waited, _ = wait_for_page(browser, selected_elements)
+        with lock:
+            waits.append(waited)
+        page_data = collect_page_data(browser, selected_elements)
+        return page_data, browser.execute_script(NEXT_LINK_SCRIPT, next_page_xpath) is not None
+    
+    def write(page, page_data):
+        print(f"Page {current_page + page - 1}: {len(page_data)} rows")
+        writer.write_page(current_page + page - 1, page_data, pattern.url(page))
+    
+    try:
+        pages, error = pagination.crawl_pages(fetch_http if fetcher else fetch_browser, write,
+                                              2, max_pages - current_page + 1, workers)
+    finally:
+        for browser in browsers:
+            browser.quit()
+    
+    if error is not None:
+        print(f"Error scraping page {current_page + pages + 1}, stopping there: {str(error)}")
+    return pages, waits
+
+def scrape_pages(driver, selected_elements, next_page_xpath, max_pages, writer, use_http=False, page_workers=1,
+                 start_page=1):
+    """
+    Collect data from the current page and the following ones.
+    
+    The driver is on page number start_page. The rows of every page are
+    handed to writer, a PageWriter, as soon as the page is scraped, so
+    nothing is held in memory and an interrupted job keeps what it got.
+    
+    With use_http the first page is checked with start_http_path(), and if it
+    passes the following pages are fetched and parsed without the browser. A
+    page that cannot be fetched that way, or gives no rows, is loaded in the
+    browser and the crawl continues there.
+    
+    With page_workers above 1 and a next page link that numbers its pages in
+    the URL, the following pages are scraped in parallel by
+    scrape_pages_parallel() instead; otherwise they are clicked through one
+    at a time.
+    
+    Returns the number of pages scraped and the seconds waited for each page
+    after the first to become ready.
+    """
+    page_count = start_page - 1
+    pages_scraped = 0
+    waits = []
+    fetcher = document = None
+
+    while page_count < max_pages:
+        print(f"\nCollecting data from page {page_count + 1}...")
+        
+        # Collect data from current page
+        page_data = None
+        if document is not None:
+            columns, errors = http_scraper.extract_columns(document, selected_elements)
+            for label, error in errors.items():
+                print(f"Error finding elements for {label}: {error}")
+            page_data = combine_columns(columns)
+            if not page_data:
+                print("No data found over HTTP, loading the page in the browser.")
+                driver.get(document.base_url)
+                waited, _ = wait_for_page(driver, selected_elements)
+                waits.append(waited)
+                fetcher = document = None
+        if document is None:
+            page_data = collect_page_data(driver, selected_elements)
+        writer.write_page(page_count + 1, page_data, document.base_url if document is not None else driver.current_url)
+        pages_scraped += 1
+        
+        if use_http and pages_scraped == 1:
+            fetcher, document = start_http_path(driver, selected_elements, next_page_xpath, page_data)
+        
+        if not next_page_xpath or page_count + 1 >= max_pages:
+            break
+        
+        if page_workers > 1 and pages_scraped == 1:
+            pattern = find_page_pattern(driver, next_page_xpath, document)
+            if pattern is not None:
+                print(f"Pages are numbered in their URLs ({pattern!r}), scraping them with {page_workers} workers...")
+                pages, parallel_waits = scrape_pages_parallel(driver, selected_elements, next_page_xpath, writer,
+                                                              page_count + 1, max_pages, pattern, page_workers,
+                                                              fetcher)
+                return pages_scraped + pages, waits + parallel_waits
+            print("The next page link does not number its pages, scraping them one at a time.")
+        
+        if document is not None:
+            # Follow the next page link without the browser
+            url = http_scraper.next_page_url(document, next_page_xpath)
+            if url is None:
+                print("Next page link not found.")
+                break
+            page_count += 1
+            print(f"Fetching page {page_count + 1}...")
+            try:
+                document = fetcher.fetch(url)
+            except Exception as e:
+                print(f"Error fetching page {page_count + 1}, loading it in the browser: {str(e)}")
+                driver.get(url)
+                waited, _ = wait_for_page(driver, selected_elements)
+                waits.append(waited)
+                fetcher = document = None
+            continue
+        
+        try:
+            # Find and click next page button using saved XPath
+            next_button = driver.find_element(By.XPATH, next_page_xpath)
+            if next_button.is_displayed() and next_button.is_enabled():
+                previous = mark_page(driver, selected_elements)
+                next_button.click()
+                page_count += 1
+                print(f"Navigating to page {page_count + 1}...")
+                waited, ready = wait_for_page(driver, selected_elements, previous)
+                waits.append(waited)
+                if ready:
+                    print(f"Page {page_count + 1} ready after {waited:.2f}s")
+                else:
+                    print(f"Page {page_count + 1} not ready after {waited:.2f}s, scraping it anyway")
+            else:
+                print("Next page button is no longer clickable.")
+                break
+        except Exception as e:
+            print(f"Error navigating to next page: {str(e)}")
+            break
+    
+    return pages_scraped, waits
+
+def open_writer(name, labels, output_dir='.', restart=False):
+    """
+    Open the CSV output of a job, resuming it from its checkpoint if it was interrupted.
+    
+    The checkpoint is <name>.checkpoint.json in output_dir; restart ignores
+    it and starts a new file.
+    """
+    checkpoint_path = os.path.join(output_dir, f"{name}.checkpoint.json")
+    if not restart:
+        writer = PageWriter.resume(checkpoint_path, labels)
+        if writer is not None:
+            return writer
+    
+    # The job name keeps the files of jobs run at the same time apart
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return PageWriter(os.path.join(output_dir, f"{name}_{timestamp}.csv"), labels, checkpoint_path)
+
+def run_job(job_path, max_pages=None, output_dir='.', headless=True, use_http=False, page_workers=1,
+            restart=False):
+    """
+    Run a saved job without any prompts.
+    
+    A job that was interrupted carries on after the last page it wrote,
+    unless restart is set.
+    
+    Returns a summary with the job name, the number of items and pages
+    scraped and the CSV file written (None when nothing was collected).
+    """
+    job = load_job(job_path)
+    writer = open_writer(job['name'], [label for label, _ in job['selected_elements']], output_dir, restart)
+    finished = False
     driver = None
+    try:
+        driver = create_driver(headless=headless)
+        start_page = 1
+        if writer.page and writer.url and writer.url != job['url']:
+            print(f"{job['name']}: resuming at page {writer.page}, {writer.url}")
+            driver.get(writer.url)
+            start_page = writer.page
+        else:
+            if writer.page:
+                # The page URLs do not change; pages already written are skipped on the way
+                print(f"{job['name']}: resuming after page {writer.page} from the first page")
+            driver.get(job['url'])
+        
+        # Wait for page to load
+        wait_for_page(driver, job['selected_elements'])
+        
+        _, waits = scrape_pages(driver, job['selected_elements'], job['next_page_xpath'],
+                                max_pages or job['max_pages'], writer, use_http=use_http,
+                                page_workers=page_workers, start_page=start_page)
+        finished = True
+        
+        return {'job': job['name'], 'items': writer.items, 'pages': writer.page,
+                'csv': writer.csv_filename if writer.items else None, 'wait': sum(waits)}
+    finally:
+        writer.close(finished)
+        if driver:
+            driver.quit()
+
+def run_jobs(job_paths, workers=1, **options):
+    """Run several saved jobs, each in its own browser, and print a summary; returns False if any failed"""
+    def run(job_path):
+        try:
+            return run_job(job_path, **options), None
+        except Exception as e:
+            return None, str(e)
+    
+    succeeded = True
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for job_path, (result, error) in zip(job_paths, pool.map(run, job_paths)):
+            if error:
+                succeeded = False
+                print(f"{job_path}: Error: {error}")
+            else:
+                print(f"{job_path}: {result['items']} items from {result['pages']} pages, "
+                      f"{result['wait']:.1f}s waiting for pages"
+                      + (f", saved to {result['csv']}" if result['csv'] else ""))
+    return succeeded
+
+def main(save_path=None, use_http=False, page_workers=1):
+    driver = None
+    writer = None
+    finished = False
     try:
         # Initialize the webdriver with options
-        options = webdriver.ChromeOptions()
-        options.add_argument('--disable-gpu')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        driver = webdriver.Chrome(options=options)
-        driver.maximize_window()
+        driver = create_driver()
 
         # Get URL from user
         url = input("Enter the website URL: ")
@@ -149,65 +694,10 @@ def main():
         max_pages = int(input("Enter Maximum number fo page that needs to be scrapped: "))
         
         # Wait for page to load
-        time.sleep(5)  # Increased wait time
+        wait_for_page(driver, [])
         
         # List to store selected elements' XPaths and labels
-        selected_elements = []
-        
-        print("\nFirst, select the elements you want to scrape from each product:")
-        while True:
-            print("\nSelect an element on the page by clicking it.")
-            print("Instructions:")
-            print("1. Move your mouse over elements to see them highlighted")
-            print("2. Click on the element you want to select")
-            print("3. Enter a label for the selected element (e.g., 'product_name', 'price')")
-            print("4. Type 'done' when you've selected all elements\n")
-            
-            # Add event listeners for mouseover and click
-            driver.execute_script("""
-                window.selectedElement = null;
-                document.addEventListener('mouseover', function(e) {
-                    if (e.target.style) {
-                        e.target.oldStyle = e.target.style.cssText;
-                        e.target.style.border = '2px solid red';
-                        e.target.style.backgroundColor = 'yellow';
-                    }
-                });
-                document.addEventListener('mouseout', function(e) {
-                    if (e.target.oldStyle !== undefined) {
-                        e.target.style.cssText = e.target.oldStyle;
-                    }
-                });
-                document.addEventListener('click', function(e) {
-                    e.preventDefault();
-                    window.selectedElement = e.target;
-                }, true);
-            """)
-            
-            # Wait for user to click an element
-            input("Press Enter after clicking the desired element...")
-            
-            # Get the selected element
-            selected = driver.execute_script("return window.selectedElement;")
-            
-            if not selected:
-                print("No element was selected. Please try again.")
-                continue
-            
-            # Get label from user
-            label = input("Enter a label for this element (or 'done' to finish selection): ")
-            
-            if label.lower() == 'done':
-                break
-            
-            # Get XPath of selected element
-            try:
-                xpath = get_element_xpath(driver, selected)
-                selected_elements.append((label, xpath))
-                print(f"Element '{label}' has been selected!")
-            except Exception as e:
-                print(f"Error selecting element: {str(e)}")
-                continue
+        selected_elements = select_elements(driver)
 
         # Get the next page button XPath
         print("\nBefore we start collecting data, we need to identify the next page button.")
@@ -215,64 +705,72 @@ def main():
         if not next_page_xpath:
             print("No next page button was selected. Will only scrape the current page.")
         
-        # Now collect data from multiple pages
-        all_data = []
-        page_count = 0
-
-        while page_count < max_pages:
-            print(f"\nCollecting data from page {page_count + 1}...")
-            
-            # Collect data from current page
-            page_data = collect_page_data(driver, selected_elements)
-            all_data.extend(page_data)
-            
-            if next_page_xpath:
-                try:
-                    # Find and click next page button using saved XPath
-                    next_button = driver.find_element(By.XPATH, next_page_xpath)
-                    if next_button.is_displayed() and next_button.is_enabled():
-                        next_button.click()
-                        page_count += 1
-                        print(f"Navigating to page {page_count + 1}...")
-                        time.sleep(5)  # Wait for new page to load
-                    else:
-                        print("Next page button is no longer clickable.")
-                        break
-                except Exception as e:
-                    print(f"Error navigating to next page: {str(e)}")
-                    break
-            else:
-                break
+        if save_path:
+            save_job(save_path, url, max_pages, selected_elements, next_page_xpath)
+            print(f"Job saved to: {save_path}")
+        
+        # Rows are written to the CSV file page by page; a saved job gets a checkpoint
+        # so running it later carries on where this session stopped
+        labels = [label for label, _ in selected_elements]
+        if save_path:
+            writer = open_writer(os.path.splitext(os.path.basename(save_path))[0], labels, restart=True)
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            writer = PageWriter(f"scraped_data_{timestamp}.csv", labels)
+        csv_filename = writer.csv_filename
         
-        # Create CSV filename with datetime stamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_filename = f"scraped_data_{timestamp}.csv"
+        # Now collect data from multiple pages
+        pages_scraped, waits = scrape_pages(driver, selected_elements, next_page_xpath, max_pages, writer,
+                                            use_http=use_http, page_workers=page_workers)
+        finished = True
         
-        # Write data to CSV file
-        if all_data:
-            with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-                # Get fieldnames from the first item's keys
-                fieldnames = list(all_data[0].keys())
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                
-                # Write header and data
-                writer.writeheader()
-                writer.writerows(all_data)
-            
+        if writer.items:
             print(f"\nData has been saved to: {csv_filename}")
         
         # Print summary of collected data
         print("\nCollected Data Summary:")
         print("-" * 50)
-        print(f"Total items collected: {len(all_data)}")
-        print(f"Pages scraped: {page_count + 1}")
+        print(f"Total items collected: {writer.items}")
+        print(f"Pages scraped: {pages_scraped}")
+        if waits:
+            print(f"Waited for pages: {sum(waits):.1f}s in total, {max(waits):.2f}s at most")
         print(f"Data saved to CSV file: {csv_filename}")
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
     finally:
+        if writer:
+            writer.close(finished)
+            if not finished and writer.checkpoint_path:
+                print(f"Run {save_path} to carry on after page {writer.page}.")
         if driver:
             driver.quit()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrape labelled elements from paginated websites")
+    parser.add_argument("jobs", nargs="*",
+                        help="Saved job files to run without prompts; without any, the page is set up interactively")
+    parser.add_argument("--save", metavar="JOB_FILE",
+                        help="Save the selections of the interactive session to a job file")
+    parser.add_argument("--max-pages", type=int, help="Override the number of pages of the saved jobs")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="Number of saved jobs run at the same time (default: 1)")
+    parser.add_argument("--output-dir", default=".", help="Directory for the CSV files of saved jobs")
+    parser.add_argument("--http", action="store_true",
+                        help="Fetch the pages after the first over plain HTTP when that gives the same rows")
+    parser.add_argument("--page-workers", type=int, default=1,
+                        help="Pages scraped at the same time when their URLs are numbered, like ?page=2 (default: 1)")
+    parser.add_argument("--restart", action="store_true",
+                        help="Start saved jobs over instead of carrying on after an interruption")
+    parser.add_argument("--show-browser", action="store_true",
+                        help="Run saved jobs in a visible browser window instead of headless")
+    args = parser.parse_args()
+    
+    if args.jobs:
+        if args.save:
+            parser.error("--save only applies to the interactive mode")
+        succeeded = run_jobs(args.jobs, workers=args.workers, max_pages=args.max_pages,
+                             output_dir=args.output_dir, headless=not args.show_browser, use_http=args.http,
+                             page_workers=args.page_workers, restart=args.restart)
+        sys.exit(0 if succeeded else 1)
+    main(save_path=args.save, use_http=args.http, page_workers=args.page_workers)